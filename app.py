@@ -1,6 +1,28 @@
+# Lo primero: perf guarda la hora de inicio para el informe de arranque
+import perf
 
+import multiprocessing
+import os
+
+from config import carpeta_datos_locales
 from ui.main_window import MainWindow
 
+
+def guardar_informe_arranque():
+    perf.marcar_arranque("listo")
+    try:
+        perf.guardar_arranque(os.path.join(carpeta_datos_locales(), "arranque.jsonl"))
+    except OSError:
+        pass
+
+
 if __name__ == "__main__":
+    # Necesario para el pool de procesos de la exportación en lote
+    # cuando la aplicación está empaquetada como ejecutable
+    multiprocessing.freeze_support()
+    perf.marcar_arranque("importaciones")
     app = MainWindow()
+    perf.marcar_arranque("ventana_construida")
+    # Se ejecuta tras mostrarse la ventana y su primera pestaña
+    app.after_idle(guardar_informe_arranque)
     app.mainloop()
@@ -0,0 +1,242 @@
+# batch_export.py
+"""
+Exportación de muchas facturas a PDF (p.ej. las del trimestre para la
+gestoría), un archivo Factura_<NUMERO>.pdf por factura.
+
+1) Las cabeceras y las líneas se leen de una vez (get_facturas por
+   filtro + get_lineas_facturas por bloques), no dos consultas por factura.
+2) El dibujado de cada PDF se reparte entre los núcleos del equipo con un
+   pool de procesos. A los procesos solo se les pasan dicts, no filas de la
+   base de datos.
+3) Las facturas que no han cambiado desde la última exportación se copian
+   de la caché de PDF (pdf_cache) sin pasar por el pool.
+
+También se pueden juntar todas en un único PDF (libro de facturas, para
+auditorías): exportar_libro lee las cabeceras por lotes y las líneas por
+bloques con generadores, así que de la base de datos solo hay en memoria
+un bloque. reportlab, en cambio, guarda todas las páginas del libro hasta
+cerrarlo: un libro muy grande ocupa memoria en proporción a sus páginas
+(para miles de facturas, mejor un PDF por factura o libros por trimestre).
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from types import SimpleNamespace
+
+from db import (
+    TAM_LOTE, contar_facturas, get_facturas, get_facturas_lotes, get_lineas_facturas,
+    fila_a_dict,
+)
+from pdf_cache import clave_factura, cache_por_defecto
+
+
+class ResumenLote:
+    def __init__(self, total: int):
+        self.total = total
+        self.generadas = []   # rutas de los PDF generados
+        self.fallos = []      # (numero, mensaje)
+        self.cancelado = False
+        self.libro = None     # ruta del PDF único, en modo libro de facturas
+
+    def texto(self) -> str:
+        if self.libro:
+            return f"Libro de facturas generado ({self.total} facturas):\n{self.libro}"
+        txt = f"Generadas {len(self.generadas)} de {self.total} facturas."
+        if self.cancelado:
+            txt += "\nExportación cancelada por el usuario."
+        if self.fallos:
+            txt += f"\n\nFallos ({len(self.fallos)}):"
+            for numero, msg in self.fallos[:20]:
+                txt += f"\n- {numero}: {msg}"
+            if len(self.fallos) > 20:
+                txt += f"\n... y {len(self.fallos) - 20} más"
+        return txt
+
+
+def leer_facturas(conn, cliente=None, desde=None, hasta=None, rango=None, cabeceras=None):
+    """
+    Cabeceras y líneas de las facturas del filtro, como lista de
+    (cabecera, líneas) en dicts listos para enviar a otros procesos.
+    `rango` es (primero, último) número de factura. Con `cabeceras` (filas
+    ya leídas, p.ej. las elegidas en la lista) no se filtra: solo se leen
+    sus líneas.
+    """
+    if cabeceras is None:
+        cabeceras = get_facturas(conn, cliente=cliente, desde=desde, hasta=hasta, rango=rango)
+    lineas = get_lineas_facturas(conn, [c.NUMERO for c in cabeceras])
+    return [
+        (
+            fila_a_dict(cab),
+            [fila_a_dict(l) for l in lineas.get(str(cab.NUMERO), [])],
+        )
+        for cab in cabeceras
+    ]
+
+
+def iter_facturas(conn, cabeceras, lote=200):
+    """
+    Genera (cabecera, líneas) para cada cabecera, leyendo las líneas de
+    `lote` en `lote` facturas: solo hay en memoria las líneas de un bloque.
+    """
+    for i in range(0, len(cabeceras), lote):
+        bloque = cabeceras[i:i + lote]
+        lineas = get_lineas_facturas(conn, [c.NUMERO for c in bloque], lote=lote)
+        for cab in bloque:
+            yield cab, lineas.get(str(cab.NUMERO), [])
+
+
+def exportar_libro(
+    conn,
+    ruta: str,
+    cliente=None,
+    desde=None,
+    hasta=None,
+    progreso=None,
+    cancelar: threading.Event | None = None,
+    rango=None,
+    cabeceras=None,
+) -> ResumenLote:
+    """
+    Todas las facturas del filtro (o las `cabeceras` indicadas) en un único
+    PDF, de la más antigua a la más reciente. Si se cancela no se deja un
+    PDF a medias.
+    """
+    from invoice_pdf import render_libro_facturas
+
+    if cabeceras is None:
+        # Cabeceras por lotes (de la más antigua a la más reciente), sin
+        # tenerlas todas en memoria; el total solo es para el progreso
+        filtro = {"cliente": cliente, "desde": desde, "hasta": hasta, "rango": rango}
+        total = contar_facturas(conn, **filtro)
+        bloques = get_facturas_lotes(conn, ascendente=True, **filtro)
+    else:
+        cabeceras = sorted(cabeceras, key=lambda c: _numero_orden(c.NUMERO))
+        total = len(cabeceras)
+        bloques = (cabeceras[i:i + TAM_LOTE] for i in range(0, total, TAM_LOTE))
+    resumen = ResumenLote(total)
+    if progreso:
+        progreso(0, resumen.total)
+
+    def facturas():
+        try:
+            for bloque in bloques:
+                for cab, lineas in iter_facturas(conn, bloque):
+                    if cancelar is not None and cancelar.is_set():
+                        resumen.cancelado = True
+                        return
+                    yield cab, lineas
+        finally:
+            bloques.close()  # deja de leer si se cancela
+
+    render_libro_facturas(
+        facturas(),
+        ruta,
+        progreso=(lambda n: progreso(n, resumen.total)) if progreso else None,
+    )
+    if resumen.cancelado:
+        os.remove(ruta)
+    else:
+        resumen.libro = ruta
+    return resumen
+
+
+def _numero_orden(numero):
+    # Las facturas se numeran por orden de emisión; si no es numérico, al final
+    try:
+        return (0, float(numero))
+    except (TypeError, ValueError):
+        return (1, 0.0)
+
+
+def nombre_pdf(numero) -> str:
+    return f"Factura_{numero}.pdf"
+
+
+def exportar_lote(
+    facturas,
+    carpeta: str,
+    procesos: int | None = None,
+    progreso=None,
+    cancelar: threading.Event | None = None,
+    usar_cache: bool = True,
+) -> ResumenLote:
+    """
+    Genera los PDF de `facturas` (resultado de leer_facturas) en `carpeta`.
+    progreso(hechas, total) se llama tras cada factura; si se activa el
+    evento `cancelar` se dejan de lanzar facturas nuevas.
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    resumen = ResumenLote(len(facturas))
+    if not facturas:
+        return resumen
+
+    hechas = 0
+
+    def avanzar():
+        nonlocal hechas
+        hechas += 1
+        if progreso:
+            progreso(hechas, resumen.total)
+
+    # Primero las que ya están en la caché: solo hay que copiarlas
+    cache = None
+    pendientes = []
+    if usar_cache:
+        from invoice_pdf import VERSION_PLANTILLA
+
+        cache = cache_por_defecto()
+    for cab, lineas in facturas:
+        if cancelar is not None and cancelar.is_set():
+            resumen.cancelado = True
+            return resumen
+        ruta = os.path.join(carpeta, nombre_pdf(cab["NUMERO"]))
+        clave = None
+        if cache is not None:
+            clave = clave_factura(cab, lineas, VERSION_PLANTILLA)
+            if cache.copiar(clave, ruta):
+                resumen.generadas.append(ruta)
+                avanzar()
+                continue
+        pendientes.append((cab, lineas, ruta, clave))
+
+    if not pendientes:
+        return resumen
+
+    procesos = procesos or max(1, min(len(pendientes), (os.cpu_count() or 2) - 1))
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        futuros = {}
+        for cab, lineas, ruta, clave in pendientes:
+            futuro = pool.submit(_render_en_proceso, cab, lineas, ruta)
+            futuros[futuro] = (cab["NUMERO"], clave)
+
+        for futuro in as_completed(futuros):
+            numero, clave = futuros[futuro]
+            if futuro.cancelled():
+                continue  # no llegó a empezar: ni generada ni fallo
+            try:
+                ruta = futuro.result()
+            except Exception as e:
+                resumen.fallos.append((numero, str(e)))
+            else:
+                resumen.generadas.append(ruta)
+                if cache is not None:
+                    cache.guardar(clave, ruta)
+            avanzar()
+            if cancelar is not None and cancelar.is_set() and not resumen.cancelado:
+                resumen.cancelado = True
+                for f in futuros:
+                    f.cancel()
+
+    return resumen
+
+
+def _render_en_proceso(cab: dict, lineas: list, ruta: str) -> str:
+    # Se ejecuta en otro proceso: importamos aquí el módulo de PDF
+    from invoice_pdf import render_pdf_factura
+
+    render_pdf_factura(
+        SimpleNamespace(**cab),
+        [SimpleNamespace(**l) for l in lineas],
+        ruta,
+    )
+    return ruta
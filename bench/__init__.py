@@ -0,0 +1,11 @@
+# bench/__init__.py
+"""
+Pruebas de rendimiento reproducibles sin el MDB del cliente.
+
+    python -m bench --tamanos 1k,100k --salida antes.json
+    python -m bench --tamanos 1k,100k --salida despues.json --comparar antes.json
+
+generar.py crea bases SQLite sintéticas (mismo esquema e índices que la
+copia local del MDB) y ejecutar.py mide las consultas de db.py, el filtro
+de clientes, la generación de PDF y wrap_text, y guarda el resultado en JSON.
+"""
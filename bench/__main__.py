@@ -0,0 +1,6 @@
+# bench/__main__.py
+import sys
+
+from bench.ejecutar import main
+
+sys.exit(main())
@@ -0,0 +1,268 @@
+# bench/ejecutar.py
+"""
+Mide los caminos principales de la aplicación sobre bases sintéticas, sin
+interfaz gráfica, y guarda los tiempos en JSON.
+
+Cada prueba se repite varias veces: se guarda la primera ejecución (en
+frío) y mínimo, mediana, p90 y máximo del resto. Para comparar dos
+ejecuciones se usa la mediana.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import db
+import perf
+from bench.generar import TAMANOS, obtener_bd
+from client_index import IndiceClientes
+
+VERSION_FORMATO = 1
+
+# Texto tecleado letra a letra en el filtro de clientes
+FILTRO_CLIENTES = "garcia lopez"
+
+
+def cronometrar(fn, repeticiones: int) -> dict:
+    """Ejecuta fn() 1 + repeticiones veces. Devuelve los tiempos en ms."""
+    inicio = time.perf_counter()
+    resultado = fn()
+    primera = (time.perf_counter() - inicio) * 1000
+
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+
+    datos = {
+        "repeticiones": repeticiones,
+        "primera_ms": round(primera, 3),
+        "min_ms": round(tiempos[0], 3),
+        "mediana_ms": round(perf.percentil(tiempos, 50), 3),
+        "p90_ms": round(perf.percentil(tiempos, 90), 3),
+        "max_ms": round(tiempos[-1], 3),
+    }
+    if isinstance(resultado, (list, tuple, dict)):
+        datos["filas"] = len(resultado)
+    elif isinstance(resultado, int):
+        datos["filas"] = resultado
+    return datos
+
+
+# ----------------------------
+# Pruebas
+# ----------------------------
+def pruebas_sql(conn):
+    """(nombre, función) de cada consulta de db.py con parámetros típicos."""
+    primera = db.get_facturas_pagina(conn)[0]
+    ultima = primera[-1]
+    cliente = primera[0].CLIENTE
+    numero = str(primera[0].NUMERO)
+    numeros = [r.NUMERO for r in primera]
+
+    def todas_por_lotes(generador):
+        return sum(len(lote) for lote in generador)
+
+    def seleccionar():
+        # Como al bajar con las flechas por el listado de facturas: cabecera
+        # y líneas de cada una, muchas consultas pequeñas seguidas
+        for r in primera[:100]:
+            db.get_facturas(conn, numero=str(r.NUMERO))
+            db.get_lineas_factura(conn, str(r.NUMERO))
+        return len(primera[:100])
+
+    return [
+        ("sql.get_clientes", lambda: db.get_clientes(conn)),
+        ("sql.get_facturas_pagina", lambda: db.get_facturas_pagina(conn)[0]),
+        (
+            "sql.get_facturas_pagina.siguiente",
+            lambda: db.get_facturas_pagina(conn, despues=(ultima.FECHA, ultima.NUMERO))[0],
+        ),
+        ("sql.get_facturas.cliente", lambda: db.get_facturas(conn, cliente=cliente)),
+        ("sql.get_facturas.numero", lambda: db.get_facturas(conn, numero=numero)),
+        ("sql.contar_facturas", lambda: db.contar_facturas(conn)),
+        ("sql.get_lineas_factura", lambda: db.get_lineas_factura(conn, numero)),
+        ("sql.get_lineas_facturas.pagina", lambda: db.get_lineas_facturas(conn, numeros)),
+        ("sql.seleccion_facturas", seleccionar),
+        ("sql.get_trabajos_pagina", lambda: db.get_trabajos_pagina(conn)[0]),
+        (
+            "sql.get_trabajos_pagina.texto",
+            lambda: db.get_trabajos_pagina(conn, texto="rodamiento")[0],
+        ),
+        ("sql.get_trabajos.cliente", lambda: db.get_trabajos(conn, cliente=cliente)),
+        ("sql.contar_trabajos", lambda: db.contar_trabajos(conn)),
+        ("sql.contar_trabajos.texto", lambda: db.contar_trabajos(conn, texto="rodamiento")),
+        ("sql.get_trabajos_lotes.todos", lambda: todas_por_lotes(db.get_trabajos_lotes(conn))),
+    ]
+
+
+def pruebas_clientes(conn):
+    """Construcción del índice de clientes y filtro tecleando letra a letra."""
+    filas = db.get_clientes(conn)
+    indice = IndiceClientes(filas)
+
+    def teclear():
+        # Igual que ClientesTab.filtrar_clientes: una búsqueda por tecla
+        n = 0
+        for i in range(1, len(FILTRO_CLIENTES) + 1):
+            n = len([filas[j] for j in indice.buscar(FILTRO_CLIENTES[:i])])
+        indice.buscar("")
+        return n
+
+    return [
+        ("clientes.indice", lambda: IndiceClientes(filas)),
+        ("clientes.filtrar", teclear),
+    ]
+
+
+def pruebas_pdf(conn, carpeta: str):
+    """generar_pdf_factura (sin caché) de la factura con más líneas y wrap_text."""
+    from invoice_pdf import generar_pdf_factura, wrap_text
+    from reportlab.lib.units import mm
+    from text_layout import limpiar_cache
+
+    cur = conn.execute(
+        "SELECT REFERENCIA, COUNT(*) FROM Contenid GROUP BY REFERENCIA "
+        "ORDER BY COUNT(*) DESC, REFERENCIA LIMIT 1;"
+    )
+    numero = cur.fetchone()[0]
+    ruta = os.path.join(carpeta, "bench_factura.pdf")
+
+    descripciones = [
+        r[0] for r in conn.execute("SELECT Datos FROM Contenid ORDER BY rowid LIMIT 2000;")
+    ]
+    # Mismo ancho que la columna de descripción del PDF
+    ancho = (210 * mm - 20 * mm - 55 * mm) - (20 * mm + 25 * mm)
+
+    def partir(limpiar):
+        if limpiar:
+            limpiar_cache()
+        return sum(len(wrap_text(d, "Helvetica", 9, ancho)) for d in descripciones)
+
+    return [
+        (
+            "pdf.generar_pdf_factura",
+            lambda: generar_pdf_factura(conn, numero, ruta, usar_cache=False),
+        ),
+        ("pdf.wrap_text.frio", lambda: partir(True)),
+        ("pdf.wrap_text.caliente", lambda: partir(False)),
+    ]
+
+
+def medir_tamano(ruta: str, etiqueta: str, repeticiones: int, carpeta: str, solo=None) -> list:
+    conn = db.connect(ruta)
+    try:
+        pruebas = pruebas_sql(conn) + pruebas_clientes(conn) + pruebas_pdf(conn, carpeta)
+        resultados = []
+        for nombre, fn in pruebas:
+            if solo and not any(nombre.startswith(s) for s in solo):
+                continue
+            datos = {"tamano": etiqueta, "prueba": nombre}
+            datos.update(cronometrar(fn, repeticiones))
+            resultados.append(datos)
+            print(
+                f"  {nombre:<38} mediana {datos['mediana_ms']:>10.2f} ms"
+                f"   (primera {datos['primera_ms']:.2f} ms)"
+            )
+        return resultados
+    finally:
+        conn.close()
+
+
+# ----------------------------
+# Entorno y comparación
+# ----------------------------
+def entorno() -> dict:
+    datos = {
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "procesador": platform.processor() or platform.machine(),
+        "sqlite": db.sqlite3.sqlite_version,
+    }
+    try:
+        datos["commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout.strip() or None
+    except OSError:
+        datos["commit"] = None
+    return datos
+
+
+def comparar(anterior: dict, actual: dict):
+    """Imprime la mediana antes / después de cada prueba común a los dos."""
+    antes = {(r["tamano"], r["prueba"]): r for r in anterior["resultados"]}
+    print(f"\n{'tamaño':<6} {'prueba':<38} {'antes':>10} {'después':>10} {'x':>7}")
+    for r in actual["resultados"]:
+        previo = antes.get((r["tamano"], r["prueba"]))
+        if previo is None:
+            continue
+        a, d = previo["mediana_ms"], r["mediana_ms"]
+        factor = f"{a / d:.2f}" if d else "-"
+        print(f"{r['tamano']:<6} {r['prueba']:<38} {a:>10.2f} {d:>10.2f} {factor:>7}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m bench",
+        description="Pruebas de rendimiento sobre bases de datos sintéticas.",
+    )
+    parser.add_argument(
+        "--tamanos",
+        default="1k,100k",
+        help=f"tamaños en líneas de factura, separados por comas ({', '.join(TAMANOS)} o un número)",
+    )
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument(
+        "--carpeta",
+        default=os.path.join(tempfile.gettempdir(), "electromecanica_bench"),
+        help="dónde se guardan las bases generadas (se reutilizan entre ejecuciones)",
+    )
+    parser.add_argument("--solo", help="solo las pruebas que empiezan por estos prefijos (p.ej. sql,pdf)")
+    parser.add_argument("--salida", help="archivo JSON con los resultados")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior para comparar")
+    args = parser.parse_args(argv)
+
+    solo = [s.strip() for s in args.solo.split(",")] if args.solo else None
+
+    resultado = {
+        "version": VERSION_FORMATO,
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "entorno": entorno(),
+        "parametros": {"semilla": args.semilla, "repeticiones": args.repeticiones},
+        "resultados": [],
+    }
+
+    for etiqueta in (t.strip().lower() for t in args.tamanos.split(",")):
+        lineas = TAMANOS.get(etiqueta)
+        if lineas is None:
+            try:
+                lineas = int(etiqueta)
+            except ValueError:
+                parser.error(f"tamaño no válido: {etiqueta}")
+
+        inicio = time.perf_counter()
+        ruta = obtener_bd(args.carpeta, lineas, args.semilla)
+        print(f"{etiqueta} ({lineas} líneas): {ruta}  [{time.perf_counter() - inicio:.1f} s]")
+        resultado["resultados"].extend(
+            medir_tamano(ruta, etiqueta, args.repeticiones, args.carpeta, solo)
+        )
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            comparar(json.load(f), resultado)
+    return 0
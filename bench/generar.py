@@ -0,0 +1,192 @@
+# bench/generar.py
+"""
+Generador de bases de datos sintéticas Clientes / Facting / Contenid.
+
+Con la misma semilla y el mismo número de líneas se genera siempre la
+misma base, así que los resultados de dos ejecuciones son comparables.
+Las proporciones imitan las de un taller: ~3 líneas por factura, unas 25
+facturas por cliente (con unos pocos clientes que acumulan muchas) y
+descripciones que se repiten mucho con variaciones.
+"""
+import os
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+import db
+import mirror
+
+TAMANOS = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+FECHA_INICIO = datetime(2012, 1, 1)
+DIAS = 13 * 365
+
+# ----------------------------
+# Vocabulario
+# ----------------------------
+NOMBRES = [
+    "José", "Antonio", "Manuel", "Francisco", "Juan", "David", "Javier", "Carmen",
+    "María", "Ana", "Isabel", "Laura", "Pilar", "Luis", "Miguel", "Ángel", "Rosa",
+]
+APELLIDOS = [
+    "García", "Fernández", "González", "Rodríguez", "López", "Martínez", "Sánchez",
+    "Pérez", "Gómez", "Martín", "Ruiz", "Díaz", "Hernández", "Muñoz", "Álvarez",
+    "Romero", "Gutiérrez", "Ortiz", "Sainz", "Cobo", "Revuelta", "Solana",
+]
+EMPRESAS = [
+    "Talleres", "Construcciones", "Transportes", "Hostelería", "Instalaciones",
+    "Carpintería", "Serrería", "Granja", "Conservas", "Excavaciones", "Frigoríficos",
+]
+FORMAS = ["S.L.", "S.A.", "S.L.U.", "S.C.", "C.B."]
+CALLES = [
+    "C/ Mayor", "Avda. de los Castros", "C/ San Fernando", "Paseo de Pereda",
+    "C/ Alta", "Barrio La Iglesia", "Polígono Industrial Guarnizo", "C/ Real",
+]
+PUEBLOS = [
+    "Santander", "Torrelavega", "Camargo", "Astillero", "Laredo", "Castro Urdiales",
+    "Reinosa", "Santoña", "Piélagos", "Medio Cudeyo", "Cabezón de la Sal",
+]
+
+ACCIONES = [
+    "Reparación de", "Sustitución de", "Revisión de", "Montaje de", "Rebobinado de",
+    "Suministro de", "Ajuste de", "Limpieza y engrase de", "Desmontaje de",
+]
+PIEZAS = [
+    "motor trifásico", "motor monofásico", "bomba de agua", "electrobomba sumergible",
+    "rodamiento", "válvula de presión", "cuadro eléctrico", "alternador",
+    "motor de arranque", "variador de frecuencia", "contactor", "ventilador",
+    "compresor", "reductor", "condensador de arranque", "bobinado del estator",
+]
+DETALLES = [
+    "de 5,5 kW", "de 1,5 CV", "1450 rpm", "2900 rpm", "incluye materiales",
+    "según presupuesto", "en taller", "en las instalaciones del cliente",
+    "con garantía de 6 meses", "ref. SKF 6204-2RS", "ref. 6305-ZZ", "a 380 V",
+    "con prueba de aislamiento", "y cambio de retenes", "de la cámara frigorífica",
+]
+LINEAS_FIJAS = [
+    ("MO", "Mano de obra", 35.0),
+    ("DES", "Desplazamiento", 25.0),
+    ("MAT", "Material vario de taller", 12.5),
+]
+
+
+def ruta_bd(carpeta: str, lineas: int, semilla: int) -> str:
+    return os.path.join(carpeta, f"bench_{lineas}_{semilla}.sqlite")
+
+
+def obtener_bd(carpeta: str, lineas: int, semilla: int = 1) -> str:
+    """Ruta de la base sintética, generándola si aún no existe."""
+    ruta = ruta_bd(carpeta, lineas, semilla)
+    if not os.path.exists(ruta):
+        os.makedirs(carpeta, exist_ok=True)
+        generar_bd(ruta, lineas, semilla)
+    return ruta
+
+
+def generar_bd(ruta: str, lineas: int, semilla: int = 1) -> dict:
+    """
+    Crea en `ruta` una base SQLite con unas `lineas` líneas de factura.
+    Devuelve cuántas filas tiene cada tabla.
+    """
+    rng = random.Random(semilla)
+    n_facturas = max(1, lineas // 3)
+    clientes = _clientes(rng, max(20, n_facturas // 25))
+
+    temporal = ruta + ".tmp"
+    if os.path.exists(temporal):
+        os.remove(temporal)
+    conn = sqlite3.connect(temporal)
+    try:
+        conn.executescript(db.SQLITE_ESQUEMA)
+        conn.executemany("INSERT INTO Clientes VALUES (?, ?, ?);", clientes)
+
+        # Unos pocos clientes acumulan la mayoría de facturas
+        pesos = [1.0 / (i + 1) ** 0.8 for i in range(len(clientes))]
+        rng.shuffle(pesos)
+
+        facturas, contenido = _facturas(rng, clientes, pesos, n_facturas, lineas)
+        conn.executemany("INSERT INTO Facting VALUES (?, ?, ?, ?, ?, ?, ?);", facturas)
+        conn.executemany("INSERT INTO Contenid VALUES (?, ?, ?, ?, ?);", contenido)
+        conn.commit()
+
+        # Índices y texto completo después de insertar (mucho más rápido)
+        mirror.preparar_espejo(conn)
+        conn.execute("PRAGMA journal_mode=DELETE;")
+        conn.close()
+    except Exception:
+        conn.close()
+        os.remove(temporal)
+        raise
+    os.replace(temporal, ruta)
+    return {"clientes": len(clientes), "facturas": len(facturas), "lineas": len(contenido)}
+
+
+def _clientes(rng, n: int) -> list:
+    filas = []
+    vistos = set()
+    while len(filas) < n:
+        if rng.random() < 0.4:
+            nombre = (
+                f"{rng.choice(EMPRESAS)} {rng.choice(APELLIDOS)} "
+                f"{rng.choice(APELLIDOS)} {rng.choice(FORMAS)}"
+            )
+            cif = rng.choice("ABE") + f"{rng.randrange(10**8):08d}"
+        else:
+            nombre = (
+                f"{rng.choice(APELLIDOS).upper()} {rng.choice(APELLIDOS).upper()}, "
+                f"{rng.choice(NOMBRES).upper()}"
+            )
+            cif = f"{rng.randrange(10**8):08d}" + rng.choice("TRWAGMYFPDXBNJZSQVHLCKE")
+        if nombre in vistos:
+            nombre += f" ({len(filas)})"
+        vistos.add(nombre)
+        direccion = f"{rng.choice(CALLES)}, {rng.randint(1, 120)}, {rng.choice(PUEBLOS)}"
+        filas.append((nombre, cif, direccion))
+    return filas
+
+
+def _descripcion(rng) -> str:
+    texto = f"{rng.choice(ACCIONES)} {rng.choice(PIEZAS)}"
+    # Algunas descripciones largas, para que el PDF tenga que partirlas
+    for _ in range(rng.choice((0, 1, 1, 2, 4))):
+        texto += f" {rng.choice(DETALLES)}"
+    return texto
+
+
+def _facturas(rng, clientes, pesos, n_facturas: int, lineas: int):
+    # Líneas por factura: de 1 a 5 (hasta 12 al ajustar) sumando exactamente `lineas`
+    por_factura = [rng.randint(1, 5) for _ in range(n_facturas)]
+    diferencia = lineas - sum(por_factura)
+    i = 0
+    while diferencia:
+        paso = 1 if diferencia > 0 else -1
+        if 1 <= por_factura[i] + paso <= 12:
+            por_factura[i] += paso
+            diferencia -= paso
+        i = (i + 1) % n_facturas
+
+    elegidos = rng.choices(range(len(clientes)), weights=pesos, k=n_facturas)
+    dias = sorted(rng.randrange(DIAS) for _ in range(n_facturas))
+
+    facturas = []
+    contenido = []
+    for numero in range(1, n_facturas + 1):
+        nombre, cif, _ = clientes[elegidos[numero - 1]]
+        base = 0.0
+        for _ in range(por_factura[numero - 1]):
+            if rng.random() < 0.3:
+                codigo, datos, precio = rng.choice(LINEAS_FIJAS)
+                cantidad = float(rng.randint(1, 8))
+            else:
+                codigo = f"R{rng.randint(100, 999)}"
+                datos = _descripcion(rng)
+                cantidad = float(rng.randint(1, 4))
+                precio = round(rng.uniform(3, 600), 2)
+            base += cantidad * precio
+            contenido.append((numero, codigo, datos, cantidad, precio))
+
+        base = round(base, 2)
+        iva = round(base * 0.21, 2)
+        fecha = FECHA_INICIO + timedelta(days=dias[numero - 1])
+        facturas.append((numero, fecha, nombre, cif, round(base + iva, 2), base, iva))
+    return facturas, contenido
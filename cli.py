@@ -0,0 +1,274 @@
+# cli.py
+"""
+Consultas y exportaciones desde la línea de comandos, sin interfaz gráfica
+(no importa Tk), para lanzarlas desde el Programador de tareas o cron.
+
+    python cli.py clientes > clientes.csv
+    python cli.py facturas --cliente garcia --desde 01/01/2024 --hasta 31/03/2024 -o T1.xlsx
+    python cli.py trabajos --texto rodamiento --formato jsonl
+    python cli.py pdf --desde 01/01/2024 --hasta 31/03/2024 --carpeta PDF_T1
+    python cli.py pdf --rango 1200-1350 --libro Libro.pdf
+
+La base de datos es la de config.json salvo que se indique --bd. Los
+listados se escriben por lotes según se leen: a la salida estándar (CSV o
+JSON lines) o al archivo de -o/--salida (.csv, .xlsx o .jsonl). Los
+mensajes y errores van a la salida de errores y el código de salida es
+distinto de 0 si algo falla.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime
+from operator import attrgetter
+
+import db
+import perf
+from config import load_config
+from table_export import (
+    COLUMNAS_CLIENTES, COLUMNAS_FACTURAS, COLUMNAS_TRABAJOS,
+    EscritorCsv, EscritorJsonl, exportar_lotes,
+)
+
+
+def avisar(texto: str):
+    print(texto, file=sys.stderr, flush=True)
+
+
+def leer_fecha(texto: str):
+    """dd/mm/aaaa o aaaa-mm-dd."""
+    for formato in ("%d/%m/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"fecha no válida: {texto} (usa dd/mm/aaaa)")
+
+
+def leer_rango(texto: str):
+    """'1200-1350' o '1200' -> (primero, último)."""
+    try:
+        if "-" in texto:
+            primero, ultimo = (int(p) for p in texto.split("-", 1))
+        else:
+            primero = ultimo = int(texto)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"rango no válido: {texto} (p.ej. 1200-1350)")
+    if primero > ultimo:
+        raise argparse.ArgumentTypeError(f"rango no válido: {texto} (el primero es mayor)")
+    return primero, ultimo
+
+
+# ----------------------------
+# Conexión
+# ----------------------------
+def conectar(args):
+    config = load_config()
+    db_path = args.bd or config.get("db_path")
+    if not db_path:
+        raise SystemExit("No hay base de datos: indica --bd o configúrala en la aplicación.")
+    if not os.path.isfile(db_path):
+        raise SystemExit(f"Archivo no encontrado: {db_path}")
+
+    usar_espejo = config.get("usar_espejo", False) if args.espejo is None else args.espejo
+    if usar_espejo and isinstance(db.get_backend(db_path), db.AccessBackend):
+        from mirror import abrir_espejo
+
+        espejo, resumen = abrir_espejo(db_path)
+        if resumen["facturas"] or resumen["clientes"]:
+            avisar(
+                f"Copia local actualizada: {resumen['facturas']} facturas "
+                f"y {resumen['lineas']} líneas copiadas."
+            )
+        if resumen["duplicadas"]:
+            avisar(
+                f"{resumen['duplicadas']} facturas con el número repetido en el MDB: "
+                "se ha copiado solo la primera de cada número."
+            )
+        return espejo
+    return db.connect(db_path)
+
+
+# ----------------------------
+# Listados
+# ----------------------------
+def volcar(lotes, columnas, titulo, args) -> int:
+    """Escribe los lotes en --salida o en la salida estándar. Devuelve las filas."""
+    if args.salida:
+        filas = exportar_lotes(lotes, args.salida, columnas, titulo)
+        avisar(f"{filas} filas escritas en {args.salida}")
+        return filas
+
+    # A la salida estándar: UTF-8 sin traducir saltos de línea (el CSV ya
+    # lleva los suyos) para que se pueda redirigir a un archivo tal cual
+    sys.stdout.reconfigure(encoding="utf-8", newline="")
+    escritor = EscritorJsonl if args.formato == "jsonl" else EscritorCsv
+    esc = escritor(sys.stdout, columnas, titulo)
+    valores = attrgetter(*(c[0] for c in columnas))
+    filas = 0
+    try:
+        for lote in lotes:
+            esc.escribir(map(valores, lote))
+            filas += len(lote)
+    finally:
+        esc.cerrar()
+        if hasattr(lotes, "close"):
+            lotes.close()
+    return filas
+
+
+def cmd_clientes(conn, args) -> int:
+    volcar(db.get_clientes_lotes(conn), COLUMNAS_CLIENTES, "Clientes", args)
+    return 0
+
+
+def cmd_facturas(conn, args) -> int:
+    lotes = db.get_facturas_lotes(
+        conn,
+        cliente=args.cliente,
+        numero=args.numero,
+        desde=args.desde,
+        hasta=args.hasta,
+        rango=args.rango,
+    )
+    volcar(lotes, COLUMNAS_FACTURAS, "Facturas", args)
+    return 0
+
+
+def cmd_trabajos(conn, args) -> int:
+    lotes = db.get_trabajos_lotes(conn, cliente=args.cliente, texto=args.texto)
+    volcar(lotes, COLUMNAS_TRABAJOS, "Trabajos", args)
+    return 0
+
+
+# ----------------------------
+# PDF
+# ----------------------------
+def cmd_pdf(conn, args) -> int:
+    from batch_export import leer_facturas, exportar_lote, exportar_libro
+
+    ultimo_aviso = 0.0
+
+    def progreso(hechas, total):
+        # Como mucho un aviso por segundo, y siempre el último
+        nonlocal ultimo_aviso
+        ahora = time.monotonic()
+        if hechas == total or ahora - ultimo_aviso >= 1:
+            ultimo_aviso = ahora
+            avisar(f"{hechas} de {total} facturas")
+
+    if args.libro:
+        resumen = exportar_libro(
+            conn, args.libro, cliente=args.cliente, desde=args.desde, hasta=args.hasta,
+            progreso=progreso, rango=args.rango,
+        )
+    else:
+        facturas = leer_facturas(
+            conn, cliente=args.cliente, desde=args.desde, hasta=args.hasta, rango=args.rango
+        )
+        if not facturas:
+            avisar("No hay facturas con esos filtros.")
+            return 0
+        resumen = exportar_lote(
+            facturas,
+            args.carpeta,
+            procesos=args.procesos,
+            progreso=progreso,
+            usar_cache=not args.sin_cache,
+        )
+
+    avisar(resumen.texto())
+    return 1 if resumen.fallos else 0
+
+
+# ----------------------------
+# Argumentos
+# ----------------------------
+def crear_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python cli.py",
+        description="Consultas y exportaciones de facturas sin interfaz gráfica.",
+    )
+    parser.add_argument("--bd", help="archivo .mdb / .sqlite (por defecto, el de config.json)")
+    espejo = parser.add_mutually_exclusive_group()
+    espejo.add_argument(
+        "--espejo", dest="espejo", action="store_true", default=None,
+        help="leer de la copia local SQLite del MDB (sincronizándola antes)",
+    )
+    espejo.add_argument(
+        "--sin-espejo", dest="espejo", action="store_false", help="leer directamente del MDB"
+    )
+    parser.add_argument(
+        "--tiempos", action="store_true",
+        help="al terminar, mostrar en la salida de errores los tiempos de cada consulta",
+    )
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    def listado(nombre, ayuda):
+        p = sub.add_parser(nombre, help=ayuda)
+        p.add_argument("--formato", choices=("csv", "jsonl"), default="csv",
+                       help="formato en la salida estándar (con -o manda la extensión)")
+        p.add_argument("-o", "--salida", help="archivo .csv, .xlsx o .jsonl")
+        return p
+
+    p = listado("clientes", "todos los clientes")
+    p.set_defaults(fn=cmd_clientes)
+
+    p = listado("facturas", "cabeceras de facturas")
+    p.add_argument("--cliente", help="el nombre del cliente contiene este texto")
+    p.add_argument("--numero", help="número de factura exacto")
+    p.add_argument("--rango", type=leer_rango, help="números de factura, p.ej. 1200-1350")
+    p.add_argument("--desde", type=leer_fecha, help="fecha inicial (dd/mm/aaaa)")
+    p.add_argument("--hasta", type=leer_fecha, help="fecha final, incluida (dd/mm/aaaa)")
+    p.set_defaults(fn=cmd_facturas)
+
+    p = listado("trabajos", "líneas de factura con fecha y cliente")
+    p.add_argument("--cliente", help="el nombre del cliente contiene este texto")
+    p.add_argument("--texto", help="texto en la descripción")
+    p.set_defaults(fn=cmd_trabajos)
+
+    p = sub.add_parser("pdf", help="PDF de las facturas (uno por factura o un libro)")
+    p.add_argument("--cliente", help="el nombre del cliente contiene este texto")
+    p.add_argument("--rango", type=leer_rango, help="números de factura, p.ej. 1200-1350")
+    p.add_argument("--desde", type=leer_fecha, help="fecha inicial (dd/mm/aaaa)")
+    p.add_argument("--hasta", type=leer_fecha, help="fecha final, incluida (dd/mm/aaaa)")
+    destino = p.add_mutually_exclusive_group(required=True)
+    destino.add_argument("--carpeta", help="un Factura_<NUMERO>.pdf por factura en esta carpeta")
+    destino.add_argument("--libro", help="todas las facturas en este único PDF")
+    p.add_argument("--procesos", type=int, help="procesos en paralelo (por defecto, núcleos - 1)")
+    p.add_argument("--sin-cache", action="store_true", help="no usar la caché de PDF")
+    p.set_defaults(fn=cmd_pdf)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = crear_parser().parse_args(argv)
+    conn = conectar(args)
+    try:
+        return args.fn(conn, args)
+    except BrokenPipeError:
+        # p.ej. `python cli.py trabajos | head`: no es un error. La salida
+        # estándar se redirige a nulo para que no vuelva a fallar al salir.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    except KeyboardInterrupt:
+        avisar("Cancelado.")
+        return 130
+    except Exception as e:
+        avisar(f"Error: {e}")
+        return 1
+    finally:
+        conn.close()
+        if args.tiempos:
+            for r in perf.resumen():
+                avisar(
+                    f"{r['tipo']:<5} {r['nombre']:<28} n={r['n']:<5} "
+                    f"total {r['total_ms']:9.1f} ms  p50 {r['p50']:8.2f}  max {r['max']:8.2f}"
+                )
+
+
+if __name__ == "__main__":
+    # Necesario para el pool de procesos de los PDF en el ejecutable empaquetado
+    multiprocessing.freeze_support()
+    sys.exit(main())
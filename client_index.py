@@ -0,0 +1,80 @@
+# client_index.py
+"""
+Índice en memoria para filtrar clientes mientras se escribe.
+
+Se construye una sola vez al cargar los clientes. Cada cliente tiene una
+clave normalizada (minúsculas, sin acentos) con NOMBRE, CIF y DIRECCION,
+y un índice de n-gramas (de 1 a 3 caracteres) que apunta a los clientes
+que los contienen.
+
+- Consultas de hasta 3 caracteres: el resultado es directamente la lista
+  del n-grama.
+- Si la consulta amplía la anterior (el usuario añade caracteres), el
+  resultado es un subconjunto del anterior y solo se filtra ese.
+- En otro caso se parte de la lista del trigrama menos frecuente y solo se
+  comprueban esos clientes.
+"""
+import unicodedata
+
+SEPARADOR = "\x00"  # evita coincidencias que crucen de un campo a otro
+
+
+def normalizar(texto) -> str:
+    """Minúsculas y sin acentos: "Fernández" -> "fernandez"."""
+    if texto is None:
+        return ""
+    texto = unicodedata.normalize("NFKD", str(texto))
+    return "".join(ch for ch in texto if not unicodedata.combining(ch)).lower()
+
+
+def ngramas(texto: str, n: int):
+    return {texto[i:i + n] for i in range(len(texto) - n + 1)}
+
+
+class IndiceClientes:
+    def __init__(self, filas, campos=("NOMBRE", "CIF", "DIRECCION")):
+        self.claves = []
+        self.ngramas = {}
+
+        for i, fila in enumerate(filas):
+            clave = SEPARADOR.join(normalizar(getattr(fila, c, "")) for c in campos)
+            self.claves.append(clave)
+            for n in (1, 2, 3):
+                for g in ngramas(clave, n):
+                    self.ngramas.setdefault(g, []).append(i)
+
+        self._todos = range(len(self.claves))
+        self._ultima_consulta = ""
+        self._ultimo_resultado = list(self._todos)
+
+    def __len__(self):
+        return len(self.claves)
+
+    def buscar(self, texto: str) -> list:
+        """Índices (en el orden original) de los clientes que contienen texto."""
+        consulta = normalizar(texto).strip()
+        if not consulta:
+            resultado = list(self._todos)
+        elif len(consulta) <= 3:
+            resultado = list(self.ngramas.get(consulta, ()))
+        elif self._ultima_consulta and self._ultima_consulta in consulta:
+            # Se han añadido caracteres: basta con filtrar el resultado anterior
+            resultado = self._filtrar(self._ultimo_resultado, consulta)
+        else:
+            candidatos = None
+            for t in ngramas(consulta, 3):
+                lista = self.ngramas.get(t)
+                if lista is None:
+                    candidatos = []
+                    break
+                if candidatos is None or len(lista) < len(candidatos):
+                    candidatos = lista
+            resultado = self._filtrar(candidatos, consulta)
+
+        self._ultima_consulta = consulta
+        self._ultimo_resultado = resultado
+        return resultado
+
+    def _filtrar(self, indices, consulta: str) -> list:
+        claves = self.claves
+        return [i for i in indices if consulta in claves[i]]
@@ -0,0 +1,226 @@
+# columnar.py
+"""
+Resultados de trabajos guardados por columnas (arrays de NumPy), para
+refinar, ordenar y totalizar en memoria sin volver a la base de datos.
+
+- FECHA como datetime64[D] (NaT si falta); CANTIDAD, PRECIO e Importe
+  como float64 (NaN si faltan).
+- CLIENTE y Datos como columnas de texto "categóricas": cada texto
+  distinto se guarda una vez y cada fila solo lleva un código entero. Para
+  buscar una subcadena se comprueba cada texto distinto una sola vez (hay
+  muchos menos que filas: clientes y descripciones se repiten) y el
+  resultado se reparte a las filas con los códigos.
+- Las filas originales se conservan para pintarlas en el listado.
+
+Las páginas que se van cargando se acumulan y los arrays se reconstruyen
+solo cuando hace falta consultar.
+"""
+import sys
+from datetime import date, datetime
+
+import numpy as np
+
+from client_index import normalizar
+
+
+class ColumnaTexto:
+    def __init__(self):
+        self.categorias = []   # textos distintos, en orden de aparición
+        self._codigo_de = {}   # texto -> código
+        self._normalizadas = []
+        self.codigos = np.empty(0, dtype=np.int32)
+
+    def anadir(self, valores):
+        codigos = np.empty(len(valores), dtype=np.int32)
+        for i, v in enumerate(valores):
+            v = "" if v is None else str(v)
+            codigo = self._codigo_de.get(v)
+            if codigo is None:
+                codigo = self._codigo_de[v] = len(self.categorias)
+                self.categorias.append(sys.intern(v))
+                self._normalizadas.append(normalizar(v))
+            codigos[i] = codigo
+        self.codigos = np.concatenate([self.codigos, codigos])
+
+    def contiene(self, texto: str) -> np.ndarray:
+        """Máscara de las filas cuyo texto contiene `texto`."""
+        buscado = normalizar(texto)
+        coincide = np.fromiter(
+            (buscado in n for n in self._normalizadas),
+            dtype=bool,
+            count=len(self._normalizadas),
+        )
+        return coincide[self.codigos]
+
+    def rangos(self) -> np.ndarray:
+        """Posición alfabética de cada categoría, para ordenar por códigos."""
+        orden = sorted(range(len(self.categorias)), key=self._normalizadas.__getitem__)
+        rangos = np.empty(len(orden), dtype=np.int32)
+        rangos[orden] = np.arange(len(orden), dtype=np.int32)
+        return rangos
+
+
+def _a_fecha(valor):
+    if valor is None:
+        return np.datetime64("NaT", "D")
+    if isinstance(valor, datetime):
+        valor = valor.date()
+    if isinstance(valor, date):
+        return np.datetime64(valor, "D")
+    return np.datetime64("NaT", "D")
+
+
+def _a_float(valor) -> float:
+    if valor is None:
+        return np.nan
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class ResultadoTrabajos:
+    COLUMNAS_NUMERICAS = ("fecha", "referencia", "cantidad", "precio", "importe")
+    COLUMNAS_TEXTO = ("cliente", "datos")
+
+    def __init__(self, filas=()):
+        self.filas = []
+        self._pendientes = []
+
+        self.fecha = np.empty(0, dtype="datetime64[D]")
+        self.referencia = np.empty(0, dtype=np.float64)
+        self.cantidad = np.empty(0, dtype=np.float64)
+        self.precio = np.empty(0, dtype=np.float64)
+        self.importe = np.empty(0, dtype=np.float64)
+        self.cliente = ColumnaTexto()
+        self.datos = ColumnaTexto()
+
+        self.extender(filas)
+
+    def __len__(self):
+        return len(self.filas)
+
+    def extender(self, filas):
+        """Añade filas (p.ej. una página más). Los arrays se crean al consultar."""
+        filas = list(filas)
+        self.filas.extend(filas)
+        self._pendientes.extend(filas)
+
+    # ---------------------------------------------------------
+    # Consultas
+    # ---------------------------------------------------------
+    def filtrar(
+        self,
+        importe_min=None,
+        importe_max=None,
+        desde=None,
+        hasta=None,
+        texto=None,
+        inicio: int = 0,
+    ) -> np.ndarray:
+        """
+        Índices de las filas (a partir de `inicio`) que cumplen todos los
+        filtros indicados. `texto` se busca en cliente y descripción.
+        """
+        self._materializar()
+        n = len(self.filas) - inicio
+        mascara = np.ones(n, dtype=bool)
+
+        if importe_min is not None:
+            mascara &= self.importe[inicio:] >= importe_min
+        if importe_max is not None:
+            mascara &= self.importe[inicio:] <= importe_max
+        if desde is not None:
+            mascara &= self.fecha[inicio:] >= _a_fecha(desde)
+        if hasta is not None:
+            mascara &= self.fecha[inicio:] <= _a_fecha(hasta)
+        if texto:
+            mascara &= (
+                self.cliente.contiene(texto)[inicio:] | self.datos.contiene(texto)[inicio:]
+            )
+
+        return np.flatnonzero(mascara) + inicio
+
+    def ordenar(self, indices, columna: str, descendente: bool = False) -> np.ndarray:
+        """
+        Reordena `indices` por una columna (orden estable; las fechas y
+        números que faltan van siempre al final).
+        """
+        self._materializar()
+        indices = np.asarray(indices, dtype=np.intp)
+        # argsort estable deja los NaN al final también en descendente
+        return indices[np.argsort(self._clave(indices, columna, descendente), kind="stable")]
+
+    def posiciones(self, ordenados, nuevos, columna: str, descendente: bool = False):
+        """
+        Para añadir filas a una vista ya ordenada sin reordenarla entera:
+        devuelve (nuevos ordenados, posición en `ordenados` ante la que va
+        cada uno); np.insert(ordenados, posiciones, nuevos) da el mismo
+        resultado que ordenar todo.
+        """
+        nuevos = self.ordenar(nuevos, columna, descendente)
+        ordenados = np.asarray(ordenados, dtype=np.intp)
+        posiciones = np.searchsorted(
+            self._clave(ordenados, columna, descendente),
+            self._clave(nuevos, columna, descendente),
+            side="right",  # tras los iguales, como el orden estable
+        )
+        return nuevos, posiciones
+
+    def totales(self, indices=None) -> dict:
+        self._materializar()
+        if indices is None:
+            importe, cantidad = self.importe, self.cantidad
+        else:
+            importe, cantidad = self.importe[indices], self.cantidad[indices]
+        return {
+            "trabajos": len(importe),
+            "cantidad": float(np.nansum(cantidad)),
+            "importe": round(float(np.nansum(importe)), 2),
+        }
+
+    def filas_de(self, indices) -> list:
+        filas = self.filas
+        return [filas[i] for i in indices]
+
+    # ---------------------------------------------------------
+    # Interno
+    # ---------------------------------------------------------
+    def _clave(self, indices, columna: str, descendente: bool) -> np.ndarray:
+        # Ascendente en el orden pedido; NaN (falta el dato) ordena al final
+        if columna in self.COLUMNAS_TEXTO:
+            col = getattr(self, columna)
+            clave = col.rangos()[col.codigos[indices]]
+        else:
+            clave = getattr(self, columna)[indices]
+            if columna == "fecha":
+                clave = clave.astype("int64").astype(np.float64)
+                clave[np.isnat(getattr(self, columna)[indices])] = np.nan
+        return -clave if descendente else clave
+
+    def _materializar(self):
+        if not self._pendientes:
+            return
+        nuevas = self._pendientes
+        self._pendientes = []
+
+        cantidad = np.array([_a_float(r.CANTIDAD) for r in nuevas], dtype=np.float64)
+        precio = np.array([_a_float(r.PRECIO) for r in nuevas], dtype=np.float64)
+        importe = np.array(
+            [_a_float(getattr(r, "Importe", None)) for r in nuevas], dtype=np.float64
+        )
+        # Importe calculado si la consulta no lo trae
+        falta = np.isnan(importe)
+        importe[falta] = np.round(cantidad[falta] * precio[falta], 2)
+
+        self.fecha = np.concatenate(
+            [self.fecha, np.array([_a_fecha(r.FECHA) for r in nuevas], dtype="datetime64[D]")]
+        )
+        self.referencia = np.concatenate(
+            [self.referencia, np.array([_a_float(r.REFERENCIA) for r in nuevas])]
+        )
+        self.cantidad = np.concatenate([self.cantidad, cantidad])
+        self.precio = np.concatenate([self.precio, precio])
+        self.importe = np.concatenate([self.importe, importe])
+        self.cliente.anadir([r.CLIENTE for r in nuevas])
+        self.datos.anadir([r.Datos for r in nuevas])
@@ -8,7 +8,11 @@ CONFIG_FILE = "config.json"
 # VALORES PREDETERMINADOS
 # ----------------------------
 DEFAULT_CONFIG = {
-    "db_path": ""     # ruta al archivo MDB
+    "db_path": "",        # ruta al archivo MDB
+    "usar_espejo": False,  # leer de una copia local SQLite del MDB
+    "cache_detalle_entradas": 500,  # facturas guardadas en la caché de detalle
+    "cache_detalle_mb": 20,         # memoria máxima aproximada de esa caché
+    "usar_snapshot": False,  # instantánea local de Clientes para cargarlos al momento
 }
 
 
@@ -44,3 +48,17 @@ def save_config(cfg: dict):
             json.dump(cfg, f, indent=4, ensure_ascii=False)
     except Exception as e:
         print("Error guardando config:", e)
+
+
+# ----------------------------
+# Carpeta de datos locales
+# ----------------------------
+def carpeta_datos_locales() -> str:
+    """
+    Carpeta local (no compartida) para copias y cachés de la aplicación.
+    En Windows usa %LOCALAPPDATA%; en otros sistemas ~/.cache.
+    """
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    carpeta = os.path.join(base, "ElectromecanicaLuis")
+    os.makedirs(carpeta, exist_ok=True)
+    return carpeta
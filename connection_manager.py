@@ -0,0 +1,203 @@
+# connection_manager.py
+"""
+Gestor de conexiones a la base de datos.
+
+- Cada hilo tiene su propia conexión (ni pyodbc ni sqlite3 permiten usar
+  una misma conexión a la vez desde varios hilos), así que el hilo de
+  consultas de la ventana y cualquier trabajo en segundo plano (PDF en
+  lote, precarga...) pueden consultar a la vez.
+- Antes de usar una conexión que lleva un rato sin usarse se comprueba con
+  una consulta mínima (ping del backend).
+- Si la conexión se ha caído (p.ej. un corte de la unidad de red), se
+  reconecta sola con esperas crecientes, y la consulta se repite una vez
+  (salvo en trabajos largos, que piden no repetirse).
+- Los hilos de trabajo que terminan deben llamar a liberar() para cerrar
+  su conexión. cerrar() (p.ej. al cambiar de base de datos) no corta las
+  conexiones de los hilos que siguen vivos: esas se cierran cuando su hilo
+  llama a liberar().
+- Lleva contadores de conexiones, reconexiones y fallos.
+"""
+import threading
+import time
+
+import db
+
+
+class ConnectionManager:
+    def __init__(
+        self,
+        db_path: str,
+        backend=None,
+        reintentos: int = 4,
+        espera_inicial: float = 0.5,
+        espera_max: float = 8.0,
+        validar_tras: float = 30.0,
+    ):
+        self.db_path = db_path
+        self.backend = backend or db.get_backend(db_path)
+        self.reintentos = reintentos
+        self.espera_inicial = espera_inicial
+        self.espera_max = espera_max
+        self.validar_tras = validar_tras  # segundos sin uso antes de validar
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conexiones = {}  # id de hilo -> (hilo, conexión)
+        self._cerrado = False
+
+        self.stats = {
+            "conexiones": 0,
+            "reconexiones": 0,
+            "fallos": 0,
+            "validaciones": 0,
+            "validaciones_fallidas": 0,
+        }
+
+    # ---------------------------------------------------------
+    # API
+    # ---------------------------------------------------------
+    def get(self):
+        """Conexión del hilo actual, validada y reabierta si hace falta."""
+        if self._cerrado:
+            raise RuntimeError("El gestor de conexiones está cerrado.")
+
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return self._abrir(reconexion=False)
+
+        if time.monotonic() - self._local.ultimo_uso > self.validar_tras:
+            self._contar("validaciones")
+            try:
+                self.backend.ping(conn)
+            except Exception:
+                self._contar("validaciones_fallidas")
+                self._descartar()
+                return self._abrir(reconexion=True)
+
+        self._local.ultimo_uso = time.monotonic()
+        return conn
+
+    def ejecutar(self, fn, reintentar: bool = True):
+        """
+        Ejecuta fn(conn) con la conexión del hilo actual. Si falla porque se
+        ha perdido la conexión, reconecta y lo intenta una vez más.
+
+        Con reintentar=False (exportaciones y demás trabajos largos, que
+        volverían a empezar de cero) la conexión caída se descarta pero el
+        error llega a quien llama.
+        """
+        conn = self.get()
+        try:
+            return fn(conn)
+        except Exception as e:
+            if not self.backend.es_error_conexion(e):
+                raise
+            self._contar("fallos")
+            self._descartar()
+            if not reintentar:
+                raise
+            conn = self._abrir(reconexion=True)
+            return fn(conn)
+
+    def liberar(self):
+        """
+        Cierra la conexión del hilo actual. Para llamarla en un finally al
+        terminar un hilo de trabajo (si no, su conexión queda abierta hasta
+        cerrar()).
+        """
+        self._descartar()
+
+    def descartar_si_caida(self, exc) -> bool:
+        """
+        Para quien lee fuera de ejecutar() (p.ej. un generador de lotes): si
+        `exc` indica que se ha perdido la conexión, descarta la del hilo
+        actual (la próxima get() abre otra) y devuelve True.
+        """
+        if not self.backend.es_error_conexion(exc):
+            return False
+        self._contar("fallos")
+        self._descartar()
+        return True
+
+    def cerrar(self):
+        """
+        No se abren más conexiones. Se cierran la del hilo actual y las de
+        los hilos que ya han terminado; las de hilos de trabajo aún en
+        marcha (una exportación, el lote de PDF...) pueden estar a mitad de
+        una consulta y se cierran cuando su hilo llama a liberar().
+        """
+        actual = threading.get_ident()
+        with self._lock:
+            self._cerrado = True
+            conexiones = []
+            for ident, (hilo, conn) in list(self._conexiones.items()):
+                if ident == actual or not hilo.is_alive():
+                    conexiones.append(conn)
+                    del self._conexiones[ident]
+        if getattr(self._local, "conn", None) is not None:
+            self._local.conn = None
+        for conn in conexiones:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            datos = dict(self.stats)
+            datos["abiertas"] = len(self._conexiones)
+        return datos
+
+    # ---------------------------------------------------------
+    # Interno
+    # ---------------------------------------------------------
+    def _abrir(self, reconexion: bool):
+        if self._cerrado:
+            raise RuntimeError("El gestor de conexiones está cerrado.")
+        espera = self.espera_inicial
+        ultimo_error = None
+        for intento in range(self.reintentos):
+            if intento:
+                time.sleep(espera)
+                espera = min(espera * 2, self.espera_max)
+            try:
+                conn = self.backend.connect(self.db_path)
+            except Exception as e:
+                self._contar("fallos")
+                ultimo_error = e
+                continue
+
+            with self._lock:
+                # Un hilo nuevo puede heredar el id de uno ya terminado
+                huerfana = self._conexiones.get(threading.get_ident())
+                if huerfana is not None:
+                    huerfana = huerfana[1]
+                self._conexiones[threading.get_ident()] = (threading.current_thread(), conn)
+                self.stats["conexiones"] += 1
+                if reconexion:
+                    self.stats["reconexiones"] += 1
+            if huerfana is not None:
+                try:
+                    huerfana.close()
+                except Exception:
+                    pass
+            self._local.conn = conn
+            self._local.ultimo_uso = time.monotonic()
+            return conn
+
+        raise ultimo_error
+
+    def _descartar(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        with self._lock:
+            self._conexiones.pop(threading.get_ident(), None)
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _contar(self, clave: str):
+        with self._lock:
+            self.stats[clave] += 1
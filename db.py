@@ -1,21 +1,332 @@
 # db.py
-import pyodbc
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from decimal import Decimal
 
-def connect(db_path: str):
-    conn_str = (
-        r"DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};"
-        rf"DBQ={db_path};"
-    )
-    return pyodbc.connect(conn_str)
+import fulltext
+from perf import CursorMedido
 
-def get_clientes(conn):
-    cur = conn.cursor()
-    cur.execute("SELECT NOMBRE, CIF, DIRECCION FROM Clientes ORDER BY NOMBRE;")
+# pyodbc tarda en cargarse: se importa al abrir el primer MDB, no al
+# arrancar la aplicación (ver _cargar_pyodbc)
+pyodbc = None
+
+
+def _cargar_pyodbc():
+    global pyodbc
+    if pyodbc is None:
+        try:
+            import pyodbc as modulo
+        except ImportError:  # p.ej. en Linux, donde solo se usa el backend SQLite
+            raise RuntimeError(
+                "pyodbc no está instalado: no se puede abrir una base de datos Access."
+            )
+        pyodbc = modulo
+    return pyodbc
+
+
+# ----------------------------
+# BACKENDS
+# ----------------------------
+# Las consultas de este módulo son comunes a todos los backends: solo usan
+# parámetros "?", LIKE con "%" y alias AS, que entienden tanto el driver de
+# Access como SQLite. Cada backend sabe abrir su conexión, devolver filas
+# con acceso por atributo (r.NUMERO, r.FECHA...) como pyodbc.Row, y
+# resolver las pocas diferencias de dialecto (p.ej. la búsqueda de texto).
+
+class AccessBackend:
+    """Base de datos Access (.mdb / .accdb) a través de pyodbc."""
+
+    nombre = "access"
+    extensiones = (".mdb", ".accdb")
+
+    def connect(self, db_path: str):
+        conn_str = (
+            r"DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};"
+            rf"DBQ={db_path};"
+        )
+        return _cargar_pyodbc().connect(conn_str)
+
+    def condicion_datos(self, conn, texto: str):
+        """Condición SQL (y su parámetro) para buscar texto en c.Datos."""
+        return "c.Datos LIKE ?", f"%{texto}%"
+
+    def limitar(self, n: int):
+        """(prefijo tras SELECT, sufijo tras ORDER BY) para devolver n filas."""
+        return f"TOP {int(n)}", ""
+
+    def ping(self, conn):
+        """Consulta mínima para comprobar que la conexión sigue viva."""
+        cur = conn.cursor()
+        cur.execute("SELECT TOP 1 NUMERO FROM Facting;")
+        cur.fetchall()
+        cur.close()
+
+    def es_error_conexion(self, exc) -> bool:
+        """True si el error indica que se ha perdido la conexión (SQLSTATE 08xxx)."""
+        # Sin pyodbc cargado todavía, el error no puede venir de Access
+        if pyodbc is None or not isinstance(exc, pyodbc.Error):
+            return False
+        estado = str(exc.args[0]) if exc.args else ""
+        return estado.startswith("08") or isinstance(exc, pyodbc.OperationalError)
+
+
+class ConexionSQLite(sqlite3.Connection):
+    """Conexión SQLite que puede guardar datos propios (p.ej. si hay índice FTS)."""
+
+    hay_fts = None  # lo rellena fulltext.hay_indice la primera vez
+
+
+class SQLiteBackend:
+    """
+    Base de datos SQLite con el mismo esquema Clientes/Facting/Contenid.
+    Permite ejecutar y medir las consultas fuera del equipo con el MDB.
+    """
+
+    nombre = "sqlite"
+    extensiones = (".db", ".sqlite", ".sqlite3")
+
+    def connect(self, db_path: str):
+        # Cada hilo usa su propia conexión; check_same_thread=False solo
+        # permite que el gestor de conexiones las cierre desde otro hilo.
+        conn = sqlite3.connect(
+            db_path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            factory=ConexionSQLite,
+        )
+        conn.row_factory = _fila_factory
+        return conn
+
+    def condicion_datos(self, conn, texto: str):
+        # Con índice de texto completo: búsqueda por palabras/prefijos
+        expresion = fulltext.expresion_busqueda(texto)
+        if expresion and fulltext.hay_indice(conn):
+            return (
+                f"c.rowid IN (SELECT rowid FROM {fulltext.TABLA_FTS} "
+                f"WHERE {fulltext.TABLA_FTS} MATCH ?)",
+                expresion,
+            )
+        return "c.Datos LIKE ?", f"%{texto}%"
+
+    def limitar(self, n: int):
+        return "", f"LIMIT {int(n)}"
+
+    def ping(self, conn):
+        conn.execute("SELECT 1;").fetchone()
+
+    def es_error_conexion(self, exc) -> bool:
+        if not isinstance(exc, sqlite3.OperationalError):
+            return False
+        msg = str(exc).lower()
+        return "unable to open" in msg or "disk i/o" in msg
+
+
+BACKENDS = (AccessBackend(), SQLiteBackend())
+
+SQLITE_ESQUEMA = """
+    CREATE TABLE IF NOT EXISTS Clientes (
+        NOMBRE TEXT,
+        CIF TEXT,
+        DIRECCION TEXT
+    );
+    CREATE TABLE IF NOT EXISTS Facting (
+        NUMERO INTEGER NOT NULL,
+        FECHA TIMESTAMP,
+        CLIENTE TEXT,
+        CIF TEXT,
+        TOTAL REAL,
+        BASE1 REAL,
+        IVA1 REAL
+    );
+    CREATE TABLE IF NOT EXISTS Contenid (
+        REFERENCIA INTEGER NOT NULL,
+        Codigo TEXT,
+        Datos TEXT,
+        CANTIDAD REAL,
+        PRECIO REAL
+    );
+"""
+
+
+def get_backend(db_path: str):
+    """Elige el backend según la extensión del archivo (Access por defecto)."""
+    ext = os.path.splitext(db_path)[1].lower()
+    for backend in BACKENDS:
+        if ext in backend.extensiones:
+            return backend
+    return BACKENDS[0]
+
+
+def backend_de(conn):
+    """Devuelve el backend al que pertenece una conexión ya abierta."""
+    if isinstance(conn, sqlite3.Connection):
+        return BACKENDS[1]
+    return BACKENDS[0]
+
+
+def connect(db_path: str, backend=None):
+    backend = backend or get_backend(db_path)
+    return backend.connect(db_path)
+
+
+def crear_esquema(conn):
+    """Crea las tablas Clientes/Facting/Contenid en una base SQLite vacía."""
+    conn.executescript(SQLITE_ESQUEMA)
+    conn.commit()
+    fulltext.asegurar_indice(conn)
+
+
+# ----------------------------
+# Filas con acceso por atributo (SQLite)
+# ----------------------------
+_clases_fila = {}
+_ultima_clase = (None, None)  # (cursor.description, clase) de la última consulta
+
+
+def _fila_factory(cursor, row):
+    # description es la misma tupla para todas las filas de una consulta:
+    # solo se calculan los campos cuando cambia
+    global _ultima_clase
+    descripcion = cursor.description
+    ultima = _ultima_clase
+    if ultima[0] is descripcion:
+        return ultima[1]._make(row)
+    campos = tuple(d[0] for d in descripcion)
+    cls = _clases_fila.get(campos)
+    if cls is None:
+        cls = namedtuple("Fila", campos, rename=True)
+        _clases_fila[campos] = cls
+    _ultima_clase = (descripcion, cls)
+    return cls._make(row)
+
+
+# Las fechas se guardan como texto ISO y se leen como datetime, igual que
+# las devuelve el driver de Access (las pestañas usan fecha.strftime()).
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_adapter(Decimal, float)  # campos Moneda de Access
+
+
+def parse_fecha(valor):
+    """Convierte una fecha ISO guardada como texto en datetime."""
+    if valor is None or isinstance(valor, datetime):
+        return valor
+    if isinstance(valor, bytes):
+        valor = valor.decode()
+    return datetime.fromisoformat(valor)
+
+
+sqlite3.register_converter("TIMESTAMP", parse_fecha)
+
+
+
+# ----------------------------
+# REGISTRO DE CONSULTAS Y CURSORES
+# ----------------------------
+# Cada variante de una consulta (p.ej. facturas por cliente y fechas) se
+# construye una sola vez y después se usa siempre el mismo texto SQL. Cada
+# consulta abre su propio cursor: reservar un cursor por sentencia no
+# mejoraba nada medible (bench sql.seleccion_facturas).
+
+class RegistroConsultas:
+    """
+    Texto SQL de cada variante de consulta. La clave identifica la variante
+    (consulta, filtros usados, backend), nunca los valores: esos van
+    siempre como parámetros "?".
+    """
+
+    def __init__(self):
+        self._sql = {}
+
+    def sql(self, clave, construir) -> str:
+        texto = self._sql.get(clave)
+        if texto is None:
+            # Si dos hilos la construyen a la vez, las dos quedan con el mismo objeto
+            texto = self._sql.setdefault(clave, " ".join(construir().split()))
+        return texto
+
+    def __len__(self):
+        return len(self._sql)
+
+
+CONSULTAS = RegistroConsultas()
+
+_lock_stats = threading.Lock()
+_stats_cursores = {"nuevos": 0}
+
+
+def preparar_cursor(cur):
+    """Ajustes comunes de todo cursor que se abre en este módulo."""
+    cur.arraysize = TAM_LOTE  # filas por viaje al driver en fetchmany
+    if hasattr(cur, "fast_executemany"):
+        cur.fast_executemany = True  # pyodbc: executemany en un solo envío
+    return cur
+
+
+def nuevo_cursor(conn, nombre: str):
+    """Cursor preparado y medido; `nombre` es el de la consulta en perf."""
+    with _lock_stats:
+        _stats_cursores["nuevos"] += 1
+    return CursorMedido(preparar_cursor(conn.cursor()), nombre)
+
+
+def estadisticas_consultas() -> dict:
+    """Variantes de consulta registradas y cursores abiertos."""
+    with _lock_stats:
+        datos = dict(_stats_cursores)
+    datos["variantes"] = len(CONSULTAS)
+    return datos
+
+
+# ----------------------------
+# CONSULTAS
+# ----------------------------
+TAM_PAGINA = 200  # filas por página en las consultas paginadas
+
+TAM_LOTE = 500     # filas por lote en las variantes *_lotes (fetchmany)
+
+SQL_CLIENTES = "SELECT NOMBRE, CIF, DIRECCION FROM Clientes ORDER BY NOMBRE;"
+
+SQL_LINEAS_FACTURA = (
+    "SELECT Codigo, Datos, CANTIDAD, PRECIO, (CANTIDAD * PRECIO) AS Importe "
+    "FROM Contenid WHERE REFERENCIA = ?"
+)
+
+def _leer(conn, nombre, sql, params=()):
+    """Ejecuta `sql` en un cursor nuevo y devuelve todas las filas."""
+    cur = nuevo_cursor(conn, nombre)
+    cur.execute(sql, params)
     rows = cur.fetchall()
     cur.close()
     return rows
 
-def get_facturas(conn, cliente=None, numero=None):
+def get_clientes(conn):
+    return _leer(conn, "get_clientes", SQL_CLIENTES)
+
+def get_clientes_lotes(conn, lote=TAM_LOTE):
+    """Como get_clientes, pero genera las filas en listas de `lote`."""
+    cur = nuevo_cursor(conn, "get_clientes_lotes")
+    cur.execute(SQL_CLIENTES)
+    return _por_lotes(cur, lote)
+
+def _por_lotes(cur, lote):
+    """
+    Generador de listas de como mucho `lote` filas con fetchmany. Si se deja
+    de consumir (close() o se descarta) el cursor se cierra igualmente.
+    """
+    try:
+        while True:
+            filas = cur.fetchmany(lote)
+            if not filas:
+                break
+            yield filas
+    finally:
+        cur.close()
+
+def _filtro_facturas(cliente=None, numero=None, desde=None, hasta=None, rango=None):
     where = []
     params = []
     if cliente:
@@ -24,65 +335,259 @@ def get_facturas(conn, cliente=None, numero=None):
     if numero:
         where.append("NUMERO = ?")
         params.append(numero)
+    if desde:
+        where.append("FECHA >= ?")
+        params.append(desde)
+    if hasta:
+        # hasta es inclusivo: todo el día indicado
+        where.append("FECHA < ?")
+        params.append(_dia_siguiente(hasta))
+    if rango:
+        # (primero, último) número de factura, ambos incluidos
+        where.append("NUMERO >= ? AND NUMERO <= ?")
+        params.extend(rango)
+    return where, params
+
+
+def _dia_siguiente(fecha):
+    if not isinstance(fecha, datetime):
+        fecha = datetime(fecha.year, fecha.month, fecha.day)
+    return fecha.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
 
-    where_clause = ""
-    if where:
-        where_clause = "WHERE " + " AND ".join(where)
 
-    query = f"""
+def _where(where):
+    if not where:
+        return ""
+    return "WHERE " + " AND ".join(where)
+
+
+def _despues_de(col_fecha: str, col_numero: str, despues):
+    """
+    Condición de paginación por clave (keyset) para un orden
+    FECHA DESC, NUMERO DESC: filas posteriores a la última ya mostrada.
+    Las FECHA nulas van al final tanto en Access como en SQLite.
+    """
+    fecha, numero = despues
+    if fecha is None:
+        return f"({col_fecha} IS NULL AND {col_numero} < ?)", [numero]
+    return (
+        f"({col_fecha} < ? OR ({col_fecha} = ? AND {col_numero} < ?) OR {col_fecha} IS NULL)",
+        [fecha, fecha, numero],
+    )
+
+
+def _consulta_facturas(
+    cliente=None, numero=None, desde=None, hasta=None, rango=None, ascendente=False
+):
+    where, params = _filtro_facturas(cliente, numero, desde, hasta, rango)
+    # De la más reciente a la más antigua; ascendente: al revés (libro de facturas)
+    orden = "FECHA, NUMERO" if ascendente else "FECHA DESC"
+    query = CONSULTAS.sql(("facturas", tuple(where), ascendente), lambda: f"""
         SELECT NUMERO, FECHA, CLIENTE, CIF, TOTAL, BASE1, IVA1
         FROM Facting
-        {where_clause}
-        ORDER BY FECHA DESC;
-    """
+        {_where(where)}
+        ORDER BY {orden};
+    """)
+    return query, params
 
-    cur = conn.cursor()
+def get_facturas(conn, cliente=None, numero=None, desde=None, hasta=None, rango=None):
+    query, params = _consulta_facturas(cliente, numero, desde, hasta, rango)
+    return _leer(conn, "get_facturas", query, params)
+
+def get_facturas_lotes(
+    conn,
+    cliente=None,
+    numero=None,
+    desde=None,
+    hasta=None,
+    rango=None,
+    lote=TAM_LOTE,
+    ascendente=False,
+):
+    """
+    Como get_facturas, pero genera las filas en listas de `lote`.
+    ascendente=True: de la más antigua a la más reciente.
+    """
+    query, params = _consulta_facturas(cliente, numero, desde, hasta, rango, ascendente)
+    cur = nuevo_cursor(conn, "get_facturas_lotes")
     cur.execute(query, params)
-    rows = cur.fetchall()
-    cur.close()
-    return rows
+    return _por_lotes(cur, lote)
+
+def get_facturas_pagina(conn, cliente=None, numero=None, limite=TAM_PAGINA, despues=None):
+    """
+    Devuelve (filas, siguiente) con como mucho `limite` facturas.
+    `despues` es el `siguiente` de la página anterior (FECHA, NUMERO de la
+    última factura vista); None para la primera página. `siguiente` es None
+    cuando ya no hay más. Sin OFFSET: cualquier página cuesta lo mismo.
+    """
+    where, params = _filtro_facturas(cliente, numero)
+    if despues is not None:
+        condicion, p = _despues_de("FECHA", "NUMERO", despues)
+        where.append(condicion)
+        params.extend(p)
+    backend = backend_de(conn)
+
+    def construir():
+        top, limit = backend.limitar(limite)
+        return f"""
+            SELECT {top} NUMERO, FECHA, CLIENTE, CIF, TOTAL, BASE1, IVA1
+            FROM Facting
+            {_where(where)}
+            ORDER BY FECHA DESC, NUMERO DESC
+            {limit};
+        """
+
+    query = CONSULTAS.sql(("facturas_pagina", backend.nombre, limite, tuple(where)), construir)
+    rows = _leer(conn, "get_facturas_pagina", query, params)
+
+    siguiente = None
+    if len(rows) >= limite:
+        siguiente = (rows[-1].FECHA, rows[-1].NUMERO)
+    return rows, siguiente
+
+def contar_facturas(conn, cliente=None, numero=None, desde=None, hasta=None, rango=None):
+    where, params = _filtro_facturas(cliente, numero, desde, hasta, rango)
+    query = CONSULTAS.sql(
+        ("contar_facturas", tuple(where)), lambda: f"SELECT COUNT(*) FROM Facting {_where(where)};"
+    )
+    return _leer(conn, "contar_facturas", query, params)[0][0]
 
 def get_lineas_factura(conn, numero):
-    query = """
-        SELECT
-            Codigo,
-            Datos,
-            CANTIDAD,
-            PRECIO,
-            (CANTIDAD * PRECIO) AS Importe
-        FROM Contenid
-        WHERE REFERENCIA = ?
-    """
-    cur = conn.cursor()
-    cur.execute(query, (numero,))
-    rows = cur.fetchall()
-    cur.close()
-    return rows
+    return _leer(conn, "get_lineas_factura", SQL_LINEAS_FACTURA, (numero,))
 
-def get_trabajos(conn, cliente=None, texto=None):
+def get_lineas_facturas(conn, numeros, lote=200):
+    """
+    Líneas de varias facturas a la vez, con IN (...) en bloques de `lote`.
+    Devuelve {str(numero): [líneas]} con las mismas claves str() de los
+    números pedidos; las facturas sin líneas no aparecen.
+    """
+    numeros = list(dict.fromkeys(str(n) for n in numeros))
+    # REFERENCIA puede venir como 101.0 aunque se pidiera "101"
+    claves = {_numero_normalizado(n): n for n in numeros}
+    resultado = {}
+    for i in range(0, len(numeros), lote):
+        bloque = numeros[i:i + lote]
+        # Una variante por tamaño de bloque: todos los bloques llenos
+        # comparten la misma sentencia
+        query = CONSULTAS.sql(("lineas_facturas", len(bloque)), lambda: f"""
+            SELECT
+                REFERENCIA,
+                Codigo,
+                Datos,
+                CANTIDAD,
+                PRECIO,
+                (CANTIDAD * PRECIO) AS Importe
+            FROM Contenid
+            WHERE REFERENCIA IN ({", ".join("?" * len(bloque))})
+        """)
+        for r in _leer(conn, "get_lineas_facturas", query, bloque):
+            clave = claves.get(_numero_normalizado(r.REFERENCIA), str(r.REFERENCIA))
+            resultado.setdefault(clave, []).append(r)
+    return resultado
+
+
+def _numero_normalizado(valor):
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        return str(valor).strip()
+    return int(numero) if numero.is_integer() else numero
+
+def _filtro_trabajos(conn, cliente=None, texto=None):
     where = []
     params = []
     if cliente:
         where.append("f.CLIENTE LIKE ?")
         params.append(f"%{cliente}%")
     if texto:
-        where.append("c.Datos LIKE ?")
-        params.append(f"%{texto}%")
-    where_clause = ""
-    if where:
-        where_clause = "WHERE " + " AND ".join(where)
+        condicion, param = backend_de(conn).condicion_datos(conn, texto)
+        where.append(condicion)
+        params.append(param)
+    return where, params
+
 
-    query = f"""
+def _consulta_trabajos(conn, cliente=None, texto=None):
+    where, params = _filtro_trabajos(conn, cliente, texto)
+    query = CONSULTAS.sql(("trabajos", tuple(where)), lambda: f"""
         SELECT f.FECHA, c.REFERENCIA, f.CLIENTE, c.Datos,
                c.CANTIDAD, c.PRECIO,
                (c.CANTIDAD * c.PRECIO) AS Importe
         FROM Contenid AS c
         INNER JOIN Facting AS f ON c.REFERENCIA = f.NUMERO
-        {where_clause}
+        {_where(where)}
         ORDER BY f.FECHA DESC;
-    """
-    cur = conn.cursor()
+    """)
+    return query, params
+
+def get_trabajos(conn, cliente=None, texto=None):
+    query, params = _consulta_trabajos(conn, cliente, texto)
+    return _leer(conn, "get_trabajos", query, params)
+
+def get_trabajos_lotes(conn, cliente=None, texto=None, lote=TAM_LOTE):
+    """Como get_trabajos, pero genera las filas en listas de `lote`."""
+    query, params = _consulta_trabajos(conn, cliente, texto)
+    cur = nuevo_cursor(conn, "get_trabajos_lotes")
     cur.execute(query, params)
-    rows = cur.fetchall()
-    cur.close()
-    return rows
+    return _por_lotes(cur, lote)
+
+def get_trabajos_pagina(conn, cliente=None, texto=None, limite=TAM_PAGINA, despues=None):
+    """
+    Como get_facturas_pagina pero para trabajos. El cursor es la factura
+    (FECHA, REFERENCIA) de la última línea, y una página nunca parte las
+    líneas de una factura: si la última factura puede estar incompleta se
+    deja para la página siguiente.
+    """
+    where, params = _filtro_trabajos(conn, cliente, texto)
+    if despues is not None:
+        condicion, p = _despues_de("f.FECHA", "c.REFERENCIA", despues)
+        where.append(condicion)
+        params.extend(p)
+
+    backend = backend_de(conn)
+
+    def consultar(where, params, limite=None):
+        def construir():
+            top, limit = backend.limitar(limite) if limite else ("", "")
+            return f"""
+                SELECT {top} f.FECHA, c.REFERENCIA, f.CLIENTE, c.Datos,
+                       c.CANTIDAD, c.PRECIO,
+                       (c.CANTIDAD * c.PRECIO) AS Importe
+                FROM Contenid AS c
+                INNER JOIN Facting AS f ON c.REFERENCIA = f.NUMERO
+                {_where(where)}
+                ORDER BY f.FECHA DESC, c.REFERENCIA DESC
+                {limit};
+            """
+
+        clave = ("trabajos_pagina", backend.nombre, limite, tuple(where))
+        return _leer(conn, "get_trabajos_pagina", CONSULTAS.sql(clave, construir), params)
+
+    rows = consultar(where, params, limite)
+    if len(rows) < limite:
+        return rows, None
+
+    ultima = rows[-1].REFERENCIA
+    completas = [r for r in rows if r.REFERENCIA != ultima]
+    if not completas:
+        # Una sola factura con más líneas que la página: se trae entera
+        rows = consultar(where + ["c.REFERENCIA = ?"], params + [ultima])
+    else:
+        rows = completas
+    return rows, (rows[-1].FECHA, rows[-1].REFERENCIA)
+
+def contar_trabajos(conn, cliente=None, texto=None):
+    where, params = _filtro_trabajos(conn, cliente, texto)
+    query = CONSULTAS.sql(("contar_trabajos", tuple(where)), lambda: f"""
+        SELECT COUNT(*)
+        FROM Contenid AS c
+        INNER JOIN Facting AS f ON c.REFERENCIA = f.NUMERO
+        {_where(where)};
+    """)
+    return _leer(conn, "contar_trabajos", query, params)[0][0]
+
+
+def fila_a_dict(row) -> dict:
+    """Copia una fila (pyodbc.Row o Fila de SQLite) a un dict campo -> valor."""
+    if hasattr(row, "_asdict"):
+        return row._asdict()
+    return {d[0]: v for d, v in zip(row.cursor_description, row)}
@@ -0,0 +1,162 @@
+# detail_cache.py
+"""
+Caché LRU del detalle de factura (cabecera + líneas) por número.
+
+Entre las pestañas de Trabajos y Facturas se vuelve una y otra vez a las
+mismas facturas; con la caché, abrir una factura ya vista no consulta la
+base de datos.
+
+- Limitada por número de facturas y por memoria aproximada.
+- Se vacía al cambiar de base de datos (vincular) y cuando cambia el
+  archivo de la base de datos (tamaño o fecha de modificación).
+- Contadores de aciertos y fallos para ajustar el tamaño.
+"""
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from db import get_facturas, get_lineas_factura
+
+
+def _tam_filas(filas) -> int:
+    """Memoria aproximada de unas filas (la fila y sus valores)."""
+    total = 0
+    for f in filas:
+        total += sys.getsizeof(f)
+        for v in f:
+            total += sys.getsizeof(v)
+    return total
+
+
+class CacheDetalle:
+    def __init__(
+        self,
+        max_entradas: int = 500,
+        max_mb: float = 20,
+        comprobar_cada: float = 5.0,
+    ):
+        self.max_entradas = max_entradas
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.comprobar_cada = comprobar_cada  # segundos entre comprobaciones del archivo
+
+        self._lock = threading.Lock()
+        self._datos = OrderedDict()  # numero -> (cabecera, lineas, bytes)
+        self._bytes = 0
+        self._db_path = None
+        self._firma = None
+        self._comprobado = 0.0
+
+        self.stats = {
+            "aciertos": 0,
+            "fallos": 0,
+            "expulsiones": 0,
+            "invalidaciones": 0,
+        }
+
+    # ---------------------------------------------------------
+    # API
+    # ---------------------------------------------------------
+    def vincular(self, db_path: str | None):
+        """Asocia la caché a una base de datos (None = sin conexión) y la vacía."""
+        with self._lock:
+            self._db_path = db_path
+            self._firma = self._leer_firma()
+            self._comprobado = time.monotonic()
+            self._vaciar()
+
+    def obtener(self, numero):
+        """(cabecera, líneas) de la factura, o None si no está en la caché."""
+        numero = str(numero)
+        with self._lock:
+            self._comprobar_archivo()
+            entrada = self._datos.get(numero)
+            if entrada is None:
+                self.stats["fallos"] += 1
+                return None
+            self._datos.move_to_end(numero)
+            self.stats["aciertos"] += 1
+            return entrada[0], entrada[1]
+
+    def guardar(self, numero, cabecera, lineas):
+        numero = str(numero)
+        lineas = list(lineas)
+        tam = _tam_filas([cabecera]) + _tam_filas(lineas)
+        with self._lock:
+            if self._db_path is None or tam > self.max_bytes:
+                return
+            anterior = self._datos.pop(numero, None)
+            if anterior is not None:
+                self._bytes -= anterior[2]
+            self._datos[numero] = (cabecera, lineas, tam)
+            self._bytes += tam
+            while len(self._datos) > self.max_entradas or self._bytes > self.max_bytes:
+                _, (_, _, t) = self._datos.popitem(last=False)
+                self._bytes -= t
+                self.stats["expulsiones"] += 1
+
+    def invalidar(self):
+        with self._lock:
+            self._vaciar()
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            datos = dict(self.stats)
+            datos["entradas"] = len(self._datos)
+            datos["bytes"] = self._bytes
+        consultas = datos["aciertos"] + datos["fallos"]
+        datos["tasa_aciertos"] = datos["aciertos"] / consultas if consultas else 0.0
+        return datos
+
+    # ---------------------------------------------------------
+    # Interno (con el lock tomado)
+    # ---------------------------------------------------------
+    def _vaciar(self):
+        if self._datos:
+            self.stats["invalidaciones"] += 1
+        self._datos.clear()
+        self._bytes = 0
+
+    def _leer_firma(self):
+        if self._db_path is None:
+            return None
+        try:
+            st = os.stat(self._db_path)
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def _comprobar_archivo(self):
+        # os.stat en una unidad de red no es gratis: como mucho cada pocos segundos
+        ahora = time.monotonic()
+        if ahora - self._comprobado < self.comprobar_cada:
+            return
+        self._comprobado = ahora
+        firma = self._leer_firma()
+        if firma != self._firma:
+            self._firma = firma
+            self._vaciar()
+
+
+def detalle_factura(conn, numero, cache: CacheDetalle | None = None, cabecera=None):
+    """
+    (cabecera, líneas) de una factura, de la caché si está. `cabecera` se
+    usa si ya se tiene, para no volver a pedirla. Devuelve (None, []) si la
+    factura no existe.
+    """
+    if cache is not None:
+        detalle = cache.obtener(numero)
+        if detalle is not None:
+            return detalle
+
+    if cabecera is None:
+        filas = get_facturas(conn, cliente=None, numero=str(numero))
+        if not filas:
+            return None, []
+        cabecera = filas[0]
+    lineas = get_lineas_factura(conn, str(numero))
+
+    if cache is not None:
+        cache.guardar(numero, cabecera, lineas)
+    return cabecera, lineas
@@ -0,0 +1,97 @@
+# fulltext.py
+"""
+Índice de texto completo (FTS5) sobre Contenid.Datos.
+
+Solo existe en bases SQLite (copia local del MDB o base de pruebas): el
+driver de Access no tiene nada equivalente, así que con Access se sigue
+usando LIKE '%texto%'.
+
+- Búsqueda por palabras y prefijos: "rodamiento" encuentra "Rodamientos".
+- Sin distinguir mayúsculas ni acentos: "valvula" encuentra "Válvula".
+- El índice se mantiene con triggers sobre Contenid, de modo que cada línea
+  nueva que copia la sincronización del espejo queda indexada al momento.
+"""
+import re
+
+TABLA_FTS = "ContenidFTS"
+
+FTS_ESQUEMA = f"""
+    CREATE VIRTUAL TABLE {TABLA_FTS} USING fts5(
+        Datos,
+        content='Contenid',
+        content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    );
+    CREATE TRIGGER IF NOT EXISTS contenid_fts_ai AFTER INSERT ON Contenid BEGIN
+        INSERT INTO {TABLA_FTS} (rowid, Datos) VALUES (new.rowid, new.Datos);
+    END;
+    CREATE TRIGGER IF NOT EXISTS contenid_fts_ad AFTER DELETE ON Contenid BEGIN
+        INSERT INTO {TABLA_FTS} ({TABLA_FTS}, rowid, Datos)
+        VALUES ('delete', old.rowid, old.Datos);
+    END;
+    CREATE TRIGGER IF NOT EXISTS contenid_fts_au AFTER UPDATE ON Contenid BEGIN
+        INSERT INTO {TABLA_FTS} ({TABLA_FTS}, rowid, Datos)
+        VALUES ('delete', old.rowid, old.Datos);
+        INSERT INTO {TABLA_FTS} (rowid, Datos) VALUES (new.rowid, new.Datos);
+    END;
+"""
+
+_PALABRA = re.compile(r"\w", re.UNICODE)
+
+
+def hay_indice(conn) -> bool:
+    """
+    Si la base tiene el índice. Se consulta sqlite_master solo la primera
+    vez: el resultado se guarda en la conexión (db.ConexionSQLite.hay_fts).
+    """
+    guardado = getattr(conn, "hay_fts", None)
+    if guardado is not None:
+        return guardado
+    fila = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?;",
+        (TABLA_FTS,),
+    ).fetchone()
+    _recordar(conn, fila is not None)
+    return fila is not None
+
+
+def _recordar(conn, hay: bool):
+    try:
+        conn.hay_fts = hay
+    except AttributeError:
+        pass  # sqlite3.Connection normal (sin db.ConexionSQLite): no se guarda
+
+
+def asegurar_indice(conn) -> bool:
+    """
+    Crea el índice (y sus triggers) si no existe, indexando las líneas que
+    ya haya en Contenid. Devuelve False si este SQLite no incluye FTS5.
+    """
+    if hay_indice(conn):
+        return True
+    try:
+        conn.executescript(FTS_ESQUEMA)
+    except Exception:
+        # SQLite compilado sin FTS5: seguimos con LIKE
+        return False
+    conn.execute(f"INSERT INTO {TABLA_FTS} ({TABLA_FTS}) VALUES ('rebuild');")
+    conn.commit()
+    _recordar(conn, True)
+    return True
+
+
+def expresion_busqueda(texto: str) -> str | None:
+    """
+    Convierte el texto del usuario en una consulta MATCH: todas las palabras
+    deben aparecer, cada una como prefijo. Devuelve None si no hay palabras.
+    """
+    terminos = []
+    for palabra in texto.split():
+        if not _PALABRA.search(palabra):
+            continue
+        palabra = palabra.replace('"', '""')
+        terminos.append(f'"{palabra}"*')
+    if not terminos:
+        return None
+    return " AND ".join(terminos)
@@ -1,10 +1,16 @@
 # invoice_pdf.py
-import os, sys
+import os, sys, time
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import mm
 
+import perf
 from db import get_facturas, get_lineas_factura
+from pdf_cache import clave_factura, cache_por_defecto
+from text_layout import partir_lineas
+
+# Subir al cambiar el diseño del PDF: invalida los PDF guardados en caché
+VERSION_PLANTILLA = 2
 
 def resource_path(relative_path: str) -> str:
     """
@@ -17,31 +23,115 @@ def resource_path(relative_path: str) -> str:
     return os.path.join(base_path, relative_path)
 
 
-def generar_pdf_factura(conn, numero_factura: str | int, ruta_salida: str):
+def generar_pdf_factura(
+    conn, numero_factura: str | int, ruta_salida: str, usar_cache: bool = True
+):
     """
     Genera un PDF de la factura indicada en ruta_salida.
     Usa los datos de Facting y Contenid a través de db.py
+    Si la factura no ha cambiado desde la última vez, copia el PDF de la caché.
+    Los tiempos de cada fase (fetch, layout, render, save) quedan en perf.
     """
     numero_factura = str(numero_factura)
 
-    # 1) Obtener cabecera
-    facturas = get_facturas(conn, cliente=None, numero=numero_factura)
-    if not facturas:
-        raise ValueError(f"No se ha encontrado la factura {numero_factura}")
+    with perf.medir("pdf", "total", factura=numero_factura) as medida:
+        with perf.medir("pdf", "fetch", factura=numero_factura) as datos:
+            # 1) Obtener cabecera
+            facturas = get_facturas(conn, cliente=None, numero=numero_factura)
+            if not facturas:
+                raise ValueError(f"No se ha encontrado la factura {numero_factura}")
+
+            cab = facturas[0]
+
+            # 2) Obtener líneas
+            lineas = get_lineas_factura(conn, numero_factura)
+            datos["filas"] = len(lineas)
+
+        # 3) Crear PDF (o copiarlo de la caché)
+        if usar_cache:
+            medida["cache"] = generar_con_cache(cab, lineas, ruta_salida, cache_por_defecto())
+        else:
+            render_pdf_factura(cab, lineas, ruta_salida)
+            medida["cache"] = False
+
 
-    cab = facturas[0]
+def generar_con_cache(cab, lineas, ruta_salida: str, cache) -> bool:
+    """
+    Copia el PDF de la caché si está; si no, lo dibuja y lo guarda en ella.
+    Devuelve True si ha sido un acierto de caché.
+    """
+    clave = clave_factura(cab, lineas, VERSION_PLANTILLA)
+    if cache.copiar(clave, ruta_salida):
+        return True
+    render_pdf_factura(cab, lineas, ruta_salida)
+    cache.guardar(clave, ruta_salida)
+    return False
 
-    # 2) Obtener líneas
-    lineas = get_lineas_factura(conn, numero_factura)
 
-    # 3) Crear PDF
+def render_pdf_factura(cab, lineas, ruta_salida: str):
+    """
+    Dibuja el PDF a partir de la cabecera y las líneas ya leídas.
+    Solo necesita acceso por atributo (cab.NUMERO, lin.Datos...), así que
+    sirve tanto con filas de la BBDD como con datos copiados a otro proceso.
+    """
+    inicio = time.perf_counter()
     c = canvas.Canvas(ruta_salida, pagesize=A4)
+    y = _definir_cabecera_empresa(c)
+    ms_layout = _dibujar_factura(c, cab, lineas, y)
+    ms_dibujo = (time.perf_counter() - inicio) * 1000
+
+    numero = str(cab.NUMERO)
+    perf.registrar("pdf", "layout", ms_layout, factura=numero, filas=len(lineas))
+    perf.registrar("pdf", "render", ms_dibujo - ms_layout, factura=numero)
+    with perf.medir("pdf", "save", factura=numero):
+        c.save()
+
+
+def render_libro_facturas(facturas, ruta_salida: str, progreso=None) -> int:
+    """
+    Dibuja muchas facturas seguidas en un único PDF (libro de facturas).
+    `facturas` es un iterable (p.ej. un generador) de (cabecera, líneas):
+    se consume de uno en uno, sin tener todas las facturas en memoria. Las
+    páginas ya dibujadas sí se quedan en memoria (el Canvas de reportlab
+    las guarda hasta save()). El logo y los datos de la empresa se incluyen
+    una sola vez en el PDF y cada factura los reutiliza. Devuelve cuántas
+    facturas se han dibujado.
+    """
+    with perf.medir("pdf", "libro") as medida:
+        c = canvas.Canvas(ruta_salida, pagesize=A4)
+        y = _definir_cabecera_empresa(c)
+
+        n = 0
+        for cab, lineas in facturas:
+            _dibujar_factura(c, cab, lineas, y)
+            n += 1
+            if progreso:
+                progreso(n)
+
+        if n == 0:
+            c.showPage()  # un PDF sin páginas no es válido
+        with perf.medir("pdf", "save_libro", filas=n):
+            c.save()
+        medida["filas"] = n
+    return n
+
+
+FORM_CABECERA = "cabecera_empresa"
+
+
+def _definir_cabecera_empresa(c) -> float:
+    """
+    Define en el PDF el bloque fijo de logo + datos de la empresa como un
+    objeto reutilizable (form XObject). Devuelve la y donde sigue la factura.
+    """
     width, height = A4
 
     margen_izq = 20 * mm
     margen_der = width - 20 * mm
     y = height - 20 * mm
 
+    c.beginForm(FORM_CABECERA)
+
     # ---- LOGOTIPO (arriba a la derecha) ----
     logo_ancho = 35 * mm      # ← los definimos SIEMPRE
     logo_alto = 35 * mm
@@ -78,6 +168,23 @@ def generar_pdf_factura(conn, numero_factura: str | int, ruta_salida: str):
     c.drawString(margen_izq, y, "NIF: 72179705R")
     y -= 10 * mm
 
+    c.endForm()
+    return y
+
+
+def _dibujar_factura(c, cab, lineas, y: float):
+    """
+    Dibuja una factura completa (una o varias páginas) en el canvas.
+    Devuelve los ms dedicados a repartir las descripciones en líneas.
+    """
+    width, height = A4
+    ms_layout = 0.0
+
+    margen_izq = 20 * mm
+    margen_der = width - 20 * mm
+
+    c.doForm(FORM_CABECERA)
+
     # Título FACTURA
     c.setFont("Helvetica-Bold", 16)
     c.drawString(margen_izq, y, "FACTURA")
@@ -157,7 +264,9 @@ def generar_pdf_factura(conn, numero_factura: str | int, ruta_salida: str):
         # ancho máximo para la descripción (desde col_desc_x hasta antes de las columnas numéricas)
         max_desc_width = (margen_der - 55 * mm) - col_desc_x
 
+        t0 = time.perf_counter()
         desc_lines = wrap_text(desc, "Helvetica", 9, max_desc_width, c)
+        ms_layout += (time.perf_counter() - t0) * 1000
 
         # Altura que va a ocupar esta línea de factura (puede ser varias líneas de texto)
         line_height = 5 * mm
@@ -229,31 +338,15 @@ def generar_pdf_factura(conn, numero_factura: str | int, ruta_salida: str):
     c.drawRightString(margen_der, y, f"{total_val:.2f}")
 
     c.showPage()
-    c.save()
+    return ms_layout
 
-def wrap_text(text, font_name, font_size, max_width, canvas_obj):
+def wrap_text(text, font_name, font_size, max_width, canvas_obj=None):
     """
     Parte 'text' en varias líneas para que cada una no supere max_width.
     Devuelve una lista de líneas.
+    (canvas_obj ya no hace falta: los anchos salen de text_layout.)
     """
     if not text:
         return [""]
 
-    canvas_obj.setFont(font_name, font_size)
-    words = str(text).split()
-    lines = []
-    current_line = ""
-
-    for w in words:
-        test_line = (current_line + " " + w).strip()
-        if canvas_obj.stringWidth(test_line, font_name, font_size) <= max_width:
-            current_line = test_line
-        else:
-            if current_line:
-                lines.append(current_line)
-            current_line = w
-
-    if current_line:
-        lines.append(current_line)
-
-    return lines
+    return list(partir_lineas(str(text), font_name, font_size, max_width))
@@ -0,0 +1,207 @@
+# mirror.py
+"""
+Copia local SQLite (espejo) de las tablas Clientes, Facting y Contenid.
+
+El MDB suele estar en una unidad de red, y cada consulta viaja por SMB a
+través del driver Jet. Con el espejo, todas las lecturas se hacen contra un
+archivo SQLite local con índices, y solo la sincronización toca el MDB.
+
+La sincronización es incremental:
+- Si el tamaño y la fecha de modificación del MDB no han cambiado, no se
+  lee nada del MDB.
+- Clientes se copia entera (es pequeña).
+- De Facting/Contenid solo se copian las facturas con NUMERO mayor que el
+  último visto o con FECHA igual o posterior a la última vista (para
+  recoger también las facturas del último día que se hayan corregido).
+  Las facturas borradas en el MDB solo desaparecen del espejo con una
+  sincronización completa (forzar=True).
+- El MDB no impide que dos facturas tengan el mismo NUMERO: en el espejo
+  se guarda solo la primera que se lee (las listas paginan por NUMERO) y
+  las repetidas se cuentan en el resumen ("duplicadas").
+"""
+import hashlib
+import os
+
+import db
+from config import carpeta_datos_locales
+
+# Filas por fetchmany y números por IN (...) al sustituir facturas: SQLite
+# anterior a 3.32 (el de algunas instalaciones de Python en Windows) no
+# admite más de 999 parámetros por sentencia
+LOTE = 500
+
+ESPEJO_INDICES = """
+    CREATE INDEX IF NOT EXISTS ix_facting_numero ON Facting (NUMERO);
+    CREATE INDEX IF NOT EXISTS ix_facting_fecha ON Facting (FECHA DESC, NUMERO DESC);
+    CREATE INDEX IF NOT EXISTS ix_facting_cliente ON Facting (CLIENTE);
+    CREATE INDEX IF NOT EXISTS ix_contenid_referencia ON Contenid (REFERENCIA);
+    CREATE INDEX IF NOT EXISTS ix_clientes_nombre ON Clientes (NOMBRE);
+    CREATE TABLE IF NOT EXISTS EspejoEstado (
+        CLAVE TEXT PRIMARY KEY,
+        VALOR TEXT
+    );
+"""
+
+COLS_CLIENTES = "NOMBRE, CIF, DIRECCION"
+COLS_FACTING = "NUMERO, FECHA, CLIENTE, CIF, TOTAL, BASE1, IVA1"
+COLS_CONTENID = "REFERENCIA, Codigo, Datos, CANTIDAD, PRECIO"
+
+
+def ruta_espejo(db_path: str) -> str:
+    """Ruta local del espejo de un MDB (una por cada ruta de MDB distinta)."""
+    clave = hashlib.sha1(os.path.abspath(db_path).lower().encode("utf-8")).hexdigest()[:12]
+    return os.path.join(carpeta_datos_locales(), f"espejo_{clave}.sqlite")
+
+
+def abrir_espejo(db_path: str, ruta: str | None = None, forzar: bool = False):
+    """
+    Sincroniza el espejo del MDB indicado y devuelve (conexión SQLite, resumen).
+    El resumen es un dict con las filas copiadas de cada tabla.
+    """
+    ruta = ruta or ruta_espejo(db_path)
+    espejo = db.connect(ruta, backend=db.SQLiteBackend())
+    try:
+        preparar_espejo(espejo)
+        resumen = sincronizar(espejo, db_path, forzar=forzar)
+    except Exception:
+        espejo.close()
+        raise
+    return espejo, resumen
+
+
+def preparar_espejo(espejo):
+    espejo.execute("PRAGMA journal_mode=WAL;")
+    db.crear_esquema(espejo)
+    # Los espejos antiguos tenían el índice de NUMERO como UNIQUE: un número
+    # repetido en el MDB hacía fallar toda la sincronización
+    for indice in espejo.execute("PRAGMA index_list(Facting);").fetchall():
+        if indice[1] == "ix_facting_numero" and indice[2]:
+            espejo.execute("DROP INDEX ix_facting_numero;")
+    espejo.executescript(ESPEJO_INDICES)
+    espejo.commit()
+
+
+def sincronizar(espejo, db_path: str, forzar: bool = False) -> dict:
+    resumen = {"clientes": 0, "facturas": 0, "lineas": 0, "duplicadas": 0, "completa": False}
+
+    st = os.stat(db_path)
+    firma = f"{st.st_size}:{st.st_mtime_ns}"
+    estado = _leer_estado(espejo)
+    if not forzar and estado.get("firma") == firma:
+        return resumen
+
+    origen = db.connect(db_path)
+    try:
+        resumen["clientes"] = _copiar_clientes(origen, espejo)
+
+        max_numero = estado.get("max_numero")
+        max_fecha = estado.get("max_fecha")
+        if forzar or max_numero is None or max_fecha is None:
+            resumen["completa"] = True
+            espejo.execute("DELETE FROM Facting;")
+            espejo.execute("DELETE FROM Contenid;")
+            where, params = "", []
+        else:
+            where = "WHERE NUMERO > ? OR FECHA >= ?"
+            params = [int(max_numero), db.parse_fecha(max_fecha)]
+
+        resumen["facturas"], resumen["lineas"], resumen["duplicadas"] = _copiar_facturas(
+            origen, espejo, where, params
+        )
+
+        fila = espejo.execute("SELECT MAX(NUMERO), MAX(FECHA) FROM Facting;").fetchone()
+        _guardar_estado(espejo, {
+            "firma": firma,
+            "max_numero": fila[0],
+            "max_fecha": fila[1],
+        })
+        espejo.commit()
+    except Exception:
+        espejo.rollback()
+        raise
+    finally:
+        origen.close()
+
+    return resumen
+
+
+# ----------------------------
+# Copia de tablas
+# ----------------------------
+def _copiar_clientes(origen, espejo) -> int:
+    espejo.execute("DELETE FROM Clientes;")
+    cur = origen.cursor()
+    cur.execute(f"SELECT {COLS_CLIENTES} FROM Clientes;")
+    n = _volcar(cur, espejo, "INSERT INTO Clientes VALUES (?, ?, ?)")
+    cur.close()
+    return n
+
+
+def _copiar_facturas(origen, espejo, where: str, params: list):
+    cur = origen.cursor()
+    cur.execute(f"SELECT {COLS_FACTING} FROM Facting {where};", params)
+    vistos = set()
+    n_facturas = 0
+    duplicadas = 0
+    while True:
+        filas = cur.fetchmany(LOTE)
+        if not filas:
+            break
+        # Una sola cabecera por NUMERO: la primera que llega
+        nuevas = []
+        for f in filas:
+            if f[0] in vistos:
+                duplicadas += 1
+                continue
+            vistos.add(f[0])
+            nuevas.append(tuple(f))
+        if where and nuevas:
+            # Facturas ya copiadas que han cambiado: se sustituyen enteras
+            _borrar_facturas(espejo, [f[0] for f in nuevas])
+        espejo.executemany("INSERT INTO Facting VALUES (?, ?, ?, ?, ?, ?, ?)", nuevas)
+        n_facturas += len(nuevas)
+    cur.close()
+
+    if where and not vistos:
+        return 0, 0, 0
+
+    cur = origen.cursor()
+    where_lineas = ""
+    if where:
+        where_lineas = f"WHERE REFERENCIA IN (SELECT NUMERO FROM Facting {where})"
+    cur.execute(f"SELECT {COLS_CONTENID} FROM Contenid {where_lineas};", params)
+    n_lineas = _volcar(cur, espejo, "INSERT INTO Contenid VALUES (?, ?, ?, ?, ?)")
+    cur.close()
+    return n_facturas, n_lineas, duplicadas
+
+
+def _borrar_facturas(espejo, numeros):
+    marcas = ", ".join("?" * len(numeros))
+    espejo.execute(f"DELETE FROM Facting WHERE NUMERO IN ({marcas});", numeros)
+    espejo.execute(f"DELETE FROM Contenid WHERE REFERENCIA IN ({marcas});", numeros)
+
+
+def _volcar(cur, espejo, insert_sql: str) -> int:
+    n = 0
+    while True:
+        filas = cur.fetchmany(LOTE)
+        if not filas:
+            break
+        espejo.executemany(insert_sql, [tuple(f) for f in filas])
+        n += len(filas)
+    return n
+
+
+# ----------------------------
+# Estado de la sincronización
+# ----------------------------
+def _leer_estado(espejo) -> dict:
+    filas = espejo.execute("SELECT CLAVE, VALOR FROM EspejoEstado;").fetchall()
+    return {f.CLAVE: f.VALOR for f in filas}
+
+
+def _guardar_estado(espejo, valores: dict):
+    espejo.executemany(
+        "INSERT OR REPLACE INTO EspejoEstado (CLAVE, VALOR) VALUES (?, ?)",
+        [(k, None if v is None else str(v)) for k, v in valores.items()],
+    )
@@ -0,0 +1,187 @@
+# pdf_cache.py
+"""
+Caché en disco de los PDF de factura ya generados.
+
+La clave es un hash de la cabecera (Facting), las líneas (Contenid) y la
+versión de la plantilla del PDF: si la factura no ha cambiado, volver a
+exportarla es copiar el archivo guardado en vez de dibujarlo otra vez. Si
+cambia cualquier dato que se imprime (o la plantilla), cambia la clave y se
+genera de nuevo.
+
+El tamaño total está limitado; cuando se supera se borran los PDF usados
+hace más tiempo (LRU, por fecha de modificación, que se actualiza en cada
+acierto).
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from config import carpeta_datos_locales
+
+TAM_MAX_MB = 200
+
+
+# Campos que se dibujan en el PDF, en orden fijo. La clave solo depende de
+# ellos: las filas de la factura suelta y las de la exportación en lote
+# traen columnas distintas (p.ej. REFERENCIA) y deben dar la misma clave.
+CAMPOS_CABECERA = ("NUMERO", "FECHA", "CLIENTE", "CIF", "BASE1", "IVA1", "TOTAL")
+CAMPOS_LINEA = ("Codigo", "Datos", "CANTIDAD", "PRECIO")
+
+
+def clave_factura(cab, lineas, version) -> str:
+    """Hash estable de cabecera + líneas + versión de la plantilla."""
+    datos = [
+        version,
+        _valores(cab, CAMPOS_CABECERA),
+        [_valores(l, CAMPOS_LINEA) for l in lineas],
+    ]
+    texto = json.dumps(datos, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def _valores(fila, campos) -> list:
+    # Filas de la BBDD (acceso por atributo) o los dicts de la exportación en lote
+    if isinstance(fila, dict):
+        return [_normalizar(fila.get(c)) for c in campos]
+    return [_normalizar(getattr(fila, c, None)) for c in campos]
+
+
+def _normalizar(valor):
+    # Mismo texto para el mismo dato venga como venga: Decimal, int o float
+    # como número; fechas en ISO (un datetime a medianoche es solo la fecha)
+    if valor is None or isinstance(valor, str):
+        return valor
+    if isinstance(valor, (int, float, Decimal)) and not isinstance(valor, bool):
+        return float(valor)
+    if isinstance(valor, datetime):
+        if valor.time() == time():
+            return valor.date().isoformat()
+        return valor.isoformat()
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return str(valor)
+
+
+class CachePdf:
+    def __init__(self, carpeta: str | None = None, tam_max_mb: float = TAM_MAX_MB):
+        self.carpeta = carpeta or os.path.join(carpeta_datos_locales(), "pdf")
+        os.makedirs(self.carpeta, exist_ok=True)
+        self.tam_max = int(tam_max_mb * 1024 * 1024)
+
+        self._lock = threading.Lock()
+        self._ocupado = None  # bytes en disco; se calcula al primer guardado
+
+        self.stats = {
+            "aciertos": 0,
+            "fallos": 0,
+            "guardados": 0,
+            "expulsados": 0,
+        }
+
+    def _ruta(self, clave: str) -> str:
+        return os.path.join(self.carpeta, clave + ".pdf")
+
+    # ---------------------------------------------------------
+    # API
+    # ---------------------------------------------------------
+    def copiar(self, clave: str, destino: str) -> bool:
+        """Si el PDF está en caché lo copia a destino y devuelve True."""
+        ruta = self._ruta(clave)
+        try:
+            shutil.copyfile(ruta, destino)
+            os.utime(ruta)  # marcar como usado recientemente
+        except FileNotFoundError:
+            self._contar("fallos")
+            return False
+        self._contar("aciertos")
+        return True
+
+    def guardar(self, clave: str, origen: str):
+        """Guarda en la caché una copia del PDF recién generado en origen."""
+        ruta = self._ruta(clave)
+        # Copia a un temporal y renombrado: otro proceso nunca ve un PDF a medias
+        tmp = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            shutil.copyfile(origen, tmp)
+            os.replace(tmp, ruta)
+        except OSError:
+            # La caché es opcional: si no se puede escribir, se sigue sin ella
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self.stats["guardados"] += 1
+            if self._ocupado is not None:
+                self._ocupado += os.path.getsize(ruta)
+            if self._ocupado is None or self._ocupado > self.tam_max:
+                self._expulsar()
+
+    def vaciar(self):
+        with self._lock:
+            for entrada in self._entradas():
+                try:
+                    os.remove(entrada.path)
+                except OSError:
+                    pass
+            self._ocupado = 0
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            datos = dict(self.stats)
+        consultas = datos["aciertos"] + datos["fallos"]
+        datos["tasa_aciertos"] = datos["aciertos"] / consultas if consultas else 0.0
+        return datos
+
+    # ---------------------------------------------------------
+    # Interno (con el lock tomado)
+    # ---------------------------------------------------------
+    def _entradas(self):
+        with os.scandir(self.carpeta) as it:
+            return [e for e in it if e.is_file() and e.name.endswith(".pdf")]
+
+    def _expulsar(self):
+        # Se vuelve a mirar el disco: otros procesos pueden haber guardado o borrado
+        entradas = []
+        for e in self._entradas():
+            try:
+                st = e.stat()
+            except OSError:
+                continue
+            entradas.append((st.st_mtime, st.st_size, e.path))
+
+        ocupado = sum(tam for _, tam, _ in entradas)
+        entradas.sort()  # los usados hace más tiempo primero
+        for _, tam, ruta in entradas:
+            if ocupado <= self.tam_max:
+                break
+            try:
+                os.remove(ruta)
+            except OSError:
+                continue
+            ocupado -= tam
+            self.stats["expulsados"] += 1
+        self._ocupado = ocupado
+
+    def _contar(self, clave: str):
+        with self._lock:
+            self.stats[clave] += 1
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def cache_por_defecto() -> CachePdf:
+    """Caché compartida por toda la aplicación (se crea al primer uso)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CachePdf()
+        return _cache
@@ -0,0 +1,244 @@
+# perf.py
+"""
+Medición de tiempos de la aplicación (consultas, listados, PDF).
+
+Cada medición es un dict que se guarda en un búfer circular en memoria
+(las últimas MAX_EVENTOS), con:
+    t       -> hora (time.time())
+    tipo    -> "sql", "ui", "pdf"...
+    nombre  -> qué se ha medido (función de db.py, listado, fase del PDF)
+    ms      -> duración total en milisegundos
+    ...     -> datos propios de cada tipo (filas, SQL, parámetros...)
+
+Se ve en la pestaña oculta de diagnóstico (Ctrl+Mayús+D) y se puede
+exportar en JSON lines para analizarlo fuera.
+
+También lleva el informe de arranque: app.py importa este módulo antes que
+ningún otro, así que INICIO es (casi) el comienzo del programa.
+"""
+import json
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+
+INICIO = time.perf_counter()
+
+MAX_EVENTOS = 5000
+
+eventos = deque(maxlen=MAX_EVENTOS)  # append/popleft de deque son seguros entre hilos
+activo = True
+
+
+def registrar(tipo: str, nombre: str, ms: float, **datos):
+    if not activo:
+        return
+    evento = {"t": time.time(), "tipo": tipo, "nombre": nombre, "ms": round(ms, 3)}
+    evento.update(datos)
+    evento["hilo"] = threading.current_thread().name
+    eventos.append(evento)
+
+
+@contextmanager
+def medir(tipo: str, nombre: str, **datos):
+    """
+    with medir("ui", "facturas.set_rows", filas=n) as ev:
+        ...
+        ev["otro_dato"] = ...   # se puede completar dentro del bloque
+    """
+    inicio = time.perf_counter()
+    try:
+        yield datos
+    finally:
+        registrar(tipo, nombre, (time.perf_counter() - inicio) * 1000, **datos)
+
+
+def vaciar():
+    eventos.clear()
+
+
+# ----------------------------
+# Resúmenes
+# ----------------------------
+def percentil(valores_ordenados, p: float) -> float:
+    """Percentil p (0-100) por interpolación lineal de una lista ya ordenada."""
+    if not valores_ordenados:
+        return 0.0
+    pos = (len(valores_ordenados) - 1) * p / 100
+    i = int(pos)
+    j = min(i + 1, len(valores_ordenados) - 1)
+    return valores_ordenados[i] + (valores_ordenados[j] - valores_ordenados[i]) * (pos - i)
+
+
+def resumen() -> list:
+    """Por (tipo, nombre): n, total, p50, p90, p99 y máximo (ms), y filas medias."""
+    grupos = {}
+    for ev in list(eventos):
+        grupos.setdefault((ev["tipo"], ev["nombre"]), []).append(ev)
+
+    filas = []
+    for (tipo, nombre), evs in sorted(grupos.items()):
+        ms = sorted(ev["ms"] for ev in evs)
+        con_filas = [ev["filas"] for ev in evs if "filas" in ev]
+        filas.append({
+            "tipo": tipo,
+            "nombre": nombre,
+            "n": len(ms),
+            "total_ms": round(sum(ms), 1),
+            "p50": round(percentil(ms, 50), 2),
+            "p90": round(percentil(ms, 90), 2),
+            "p99": round(percentil(ms, 99), 2),
+            "max": round(ms[-1], 2),
+            "filas_media": round(sum(con_filas) / len(con_filas), 1) if con_filas else None,
+        })
+    return filas
+
+
+def exportar_jsonl(ruta: str) -> int:
+    """Escribe los eventos del búfer, uno por línea. Devuelve cuántos."""
+    copia = list(eventos)
+    with open(ruta, "w", encoding="utf-8") as f:
+        for ev in copia:
+            f.write(json.dumps(ev, default=str, ensure_ascii=False) + "\n")
+    return len(copia)
+
+
+# ----------------------------
+# Arranque
+# ----------------------------
+arranque = {}  # fase -> ms desde INICIO
+
+# Módulos que tardan en cargar y que no deberían estar en la primera ventana
+MODULOS_PESADOS = ("ttkbootstrap", "numpy", "reportlab", "pyodbc")
+
+
+def marcar_arranque(fase: str):
+    ms = (time.perf_counter() - INICIO) * 1000
+    arranque[fase] = round(ms, 1)
+    registrar("arranque", fase, ms)
+
+
+def guardar_arranque(ruta: str):
+    """
+    Añade a `ruta` una línea JSON con las fases del arranque y los módulos
+    pesados que ya estaban cargados, para seguir el tiempo de arranque entre
+    versiones.
+    """
+    linea = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "fases": dict(arranque),
+        "cargados": [m for m in MODULOS_PESADOS if m in sys.modules],
+        "ejecutable": bool(getattr(sys, "frozen", False)),
+    }
+    with open(ruta, "a", encoding="utf-8") as f:
+        f.write(json.dumps(linea, ensure_ascii=False) + "\n")
+
+
+# ----------------------------
+# Cursor medido (db.py)
+# ----------------------------
+def bytes_aproximados(filas, muestra: int = 50) -> int:
+    """
+    Tamaño aproximado de los datos de unas filas (texto por longitud). En
+    lotes grandes se mide una muestra y se extrapola: medir no debe costar
+    tanto como leer.
+    """
+    total = 0
+    for fila in filas[:muestra]:
+        for v in fila:
+            if isinstance(v, (str, bytes)):
+                total += len(v)
+            elif v is not None:
+                total += 8
+    if len(filas) > muestra:
+        total = total * len(filas) // muestra
+    return total
+
+
+@lru_cache(maxsize=512)
+def _sql_legible(sql: str) -> str:
+    # Las consultas se repiten mucho: el SQL en una línea se calcula una vez
+    return " ".join(sql.split())
+
+
+class CursorMedido:
+    """
+    Envuelve un cursor (pyodbc o sqlite3) y al cerrarlo registra un evento
+    "sql" con el SQL, los parámetros, las filas leídas y el tiempo de
+    execute y de fetch por separado.
+    """
+
+    def __init__(self, cur, nombre: str):
+        self._cur = cur
+        self._nombre = nombre
+        self._sql = None
+        self._params = None
+        self._ms_execute = 0.0
+        self._ms_fetch = 0.0
+        self._filas = 0
+        self._bytes = 0
+
+    def __getattr__(self, atributo):
+        return getattr(self._cur, atributo)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def execute(self, sql, params=()):
+        if self._sql is not None:
+            self._registrar()  # un mismo cursor con varias consultas
+        self._sql = _sql_legible(sql)
+        self._params = [str(p) for p in params]
+        inicio = time.perf_counter()
+        self._cur.execute(sql, params)
+        self._ms_execute += (time.perf_counter() - inicio) * 1000
+        return self
+
+    def fetchall(self):
+        return self._leer(self._cur.fetchall)
+
+    def fetchmany(self, n):
+        return self._leer(lambda: self._cur.fetchmany(n))
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        fila = self._cur.fetchone()
+        self._ms_fetch += (time.perf_counter() - inicio) * 1000
+        if fila is not None:
+            self._filas += 1
+            self._bytes += bytes_aproximados([fila])
+        return fila
+
+    def close(self):
+        self._registrar()
+        self._cur.close()
+
+    def _leer(self, fetch):
+        inicio = time.perf_counter()
+        filas = fetch()
+        self._ms_fetch += (time.perf_counter() - inicio) * 1000
+        self._filas += len(filas)
+        self._bytes += bytes_aproximados(filas)
+        return filas
+
+    def _registrar(self):
+        if self._sql is None:
+            return
+        registrar(
+            "sql",
+            self._nombre,
+            self._ms_execute + self._ms_fetch,
+            execute_ms=round(self._ms_execute, 3),
+            fetch_ms=round(self._ms_fetch, 3),
+            filas=self._filas,
+            bytes=self._bytes,
+            sql=self._sql,
+            params=self._params,
+        )
+        self._sql = None
+        self._ms_execute = self._ms_fetch = 0.0
+        self._filas = self._bytes = 0
+
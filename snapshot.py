@@ -0,0 +1,370 @@
+# snapshot.py
+"""
+Instantánea local por columnas de Clientes, en un único archivo binario que
+se abre con mmap. Se activa con la casilla "Instantánea de clientes" de la
+ventana principal ("usar_snapshot" en config.json).
+
+Leer los clientes por ODBC cuesta segundos en cada "Conectar"; abrir la
+instantánea cuesta lo que leer su cabecera: los datos se usan directamente
+desde el archivo mapeado, sin convertir nada hasta que se piden. Solo se
+guarda lo que se lee de vuelta (Clientes): volcar Facting y Contenid, que
+son casi todo el MDB, en cada cambio del archivo no compensa.
+
+Formato (todo little-endian, cada sección alineada a 8 bytes):
+
+    MAGIA (8 bytes) | longitud de la cabecera (uint64) | cabecera JSON | secciones
+
+Todas las columnas de Clientes son de texto: desplazamientos int64 (n + 1)
+y un blob UTF-8 con todos los textos seguidos; si hay nulos, además un byte
+por fila que los marca.
+
+La cabecera guarda el tamaño y la fecha de modificación del MDB del que se
+sacó. El nombre del archivo también los lleva, así que una instantánea
+nueva nunca sobrescribe a otra que esté abierta (en Windows no se puede
+sustituir un archivo mapeado): se escribe aparte y las antiguas se borran
+cuando se puede.
+"""
+import glob
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+
+from config import carpeta_datos_locales
+from db import TAM_LOTE
+from mirror import COLS_CLIENTES
+
+MAGIA = b"ELSNAP01"
+VERSION = 2  # la 1 llevaba también Facting y Contenid
+
+# tabla -> (columnas del SELECT, ORDER BY)
+TABLAS = {
+    "Clientes": (COLS_CLIENTES, "NOMBRE"),
+}
+
+
+def _alinear(n: int) -> int:
+    return (n + 7) & ~7
+
+
+# ----------------------------
+# Ubicación y vigencia
+# ----------------------------
+def firma_bd(db_path: str):
+    """(tamaño, mtime_ns) del archivo de la BBDD, o None si no se puede leer."""
+    try:
+        st = os.stat(db_path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+def _prefijo(db_path: str) -> str:
+    clave = hashlib.sha1(os.path.abspath(db_path).lower().encode("utf-8")).hexdigest()[:12]
+    return os.path.join(carpeta_datos_locales(), f"snapshot_{clave}_")
+
+
+def ruta_snapshot(db_path: str, firma) -> str:
+    """Ruta de la instantánea de un MDB en el estado indicado por `firma`."""
+    return f"{_prefijo(db_path)}{firma[0]}_{firma[1]}.bin"
+
+
+def abrir_vigente(db_path: str):
+    """
+    Abre la instantánea del MDB si corresponde a su tamaño y fecha de
+    modificación actuales. Devuelve None si no existe o está desfasada.
+    """
+    firma = firma_bd(db_path)
+    if firma is None:
+        return None
+    ruta = ruta_snapshot(db_path, firma)
+    if not os.path.exists(ruta):
+        return None
+    try:
+        snap = Snapshot(ruta)
+    except (OSError, ValueError):
+        return None  # archivo dañado o de otra versión: se volverá a escribir
+    if tuple(snap.firma) != firma:
+        snap.cerrar()
+        return None
+    return snap
+
+
+def borrar_antiguas(db_path: str, conservar: str | None = None) -> int:
+    """Borra las instantáneas del MDB salvo `conservar`. Devuelve cuántas borró."""
+    borradas = 0
+    for ruta in glob.glob(_prefijo(db_path) + "*.bin"):
+        if conservar and os.path.abspath(ruta) == os.path.abspath(conservar):
+            continue
+        try:
+            os.remove(ruta)
+            borradas += 1
+        except OSError:
+            pass  # todavía mapeada por esta u otra instancia: ya se borrará
+    return borradas
+
+
+# ----------------------------
+# Escritura
+# ----------------------------
+class _ColumnaEscritura:
+    """Columna de texto: el blob va a un temporal para no tenerlo en memoria."""
+
+    def __init__(self, nombre: str, carpeta: str):
+        self.nombre = nombre
+        self.blob = tempfile.TemporaryFile(dir=carpeta)
+        self.tam_blob = 0
+        self.offsets = array("q", [0])
+        self.nulos = bytearray()
+        self.hay_nulos = False
+
+    def anadir(self, v):
+        if v is None:
+            self.nulos.append(1)
+            self.hay_nulos = True
+        else:
+            datos = str(v).encode("utf-8")
+            self.blob.write(datos)
+            self.tam_blob += len(datos)
+            self.nulos.append(0)
+        self.offsets.append(self.tam_blob)
+
+    def partes(self):
+        """(nombre de la parte, tamaño en bytes, función que la escribe en un archivo)."""
+        partes = [
+            ("offsets", len(self.offsets) * 8, self.offsets.tofile),
+            ("datos", self.tam_blob, self._copiar_blob),
+        ]
+        if self.hay_nulos:
+            partes.append(("nulos", len(self.nulos), lambda f: f.write(self.nulos)))
+        return partes
+
+    def _copiar_blob(self, f):
+        self.blob.seek(0)
+        while True:
+            trozo = self.blob.read(1 << 20)
+            if not trozo:
+                break
+            f.write(trozo)
+
+    def cerrar(self):
+        self.blob.close()
+
+
+def escribir_snapshot(conn, db_path: str, firma=None, cancelar=None) -> str | None:
+    """
+    Lee las tablas de TABLAS de `conn` y escribe la instantánea del
+    MDB `db_path`. `firma` es la del MDB antes de empezar a leer (si cambia
+    mientras se lee, la instantánea saldrá ya desfasada y se rehará la
+    próxima vez). Devuelve la ruta escrita, o None si se cancela.
+    """
+    if firma is None:
+        firma = firma_bd(db_path)
+    ruta = ruta_snapshot(db_path, firma)
+    carpeta = os.path.dirname(ruta)
+
+    tablas = {}
+    columnas = []
+    try:
+        for tabla, (cols, orden) in TABLAS.items():
+            nombres = [c.strip() for c in cols.split(",")]
+            escritura = [_ColumnaEscritura(n, carpeta) for n in nombres]
+            columnas.extend(escritura)
+
+            cur = conn.cursor()
+            cur.execute(f"SELECT {cols} FROM {tabla} ORDER BY {orden};")
+            n = 0
+            try:
+                while True:
+                    if cancelar is not None and cancelar.is_set():
+                        return None
+                    filas = cur.fetchmany(TAM_LOTE)
+                    if not filas:
+                        break
+                    for fila in filas:
+                        for col, v in zip(escritura, fila):
+                            col.anadir(v)
+                    n += len(filas)
+            finally:
+                cur.close()
+            tablas[tabla] = (n, escritura)
+
+        _volcar_archivo(ruta, firma, db_path, tablas)
+    finally:
+        for col in columnas:
+            col.cerrar()
+    return ruta
+
+
+def _volcar_archivo(ruta: str, firma, db_path: str, tablas: dict):
+    # Posición de cada sección, relativa al inicio de las secciones
+    cabecera = {
+        "version": VERSION,
+        "origen": os.path.abspath(db_path),
+        "firma": list(firma),
+        "creado": datetime.now().isoformat(timespec="seconds"),
+        "tablas": {},
+    }
+    secciones = []
+    pos = 0
+    for tabla, (n, escritura) in tablas.items():
+        desc = []
+        for col in escritura:
+            partes = {}
+            for parte, tam, escribir in col.partes():
+                partes[parte] = [pos, tam]
+                secciones.append((pos, escribir))
+                pos = _alinear(pos + tam)
+            desc.append({"nombre": col.nombre, "tipo": "texto", **partes})
+        cabecera["tablas"][tabla] = {"filas": n, "columnas": desc}
+
+    meta = json.dumps(cabecera, ensure_ascii=False).encode("utf-8")
+    base = _alinear(len(MAGIA) + 8 + len(meta))
+
+    temporal = ruta + ".tmp"
+    try:
+        with open(temporal, "wb") as f:
+            f.write(MAGIA)
+            f.write(struct.pack("<Q", len(meta)))
+            f.write(meta)
+            for inicio, escribir in secciones:
+                f.write(b"\0" * (base + inicio - f.tell()))
+                escribir(f)
+            f.write(b"\0" * (base + pos - f.tell()))
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+# ----------------------------
+# Lectura
+# ----------------------------
+class TextoSnapshot:
+    """Columna de texto de la instantánea: se decodifica al pedir cada valor."""
+
+    def __init__(self, mm, offsets: np.ndarray, inicio: int, nulos=None):
+        self._mm = mm
+        self._offsets = offsets
+        self._inicio = inicio
+        self._nulos = nulos
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if self._nulos is not None and self._nulos[i]:
+            return None
+        a = self._inicio + int(self._offsets[i])
+        b = self._inicio + int(self._offsets[i + 1])
+        return self._mm[a:b].decode("utf-8")
+
+    def valores(self, desde: int = 0, hasta: int | None = None) -> list:
+        """Lista con los textos de las filas [desde, hasta)."""
+        hasta = len(self) if hasta is None else hasta
+        if hasta <= desde:
+            return []
+        # Un solo decode para todo el tramo y se corta por los desplazamientos
+        offs = (self._offsets[desde:hasta + 1] - self._offsets[desde]).tolist()
+        a = self._inicio + int(self._offsets[desde])
+        texto = self._mm[a:a + offs[-1]]
+        resultado = [texto[offs[i]:offs[i + 1]].decode("utf-8") for i in range(hasta - desde)]
+        if self._nulos is not None:
+            for i in np.flatnonzero(self._nulos[desde:hasta]):
+                resultado[i] = None
+        return resultado
+
+
+class Snapshot:
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._f = open(ruta, "rb")
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self._f.close()
+            raise
+        try:
+            if self._mm[:len(MAGIA)] != MAGIA:
+                raise ValueError(f"{ruta} no es una instantánea válida")
+            (n,) = struct.unpack_from("<Q", self._mm, len(MAGIA))
+            inicio = len(MAGIA) + 8
+            self.cabecera = json.loads(self._mm[inicio:inicio + n].decode("utf-8"))
+            if self.cabecera.get("version") != VERSION:
+                raise ValueError(f"{ruta}: versión de instantánea no soportada")
+        except Exception:
+            self.cerrar()
+            raise
+        self._base = _alinear(inicio + n)
+        self.firma = self.cabecera["firma"]
+        self._columnas = {}  # (tabla, columna) -> TextoSnapshot
+        self._clases_fila = {}
+
+    # ---------------------------------------------------------
+    # API
+    # ---------------------------------------------------------
+    def filas(self, tabla: str) -> int:
+        return self.cabecera["tablas"][tabla]["filas"]
+
+    def nombres(self, tabla: str) -> list:
+        return [c["nombre"] for c in self.cabecera["tablas"][tabla]["columnas"]]
+
+    def columna(self, tabla: str, nombre: str):
+        """Columna entera como TextoSnapshot, sin copiar nada del archivo."""
+        clave = (tabla, nombre)
+        col = self._columnas.get(clave)
+        if col is None:
+            desc = next(
+                c for c in self.cabecera["tablas"][tabla]["columnas"] if c["nombre"] == nombre
+            )
+            col = self._abrir_columna(desc, self.filas(tabla))
+            self._columnas[clave] = col
+        return col
+
+    def leer(self, tabla: str, desde: int = 0, hasta: int | None = None) -> list:
+        """Filas [desde, hasta) de la tabla como namedtuples, igual que las de db.py."""
+        nombres = self.nombres(tabla)
+        n = self.filas(tabla)
+        hasta = n if hasta is None else min(hasta, n)
+        columnas = [self.columna(tabla, c).valores(desde, hasta) for c in nombres]
+        cls = self._clases_fila.get(tabla)
+        if cls is None:
+            cls = self._clases_fila[tabla] = namedtuple("Fila", nombres)
+        return [cls._make(v) for v in zip(*columnas)]
+
+    def lotes(self, tabla: str, lote: int = TAM_LOTE):
+        """Como get_*_lotes de db.py: genera las filas en listas de `lote`."""
+        n = self.filas(tabla)
+        for desde in range(0, n, lote):
+            yield self.leer(tabla, desde, desde + lote)
+
+    def cerrar(self):
+        self._columnas.clear()
+        try:
+            self._mm.close()
+        except BufferError:
+            pass  # quedan arrays apuntando al archivo: se liberará con ellos
+        except AttributeError:
+            pass
+        self._f.close()
+
+    # ---------------------------------------------------------
+    # Interno
+    # ---------------------------------------------------------
+    def _abrir_columna(self, desc: dict, n: int) -> TextoSnapshot:
+        inicio_off = self._base + desc["offsets"][0]
+        offsets = np.frombuffer(self._mm, dtype="<i8", count=n + 1, offset=inicio_off)
+        nulos = None
+        if "nulos" in desc:
+            nulos = np.frombuffer(
+                self._mm, dtype=np.uint8, count=n, offset=self._base + desc["nulos"][0]
+            )
+        return TextoSnapshot(self._mm, offsets, self._base + desc["datos"][0], nulos)
@@ -0,0 +1,273 @@
+# table_export.py
+"""
+Exportación de resultados de búsqueda (facturas o trabajos) a CSV o XLSX.
+
+Las filas van directamente del cursor al archivo por lotes (fetchmany con
+get_*_lotes): nunca se tiene el resultado entero en memoria ni pasa por el
+Treeview, así que la memoria no crece con el número de filas.
+
+- CSV: separador ";", decimales con coma y UTF-8 con BOM, que es lo que
+  abre bien un Excel en español con doble clic.
+- XLSX: openpyxl en modo write_only (las filas se escriben a disco según
+  llegan). openpyxl es opcional: sin él solo se puede exportar a CSV. Es
+  bastante más lento que el CSV (todo el tiempo se va en generar el XML;
+  con lxml instalado openpyxl lo hace más rápido).
+  Si se superan las filas de una hoja de Excel se sigue en otra hoja.
+- JSONL: una fila por línea con los nombres de campo de la base de datos
+  y fechas ISO, para leerlo desde otros programas (lo usa cli.py).
+
+Se escribe en un archivo temporal que se renombra al terminar, así que una
+exportación cancelada o fallida no deja un archivo a medias.
+"""
+import csv
+import json
+import os
+import re
+from datetime import date, datetime
+from decimal import Decimal
+from operator import attrgetter
+
+from db import get_facturas_lotes, get_trabajos_lotes, contar_facturas, contar_trabajos
+
+# (campo de la fila, título, tipo) de cada columna exportada
+COLUMNAS_CLIENTES = (
+    ("NOMBRE", "Nombre", "texto"),
+    ("CIF", "CIF", "texto"),
+    ("DIRECCION", "Dirección", "texto"),
+)
+COLUMNAS_FACTURAS = (
+    ("NUMERO", "Nº factura", "numero"),
+    ("FECHA", "Fecha", "fecha"),
+    ("CLIENTE", "Cliente", "texto"),
+    ("CIF", "CIF", "texto"),
+    ("BASE1", "Base", "numero"),
+    ("IVA1", "IVA", "numero"),
+    ("TOTAL", "Total", "numero"),
+)
+COLUMNAS_TRABAJOS = (
+    ("FECHA", "Fecha", "fecha"),
+    ("REFERENCIA", "Nº factura", "numero"),
+    ("CLIENTE", "Cliente", "texto"),
+    ("Datos", "Descripción", "texto"),
+    ("CANTIDAD", "Cantidad", "numero"),
+    ("PRECIO", "Precio", "numero"),
+    ("Importe", "Importe", "numero"),
+)
+
+FORMATOS = (".xlsx", ".csv", ".jsonl")
+
+MAX_FILAS_HOJA = 1_048_576 - 1  # límite de Excel, menos la fila de títulos
+
+
+def exportar_facturas(
+    conn, ruta, cliente=None, numero=None, desde=None, hasta=None, progreso=None, cancelar=None
+):
+    """Exporta las facturas del filtro. Devuelve las filas escritas (None si se cancela)."""
+    total = contar_facturas(conn, cliente=cliente, numero=numero, desde=desde, hasta=hasta)
+    lotes = get_facturas_lotes(conn, cliente=cliente, numero=numero, desde=desde, hasta=hasta)
+    return exportar_lotes(lotes, ruta, COLUMNAS_FACTURAS, "Facturas", total, progreso, cancelar)
+
+
+def exportar_trabajos(conn, ruta, cliente=None, texto=None, progreso=None, cancelar=None):
+    """Exporta los trabajos del filtro. Devuelve las filas escritas (None si se cancela)."""
+    total = contar_trabajos(conn, cliente=cliente, texto=texto)
+    lotes = get_trabajos_lotes(conn, cliente=cliente, texto=texto)
+    return exportar_lotes(lotes, ruta, COLUMNAS_TRABAJOS, "Trabajos", total, progreso, cancelar)
+
+
+def exportar_lotes(
+    lotes, ruta, columnas, titulo="Datos", total=None, progreso=None, cancelar=None
+):
+    """
+    Escribe en `ruta` (.csv, .xlsx o .jsonl) las filas de `lotes`, un
+    iterable de listas de filas. `progreso(hechas, total)` se llama tras
+    cada lote y `cancelar` es un threading.Event que detiene la exportación.
+    """
+    escritor = escritor_de(ruta)
+
+    temporal = ruta + ".tmp"
+    valores = attrgetter(*(c[0] for c in columnas))
+    hechas = 0
+    try:
+        esc = escritor(temporal, columnas, titulo)
+        try:
+            for lote in lotes:
+                if cancelar is not None and cancelar.is_set():
+                    break
+                esc.escribir(map(valores, lote))
+                hechas += len(lote)
+                if progreso:
+                    progreso(hechas, total)
+        finally:
+            esc.cerrar()
+            if hasattr(lotes, "close"):
+                lotes.close()  # cierra el cursor si no se ha leído entero
+
+        if cancelar is not None and cancelar.is_set():
+            os.remove(temporal)
+            return None
+        os.replace(temporal, ruta)
+        return hechas
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+# ----------------------------
+# Escritores
+# ----------------------------
+def escritor_de(ruta: str):
+    """Clase de escritor según la extensión del archivo."""
+    ext = os.path.splitext(ruta)[1].lower()
+    if ext == ".csv":
+        return EscritorCsv
+    if ext == ".xlsx":
+        return EscritorXlsx
+    if ext == ".jsonl":
+        return EscritorJsonl
+    raise ValueError(f"Formato no soportado: '{ext}'. Usa .xlsx, .csv o .jsonl.")
+
+
+def _abrir(destino, bom: bool = False):
+    """(archivo, propio): `destino` es una ruta o un archivo ya abierto (sys.stdout)."""
+    if isinstance(destino, str):
+        return open(destino, "w", encoding="utf-8-sig" if bom else "utf-8", newline=""), True
+    return destino, False
+
+
+def _numero_csv(v):
+    if v is None:
+        return ""
+    try:
+        # %g quita los ceros sobrantes y el ruido de coma flotante (0.1 * 3)
+        return ("%.10g" % v).replace(".", ",")
+    except TypeError:  # p.ej. un número guardado como texto
+        return str(v)
+
+
+def _texto(v):
+    return "" if v is None else str(v).strip()
+
+
+class EscritorCsv:
+    def __init__(self, ruta, columnas, titulo=None):
+        self._f, self._propio = _abrir(ruta, bom=True)
+        self._csv = csv.writer(self._f, delimiter=";")
+        self._csv.writerow([c[1] for c in columnas])
+        self._fechas = {}  # fecha -> texto: las filas vienen ordenadas por fecha
+        convertir = {"numero": _numero_csv, "fecha": self._fecha_csv, "texto": _texto}
+        self._conversores = [convertir[c[2]] for c in columnas]
+
+    def _fecha_csv(self, v):
+        texto = self._fechas.get(v)
+        if texto is None:
+            if isinstance(v, (date, datetime)):
+                texto = v.strftime("%d/%m/%Y")
+            else:
+                texto = "" if v is None else str(v)
+            if len(self._fechas) > 10000:
+                self._fechas.clear()
+            self._fechas[v] = texto
+        return texto
+
+    def escribir(self, filas):
+        conversores = self._conversores
+        self._csv.writerows(
+            [conv(v) for conv, v in zip(conversores, fila)] for fila in filas
+        )
+
+    def cerrar(self):
+        if self._propio:
+            self._f.close()
+        else:
+            self._f.flush()
+
+
+def _valor_json(v):
+    if isinstance(v, (date, datetime)):
+        return v.isoformat()
+    if isinstance(v, Decimal):
+        return float(v)
+    if isinstance(v, str):
+        return v.strip()
+    return v
+
+
+class EscritorJsonl:
+    def __init__(self, ruta, columnas, titulo=None):
+        self._f, self._propio = _abrir(ruta)
+        self._campos = [c[0] for c in columnas]
+
+    def escribir(self, filas):
+        campos = self._campos
+        self._f.writelines(
+            json.dumps(dict(zip(campos, map(_valor_json, fila))), ensure_ascii=False) + "\n"
+            for fila in filas
+        )
+
+    def cerrar(self):
+        if self._propio:
+            self._f.close()
+        else:
+            self._f.flush()
+
+
+# Caracteres de control que Excel no admite dentro de una celda
+_ILEGALES_XLSX = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+class EscritorXlsx:
+    ANCHOS = {"fecha": 11, "numero": 12, "texto": 40}
+
+    def __init__(self, ruta, columnas, titulo="Datos"):
+        try:
+            from openpyxl import Workbook
+            from openpyxl.cell import WriteOnlyCell
+        except ImportError:
+            raise RuntimeError(
+                "openpyxl no está instalado: no se puede exportar a Excel. "
+                "Exporta a CSV o instala openpyxl."
+            )
+        self._ruta = ruta
+        self._columnas = columnas
+        self._titulo = titulo
+        self._celda = WriteOnlyCell
+        self._libro = Workbook(write_only=True)
+        self._hoja = None
+        self._filas_hoja = 0
+        self._n_hojas = 0
+        self._fechas = [i for i, c in enumerate(columnas) if c[2] == "fecha"]
+        self._textos = [i for i, c in enumerate(columnas) if c[2] == "texto"]
+
+    def _nueva_hoja(self):
+        self._n_hojas += 1
+        nombre = self._titulo if self._n_hojas == 1 else f"{self._titulo} {self._n_hojas}"
+        self._hoja = self._libro.create_sheet(nombre)
+        for i, c in enumerate(self._columnas):
+            letra = chr(ord("A") + i)
+            self._hoja.column_dimensions[letra].width = self.ANCHOS[c[2]]
+        self._hoja.append([c[1] for c in self._columnas])
+        self._filas_hoja = 0
+
+    def escribir(self, filas):
+        for fila in filas:
+            if self._hoja is None or self._filas_hoja >= MAX_FILAS_HOJA:
+                self._nueva_hoja()
+            fila = list(fila)
+            for i in self._textos:
+                v = fila[i]
+                if v is not None:
+                    fila[i] = _ILEGALES_XLSX.sub("", str(v).strip())
+            for i in self._fechas:
+                if fila[i] is not None:
+                    celda = self._celda(self._hoja, value=fila[i])
+                    celda.number_format = "DD/MM/YYYY"
+                    fila[i] = celda
+            self._hoja.append(fila)
+            self._filas_hoja += 1
+
+    def cerrar(self):
+        if self._hoja is None:
+            self._nueva_hoja()  # al menos la fila de títulos
+        self._libro.save(self._ruta)
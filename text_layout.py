@@ -0,0 +1,86 @@
+# text_layout.py
+"""
+Reparto de textos en líneas para el PDF de facturas.
+
+- El ancho de cada palabra se calcula una sola vez por fuente y tamaño
+  (las descripciones se repiten mucho: "Mano de obra", referencias de
+  piezas...). Se guardan como mucho MAX_PALABRAS, las más recientes, para
+  que la memoria no crezca en exportaciones largas.
+- Las líneas se forman sumando anchos ya conocidos, en una sola pasada,
+  en vez de medir una y otra vez la línea entera.
+- El resultado de cada descripción completa también se guarda.
+- Una palabra que no cabe ni sola en una línea se corta por caracteres.
+"""
+from functools import lru_cache
+
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+MAX_PALABRAS = 16384  # anchos de palabra guardados (LRU)
+
+
+@lru_cache(maxsize=MAX_PALABRAS)
+def ancho_palabra(palabra: str, fuente: str, tam: float) -> float:
+    return stringWidth(palabra, fuente, tam)
+
+
+def _cortar_palabra(palabra: str, fuente: str, tam: float, max_ancho: float):
+    """Trozos de una palabra demasiado larga, cada uno de ancho <= max_ancho."""
+    trozos = []
+    inicio = 0
+    ancho = 0.0
+    for i, car in enumerate(palabra):
+        a = ancho_palabra(car, fuente, tam)
+        # Al menos un carácter por trozo aunque la columna sea muy estrecha
+        if ancho + a > max_ancho and i > inicio:
+            trozos.append(palabra[inicio:i])
+            inicio = i
+            ancho = 0.0
+        ancho += a
+    trozos.append(palabra[inicio:])
+    return trozos
+
+
+@lru_cache(maxsize=4096)
+def partir_lineas(texto: str, fuente: str, tam: float, max_ancho: float) -> tuple:
+    """
+    Parte texto en líneas de ancho <= max_ancho. Devuelve una tupla de
+    líneas (tupla para que el resultado guardado no se pueda modificar).
+    """
+    espacio = ancho_palabra(" ", fuente, tam)
+    lineas = []
+    actual = []
+    ancho_actual = 0.0
+
+    for palabra in texto.split():
+        ancho = ancho_palabra(palabra, fuente, tam)
+
+        if ancho > max_ancho:
+            # Se cierra la línea en curso y la palabra se reparte en trozos;
+            # el último trozo puede seguir con las palabras siguientes.
+            if actual:
+                lineas.append(" ".join(actual))
+            trozos = _cortar_palabra(palabra, fuente, tam, max_ancho)
+            lineas.extend(trozos[:-1])
+            actual = [trozos[-1]]
+            ancho_actual = ancho_palabra(trozos[-1], fuente, tam)
+            continue
+
+        if not actual:
+            actual = [palabra]
+            ancho_actual = ancho
+        elif ancho_actual + espacio + ancho <= max_ancho:
+            actual.append(palabra)
+            ancho_actual += espacio + ancho
+        else:
+            lineas.append(" ".join(actual))
+            actual = [palabra]
+            ancho_actual = ancho
+
+    if actual:
+        lineas.append(" ".join(actual))
+    return tuple(lineas)
+
+
+def limpiar_cache():
+    ancho_palabra.cache_clear()
+    partir_lineas.cache_clear()
@@ -1,13 +1,18 @@
 # ui/clientes_tab.py
 import tkinter as tk
 from tkinter import ttk, messagebox
-from db import get_clientes
+from db import get_clientes_lotes
+from client_index import IndiceClientes
+from ui.virtual_tree import VirtualTreeview, clave_texto
 
 class ClientesTab(ttk.Frame):
     def __init__(self, parent, main_window):
         super().__init__(parent)
-        self.main_window = main_window  # para acceder a get_conn(), notebook, etc.
+        self.main_window = main_window  # para acceder a executor, notebook, etc.
         self.lista_clientes_completa = []
+        self.indice_clientes = IndiceClientes([])
+        self._ultimo_filtro = None
+        self._cargando = False
 
         self._build_ui()
 
@@ -15,18 +20,18 @@ class ClientesTab(ttk.Frame):
         filtro = ttk.LabelFrame(self, text="Buscar cliente", padding=10)
         filtro.pack(fill="x", padx=10, pady=5)
 
-        ttk.Label(filtro, text="Nombre contiene:").pack(side="left")
+        ttk.Label(filtro, text="Nombre, CIF o dirección contiene:").pack(side="left")
 
         self.cliente_busqueda_var = tk.StringVar()
         entry = ttk.Entry(filtro, textvariable=self.cliente_busqueda_var, width=40)
         entry.pack(side="left", padx=5)
         entry.bind("<KeyRelease>", self.filtrar_clientes)
 
-        cont = ttk.Frame(self)
-        cont.pack(fill="both", expand=True, padx=10, pady=10)
-
         cols = ("nombre", "cif", "direccion")
-        self.tree_clientes = ttk.Treeview(cont, columns=cols, show="headings")
+        self.tree_clientes = VirtualTreeview(
+            self, columns=cols, formatter=self._valores_cliente, nombre="clientes"
+        )
+        self.tree_clientes.pack(fill="both", expand=True, padx=10, pady=10)
 
         self.tree_clientes.heading("nombre", text="Nombre")
         self.tree_clientes.heading("cif", text="CIF")
@@ -36,11 +41,9 @@ class ClientesTab(ttk.Frame):
         self.tree_clientes.column("cif", width=120, anchor="center")
         self.tree_clientes.column("direccion", width=350, anchor="w")
 
-        self.tree_clientes.pack(side="left", fill="both", expand=True)
-
-        scroll = ttk.Scrollbar(cont, orient="vertical", command=self.tree_clientes.yview)
-        self.tree_clientes.configure(yscrollcommand=scroll.set)
-        scroll.pack(side="right", fill="y")
+        self.tree_clientes.sortable("nombre", lambda r: clave_texto(r.NOMBRE))
+        self.tree_clientes.sortable("cif", lambda r: clave_texto(r.CIF))
+        self.tree_clientes.sortable("direccion", lambda r: clave_texto(r.DIRECCION))
 
         acciones = ttk.Frame(self)
         acciones.pack(fill="x", pady=5)
@@ -59,43 +62,85 @@ class ClientesTab(ttk.Frame):
 
     def on_db_connected(self):
         """Llamado desde MainWindow cuando se conecta a la BBDD."""
-        conn = self.main_window.get_conn()
-        if conn:
-            self.cargar_clientes(conn)
-
-    def cargar_clientes(self, conn):
-        try:
-            rows = get_clientes(conn)
-        except Exception as e:
+        if self.main_window.hay_conexion():
+            self.cargar_clientes()
+
+    def cargar_clientes(self):
+        # Con la instantánea local al día no hace falta consultar la BBDD
+        snap = self.main_window.snapshot_vigente()
+
+        def consulta(conn):
+            # Los clientes llegan por lotes según se leen; el índice se
+            # construye al final, también en el hilo de consultas.
+            rows = []
+            lotes = snap.lotes("Clientes") if snap is not None else get_clientes_lotes(conn)
+            for lote in lotes:
+                rows.extend(lote)
+                yield lote
+            return IndiceClientes(rows)
+
+        def error(e):
+            self._cargando = False
             messagebox.showerror("Error cargando clientes", str(e))
-            return
-
-        self.lista_clientes_completa = rows
-        self.tree_clientes.delete(*self.tree_clientes.get_children())
 
-        for r in rows:
-            dom = r.DIRECCION if r.DIRECCION not in (None, "None") else ""
-            self.tree_clientes.insert(
-                "",
-                "end",
-                 values=(r.NOMBRE, r.CIF, dom)
+        self._cargando = True
+        self.lista_clientes_completa = []
+        self.indice_clientes = IndiceClientes([])
+        self._ultimo_filtro = None
+        self.tree_clientes.clear()
+        self.main_window.executor.submit_lotes(
+            consulta,
+            on_lote=self._anadir_clientes,
+            on_done=self._mostrar_clientes,
+            on_error=error,
+            canal="clientes",
+        )
+
+    def _anadir_clientes(self, lote):
+        # La primera pantalla aparece con el primer lote, sin esperar al resto
+        self.lista_clientes_completa.extend(lote)
+        if not self.cliente_busqueda_var.get().strip():
+            self.tree_clientes.append_rows(lote)
+
+    def _mostrar_clientes(self, indice):
+        self._cargando = False
+        self.indice_clientes = indice
+        self._ultimo_filtro = None
+
+        # Se rehace siempre: si se escribió un filtro durante la carga y luego
+        # se borró, al listado le faltan los lotes que llegaron entretanto
+        if self.cliente_busqueda_var.get().strip():
+            self.filtrar_clientes()
+        else:
+            self._ultimo_filtro = self.cliente_busqueda_var.get()
+            self.tree_clientes.set_rows(
+                list(self.lista_clientes_completa), conservar_claves=True
             )
 
-    def filtrar_clientes(self, event=None):
-        texto = self.cliente_busqueda_var.get().lower()
-        self.tree_clientes.delete(*self.tree_clientes.get_children())
+    def _valores_cliente(self, r):
+        dom = r.DIRECCION if r.DIRECCION not in (None, "None") else ""
+        return (r.NOMBRE, r.CIF, dom)
 
-        for r in self.lista_clientes_completa:
-            if texto in (r.NOMBRE or "").lower():
-                self.tree_clientes.insert("", "end", values=(r.NOMBRE, r.CIF, r.DIRECCION))
+    def filtrar_clientes(self, event=None):
+        if self._cargando:
+            return  # se filtra al terminar la carga, con el índice completo
+        texto = self.cliente_busqueda_var.get()
+        if texto == self._ultimo_filtro:
+            return  # p.ej. teclas de cursor: nada que volver a filtrar
+        self._ultimo_filtro = texto
+
+        indices = self.indice_clientes.buscar(texto)
+        # Solo se pasan referencias a las filas: el listado virtual
+        # únicamente pinta las que caben en pantalla.
+        todos = self.lista_clientes_completa
+        self.tree_clientes.set_rows([todos[i] for i in indices], conservar_claves=True)
 
     def cliente_seleccionado(self):
-        sel = self.tree_clientes.selection()
-        if not sel:
+        fila = self.tree_clientes.selected_row()
+        if fila is None:
             messagebox.showwarning("Sin selección", "Selecciona un cliente.")
             return None
-        item = sel[0]
-        return self.tree_clientes.item(item, "values")  # (nombre, cif, direccion)
+        return self._valores_cliente(fila)  # (nombre, cif, direccion)
 
     def ver_facturas_cliente(self):
         data = self.cliente_seleccionado()
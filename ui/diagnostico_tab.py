@@ -0,0 +1,186 @@
+# ui/diagnostico_tab.py
+import os
+import time
+from tkinter import ttk, messagebox, filedialog
+
+import perf
+from db import estadisticas_consultas
+from pdf_cache import cache_por_defecto
+
+
+class DiagnosticoTab(ttk.Frame):
+    """
+    Pestaña oculta de diagnóstico (se muestra y oculta con Ctrl+Mayús+D).
+
+    - Resumen por consulta / listado / fase del PDF: nº de veces, total y
+      percentiles p50, p90, p99 y máximo en ms.
+    - Últimas mediciones, con el SQL y sus parámetros.
+    - Estado de las conexiones y de las cachés.
+    - Exportar todas las mediciones a JSON lines.
+    """
+
+    MAX_ULTIMOS = 300
+
+    def __init__(self, parent, main_window):
+        super().__init__(parent)
+        self.main_window = main_window
+        self._build_ui()
+
+    def _build_ui(self):
+        botones = ttk.Frame(self)
+        botones.pack(fill="x", padx=10, pady=5)
+
+        ttk.Button(botones, text="Actualizar", command=self.actualizar).pack(side="left", padx=5)
+        ttk.Button(botones, text="Exportar JSONL...", command=self.exportar).pack(side="left", padx=5)
+        ttk.Button(botones, text="Vaciar", command=self.vaciar).pack(side="left", padx=5)
+
+        self.lbl_estado = ttk.Label(botones, text="")
+        self.lbl_estado.pack(side="left", padx=15)
+
+        # Resumen con percentiles
+        frame_resumen = ttk.LabelFrame(self, text="Resumen (ms)", padding=5)
+        frame_resumen.pack(fill="both", expand=True, padx=10, pady=5)
+
+        cols = ("tipo", "nombre", "n", "total_ms", "p50", "p90", "p99", "max", "filas_media")
+        self.tree_resumen = ttk.Treeview(frame_resumen, columns=cols, show="headings", height=10)
+        titulos = ("Tipo", "Nombre", "Nº", "Total", "p50", "p90", "p99", "Máx", "Filas media")
+        for col, titulo in zip(cols, titulos):
+            self.tree_resumen.heading(col, text=titulo)
+            self.tree_resumen.column(col, width=80, anchor="e")
+        self.tree_resumen.column("tipo", width=50, anchor="w")
+        self.tree_resumen.column("nombre", width=220, anchor="w")
+        self.tree_resumen.pack(fill="both", expand=True)
+
+        # Últimas mediciones
+        frame_ultimos = ttk.LabelFrame(self, text="Últimas mediciones", padding=5)
+        frame_ultimos.pack(fill="both", expand=True, padx=10, pady=5)
+
+        cols = ("hora", "tipo", "nombre", "ms", "filas", "detalle")
+        self.tree_ultimos = ttk.Treeview(frame_ultimos, columns=cols, show="headings", height=8)
+        for col, titulo in zip(cols, ("Hora", "Tipo", "Nombre", "ms", "Filas", "Detalle")):
+            self.tree_ultimos.heading(col, text=titulo)
+        self.tree_ultimos.column("hora", width=70, anchor="center")
+        self.tree_ultimos.column("tipo", width=50, anchor="w")
+        self.tree_ultimos.column("nombre", width=180, anchor="w")
+        self.tree_ultimos.column("ms", width=70, anchor="e")
+        self.tree_ultimos.column("filas", width=60, anchor="e")
+        self.tree_ultimos.column("detalle", width=500, anchor="w")
+        self.tree_ultimos.pack(fill="both", expand=True)
+
+        # Conexiones y cachés
+        self.lbl_caches = ttk.Label(self, text="", justify="left")
+        self.lbl_caches.pack(fill="x", padx=10, pady=(0, 10))
+
+    # ---------------------------------------------------------
+    # Acciones
+    # ---------------------------------------------------------
+    def actualizar(self):
+        self.tree_resumen.delete(*self.tree_resumen.get_children())
+        for r in perf.resumen():
+            self.tree_resumen.insert(
+                "",
+                "end",
+                values=(
+                    r["tipo"], r["nombre"], r["n"], r["total_ms"],
+                    r["p50"], r["p90"], r["p99"], r["max"],
+                    "" if r["filas_media"] is None else r["filas_media"],
+                ),
+            )
+
+        eventos = list(perf.eventos)
+        self.tree_ultimos.delete(*self.tree_ultimos.get_children())
+        for ev in reversed(eventos[-self.MAX_ULTIMOS:]):
+            self.tree_ultimos.insert(
+                "",
+                "end",
+                values=(
+                    time.strftime("%H:%M:%S", time.localtime(ev["t"])),
+                    ev["tipo"],
+                    ev["nombre"],
+                    ev["ms"],
+                    ev.get("filas", ""),
+                    self._detalle(ev),
+                ),
+            )
+
+        self.lbl_estado.config(
+            text=f"{len(eventos)} mediciones (se guardan las últimas {perf.MAX_EVENTOS})"
+        )
+        self.lbl_caches.config(text=self._texto_caches())
+
+    def exportar(self):
+        ruta = filedialog.asksaveasfilename(
+            title="Exportar mediciones",
+            defaultextension=".jsonl",
+            initialfile=time.strftime("diagnostico_%Y%m%d_%H%M%S.jsonl"),
+            filetypes=[("JSON lines", "*.jsonl"), ("Todos", "*.*")],
+        )
+        if not ruta:
+            return
+        try:
+            n = perf.exportar_jsonl(ruta)
+        except OSError as e:
+            messagebox.showerror("Error al exportar", str(e))
+            return
+        messagebox.showinfo("Diagnóstico", f"{n} mediciones exportadas a:\n{ruta}")
+
+    def vaciar(self):
+        perf.vaciar()
+        self.actualizar()
+
+    # ---------------------------------------------------------
+    # Auxiliares
+    # ---------------------------------------------------------
+    def _detalle(self, ev) -> str:
+        if ev["tipo"] == "sql":
+            texto = (
+                f"exec {ev['execute_ms']:.1f} / fetch {ev['fetch_ms']:.1f} ms, "
+                f"{ev['bytes']} B | {ev['sql']}"
+            )
+            if ev.get("params"):
+                texto += f" | {ev['params']}"
+            return texto[:400]
+        otros = {
+            k: v for k, v in ev.items()
+            if k not in ("t", "tipo", "nombre", "ms", "filas", "hilo")
+        }
+        return ", ".join(f"{k}={v}" for k, v in otros.items())
+
+    def _texto_caches(self) -> str:
+        lineas = []
+
+        conexiones = self.main_window.executor.conexiones
+        if conexiones is not None:
+            e = conexiones.estadisticas()
+            lineas.append(
+                "Conexiones: " + ", ".join(f"{k} {v}" for k, v in e.items())
+            )
+
+        e = estadisticas_consultas()
+        lineas.append(
+            f"Consultas: {e['variantes']} variantes de SQL, cursores abiertos {e['nuevos']}"
+        )
+
+        e = self.main_window.cache_detalle.estadisticas()
+        lineas.append(
+            f"Caché de detalle: {e['entradas']} facturas, {e['bytes'] // 1024} KB, "
+            f"aciertos {e['aciertos']}, fallos {e['fallos']} "
+            f"({e['tasa_aciertos']:.0%}), expulsiones {e['expulsiones']}, "
+            f"invalidaciones {e['invalidaciones']}"
+        )
+
+        snap = self.main_window.snapshot
+        if snap is not None:
+            lineas.append(
+                f"Instantánea local: {os.path.basename(snap.ruta)}, "
+                f"{os.path.getsize(snap.ruta) // 1024} KB, creada {snap.cabecera['creado']}, "
+                + ", ".join(f"{t} {snap.filas(t)}" for t in snap.cabecera["tablas"])
+            )
+
+        e = cache_por_defecto().estadisticas()
+        lineas.append(
+            f"Caché de PDF: aciertos {e['aciertos']}, fallos {e['fallos']} "
+            f"({e['tasa_aciertos']:.0%}), guardados {e['guardados']}, "
+            f"expulsados {e['expulsados']}"
+        )
+        return "\n".join(lineas)
@@ -0,0 +1,233 @@
+# ui/export_dialog.py
+import os
+import queue
+import threading
+import tkinter as tk
+from datetime import datetime
+from tkinter import ttk, messagebox, filedialog
+
+from table_export import exportar_facturas, exportar_trabajos
+
+
+class ExportarDialog(tk.Toplevel):
+    """
+    Ventana para exportar a Excel (.xlsx) o CSV los resultados de una
+    búsqueda de facturas o de trabajos, con los filtros de la pestaña ya
+    puestos.
+
+    Las filas se leen y escriben por lotes en un hilo propio (con su propia
+    conexión del ConnectionManager): no pasan por el listado ni se guardan
+    en memoria, así que se pueden exportar cientos de miles de líneas.
+    """
+
+    INTERVALO_MS = 100
+
+    def __init__(self, parent, main_window, tipo: str, **filtros):
+        super().__init__(parent)
+        self.main_window = main_window
+        self.tipo = tipo  # "facturas" o "trabajos"
+        self.title(f"Exportar {tipo} a Excel / CSV")
+        self.resizable(False, False)
+        self.transient(parent)
+
+        self.cliente_var = tk.StringVar(value=filtros.get("cliente") or "")
+        self.numero_var = tk.StringVar(value=filtros.get("numero") or "")
+        self.texto_var = tk.StringVar(value=filtros.get("texto") or "")
+        self.desde_var = tk.StringVar()
+        self.hasta_var = tk.StringVar()
+        self.ruta_var = tk.StringVar()
+        self.estado_var = tk.StringVar(value="")
+
+        self._mensajes = queue.Queue()
+        self._cancelar = threading.Event()
+        self._hilo = None
+
+        self._build_ui()
+        self.protocol("WM_DELETE_WINDOW", self.cerrar)
+
+    def _build_ui(self):
+        frm = ttk.Frame(self, padding=10)
+        frm.pack(fill="both", expand=True)
+
+        fila = 0
+        ttk.Label(frm, text="Cliente contiene:").grid(row=fila, column=0, sticky="w")
+        ttk.Entry(frm, textvariable=self.cliente_var, width=40).grid(
+            row=fila, column=1, columnspan=2, sticky="we", padx=5, pady=2
+        )
+        fila += 1
+
+        if self.tipo == "facturas":
+            campos = (
+                ("Nº factura:", self.numero_var, 15),
+                ("Desde (dd/mm/aaaa):", self.desde_var, 12),
+                ("Hasta (dd/mm/aaaa):", self.hasta_var, 12),
+            )
+        else:
+            campos = (("Texto en descripción:", self.texto_var, 40),)
+        for texto, var, ancho in campos:
+            ttk.Label(frm, text=texto).grid(row=fila, column=0, sticky="w")
+            ttk.Entry(frm, textvariable=var, width=ancho).grid(
+                row=fila, column=1, sticky="w", padx=5, pady=2
+            )
+            fila += 1
+
+        ttk.Label(frm, text="Archivo:").grid(row=fila, column=0, sticky="w")
+        ttk.Entry(frm, textvariable=self.ruta_var, width=40).grid(
+            row=fila, column=1, sticky="we", padx=5, pady=2
+        )
+        ttk.Button(frm, text="Examinar...", command=self.elegir_archivo).grid(
+            row=fila, column=2, padx=5
+        )
+        fila += 1
+
+        self.progreso = ttk.Progressbar(frm, mode="determinate", length=350)
+        self.progreso.grid(row=fila, column=0, columnspan=3, sticky="we", pady=(10, 2))
+        ttk.Label(frm, textvariable=self.estado_var).grid(
+            row=fila + 1, column=0, columnspan=3, sticky="w"
+        )
+
+        botones = ttk.Frame(frm)
+        botones.grid(row=fila + 2, column=0, columnspan=3, sticky="e", pady=(10, 0))
+        self.btn_exportar = ttk.Button(botones, text="Exportar", command=self.exportar)
+        self.btn_exportar.pack(side="left", padx=5)
+        self.btn_cancelar = ttk.Button(botones, text="Cancelar", command=self.cerrar)
+        self.btn_cancelar.pack(side="left", padx=5)
+
+    def elegir_archivo(self):
+        ruta = filedialog.asksaveasfilename(
+            title="Guardar resultados",
+            defaultextension=".xlsx",
+            initialfile=f"{self.tipo.capitalize()}_{datetime.now():%Y%m%d}.xlsx",
+            filetypes=[("Excel", "*.xlsx"), ("CSV (separado por ;)", "*.csv")],
+            parent=self,
+        )
+        if ruta:
+            self.ruta_var.set(ruta)
+
+    def _leer_fecha(self, var, nombre):
+        texto = var.get().strip()
+        if not texto:
+            return None
+        try:
+            return datetime.strptime(texto, "%d/%m/%Y").date()
+        except ValueError:
+            raise ValueError(f"La fecha '{nombre}' no es válida: {texto}")
+
+    # ---------------------------------------------------------
+    # Exportación
+    # ---------------------------------------------------------
+    def exportar(self):
+        if not self.main_window.hay_conexion():
+            return
+        ruta = self.ruta_var.get().strip()
+        if not ruta:
+            messagebox.showwarning(
+                "Sin archivo", "Elige el archivo donde guardar los resultados.", parent=self
+            )
+            return
+        if os.path.splitext(ruta)[1].lower() not in (".xlsx", ".csv"):
+            ruta += ".xlsx"
+            self.ruta_var.set(ruta)
+
+        cliente = self.cliente_var.get().strip() or None
+        if self.tipo == "facturas":
+            try:
+                desde = self._leer_fecha(self.desde_var, "desde")
+                hasta = self._leer_fecha(self.hasta_var, "hasta")
+            except ValueError as e:
+                messagebox.showwarning("Fecha no válida", str(e), parent=self)
+                return
+            numero = self.numero_var.get().strip() or None
+
+            def trabajo(conn):
+                return exportar_facturas(
+                    conn, ruta, cliente=cliente, numero=numero, desde=desde, hasta=hasta,
+                    progreso=self._avisar_progreso, cancelar=self._cancelar,
+                )
+        else:
+            texto = self.texto_var.get().strip() or None
+
+            def trabajo(conn):
+                return exportar_trabajos(
+                    conn, ruta, cliente=cliente, texto=texto,
+                    progreso=self._avisar_progreso, cancelar=self._cancelar,
+                )
+
+        self.btn_exportar.config(state="disabled")
+        self.btn_cancelar.config(text="Cancelar")
+        self.progreso.config(value=0, maximum=1)
+        self.estado_var.set("Consultando...")
+        self._cancelar.clear()
+
+        conexiones = self.main_window.executor.conexiones
+        self._hilo = threading.Thread(
+            target=self._trabajar, args=(conexiones, trabajo), name="exportar", daemon=True
+        )
+        self._hilo.start()
+        self.after(self.INTERVALO_MS, self._recoger)
+
+    def _trabajar(self, conexiones, trabajo):
+        # Hilo de exportación: solo se comunica con Tk a través de la cola
+        try:
+            # si se cae la conexión, no volver a escribir el archivo desde el principio
+            filas = conexiones.ejecutar(trabajo, reintentar=False)
+            self._mensajes.put(("fin", filas))
+        except Exception as e:
+            self._mensajes.put(("error", e))
+        finally:
+            conexiones.liberar()  # el hilo termina: su conexión también
+
+    def _avisar_progreso(self, hechas, total):
+        self._mensajes.put(("progreso", (hechas, total)))
+
+    def _recoger(self):
+        progreso = None
+        while True:
+            try:
+                tipo, valor = self._mensajes.get_nowait()
+            except queue.Empty:
+                break
+
+            if tipo == "progreso":
+                progreso = valor  # solo interesa el último
+            elif tipo == "fin":
+                self._terminar(valor)
+                return
+            elif tipo == "error":
+                self._terminar(None, error=valor)
+                return
+
+        if progreso is not None:
+            hechas, total = progreso
+            self.progreso.config(maximum=max(total or hechas, 1), value=hechas)
+            if total:
+                self.estado_var.set(f"{hechas} de {total} filas")
+            else:
+                self.estado_var.set(f"{hechas} filas")
+        self.after(self.INTERVALO_MS, self._recoger)
+
+    def _terminar(self, filas, error=None):
+        self._hilo = None
+        self.btn_exportar.config(state="normal")
+        self.btn_cancelar.config(text="Cerrar")
+
+        if error is not None:
+            self.estado_var.set("")
+            messagebox.showerror("Error al exportar", str(error), parent=self)
+        elif filas is None:
+            self.estado_var.set("Exportación cancelada.")
+        else:
+            self.progreso.config(maximum=max(filas, 1), value=filas)
+            self.estado_var.set(f"{filas} filas exportadas.")
+            messagebox.showinfo(
+                "Exportación terminada",
+                f"{filas} filas exportadas a:\n{self.ruta_var.get()}",
+                parent=self,
+            )
+
+    def cerrar(self):
+        if self._hilo is not None:
+            self._cancelar.set()
+            self.estado_var.set("Cancelando...")
+            return
+        self.destroy()
@@ -1,10 +1,14 @@
 # ui/facturas_tab.py
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from invoice_pdf import generar_pdf_factura
 import os
 
-from db import get_facturas, get_lineas_factura
+import perf
+from db import get_facturas_pagina, contar_facturas, get_lineas_facturas
+from detail_cache import detalle_factura
+from ui.virtual_tree import VirtualTreeview, clave_texto, clave_numero, clave_fecha
+from ui.lote_pdf_dialog import LotePdfDialog
+from ui.export_dialog import ExportarDialog
 
 
 class FacturasTab(ttk.Frame):
@@ -28,6 +32,14 @@ class FacturasTab(ttk.Frame):
 
         # Estructuras de datos en memoria
         self.lista_facturas = []  # para guardar el resultado de la última búsqueda
+        # Cabeceras ya leídas, por número de factura (str), para no buscarlas
+        # en la lista ni volver a pedirlas a la BBDD
+        self.cabeceras = {}
+        # Líneas precargadas en segundo plano de las facturas del listado
+        self.lineas = {}
+        self._filtro_actual = (None, None)  # (cliente, numero) de la última búsqueda
+        self._siguiente = None  # cursor de la página siguiente (None = no hay más)
+        self._total = None  # total de la búsqueda, solo si se ha pedido contarlo
 
         self.factura_actual_numero = None
 
@@ -58,6 +70,18 @@ class FacturasTab(ttk.Frame):
             row=0, column=5, padx=5
         )
 
+        self.lbl_resultados = ttk.Label(filtros, text="")
+        self.lbl_resultados.grid(row=1, column=0, columnspan=4, sticky="w", pady=(5, 0))
+        ttk.Button(filtros, text="Contar total", command=self.contar_total_facturas).grid(
+            row=1, column=4, padx=5, pady=(5, 0)
+        )
+        ttk.Button(
+            filtros, text="Exportar PDFs en lote", command=self.exportar_pdf_lote
+        ).grid(row=1, column=5, padx=5, pady=(5, 0))
+        ttk.Button(
+            filtros, text="Exportar a Excel/CSV", command=self.exportar_facturas
+        ).grid(row=1, column=6, padx=5, pady=(5, 0))
+
         for i in range(6):
             filtros.columnconfigure(i, weight=0)
         filtros.columnconfigure(1, weight=1)
@@ -71,11 +95,12 @@ class FacturasTab(ttk.Frame):
         split.add(frame_lista, weight=3)
 
         columnas = ("numero", "fecha", "cliente", "cif", "total")
-        self.tree_facturas = ttk.Treeview(
+        self.tree_facturas = VirtualTreeview(
             frame_lista,
             columns=columnas,
-            show="headings",
-            selectmode="browse",
+            formatter=self._valores_factura,
+            nombre="facturas",
+            multiseleccion=True,  # Ctrl/Mayús+clic para exportar varias a PDF
         )
         self.tree_facturas.heading("numero", text="Nº factura")
         self.tree_facturas.heading("fecha", text="Fecha")
@@ -89,15 +114,17 @@ class FacturasTab(ttk.Frame):
         self.tree_facturas.column("cif", width=120, anchor="center")
         self.tree_facturas.column("total", width=100, anchor="e")
 
-        self.tree_facturas.pack(side="left", fill="both", expand=True)
+        # Orden al pulsar la cabecera, con claves tipadas (no el texto mostrado)
+        self.tree_facturas.sortable("numero", lambda r: clave_numero(r.NUMERO))
+        self.tree_facturas.sortable("fecha", lambda r: clave_fecha(r.FECHA))
+        self.tree_facturas.sortable("cliente", lambda r: clave_texto(r.CLIENTE))
+        self.tree_facturas.sortable("cif", lambda r: clave_texto(r.CIF))
+        self.tree_facturas.sortable("total", lambda r: clave_numero(r.TOTAL))
 
-        scroll_f = ttk.Scrollbar(
-            frame_lista, orient="vertical", command=self.tree_facturas.yview
-        )
-        self.tree_facturas.configure(yscrollcommand=scroll_f.set)
-        scroll_f.pack(side="right", fill="y")
+        self.tree_facturas.pack(fill="both", expand=True)
 
-        self.tree_facturas.bind("<<TreeviewSelect>>", self.on_factura_select)
+        self.tree_facturas.bind("<<VirtualTreeviewSelect>>", self.on_factura_select)
+        self.tree_facturas.on_need_more = self.cargar_mas_facturas
 
         # ----- Detalle factura -----
         frame_detalle = ttk.Frame(split)
@@ -171,6 +198,7 @@ class FacturasTab(ttk.Frame):
         Llamado desde MainWindow cuando se establece conexión con la BBDD.
         De momento no cargamos nada automáticamente.
         """
+        self.cabeceras = {}  # pueden ser de otra base de datos
         self.limpiar_filtros_facturas(reset_campos=False)
 
     # ---------------------------------------------------------
@@ -181,60 +209,162 @@ class FacturasTab(ttk.Frame):
             self.fact_cliente_var.set("")
             self.fact_numero_var.set("")
 
+        # Descartar consultas en curso de la búsqueda anterior
+        for canal in ("facturas", "facturas_total", "detalle", "lineas"):
+            self.main_window.executor.cancel(canal)
+
         # Limpiar tablas
-        self.tree_facturas.delete(*self.tree_facturas.get_children())
+        self.tree_facturas.clear()
         self.tree_lineas.delete(*self.tree_lineas.get_children())
         self.lbl_factura_info.config(text="Seleccione una factura...")
+        self.lbl_resultados.config(text="")
 
         self.lista_facturas = []
+        self.lineas = {}
+        self._siguiente = None
+        self._total = None
 
     def buscar_facturas(self):
-        conn = self.main_window.get_conn()
-        if conn is None:
+        if not self.main_window.hay_conexion():
             return
 
-        cliente = self.fact_cliente_var.get().strip()
-        numero = self.fact_numero_var.get().strip()
+        cliente = self.fact_cliente_var.get().strip() or None
+        numero = self.fact_numero_var.get().strip() or None
+
+        # Solo la primera página; el resto se pide al desplazarse.
+        # Una búsqueda nueva deja obsoletas las anteriores y su recuento.
+        executor = self.main_window.executor
+        executor.cancel("facturas_total")
+        executor.submit(
+            lambda conn: get_facturas_pagina(conn, cliente=cliente, numero=numero),
+            on_done=lambda res: self._mostrar_facturas(res, cliente, numero),
+            on_error=lambda e: messagebox.showerror("Error al buscar facturas", str(e)),
+            canal="facturas",
+        )
 
-        try:
-            rows = get_facturas(conn, cliente=cliente or None, numero=numero or None)
-        except Exception as e:
-            messagebox.showerror("Error al buscar facturas", str(e))
-            return
+    def _mostrar_facturas(self, resultado, cliente, numero):
+        rows, siguiente = resultado
 
         # Guardamos para posible uso posterior
-        self.lista_facturas = rows
-
-        # Limpiar listado
-        self.tree_facturas.delete(*self.tree_facturas.get_children())
+        self._filtro_actual = (cliente, numero)
+        self._siguiente = siguiente
+        self._total = None
+        self.lista_facturas = list(rows)
+        self.lineas = {}
+        self._guardar_cabeceras(rows)
+
+        # Limpiar listado. Las filas se pintan a medida que se ven.
+        self.tree_facturas.set_rows(self.lista_facturas, has_more=siguiente is not None)
         self.tree_lineas.delete(*self.tree_lineas.get_children())
         self.lbl_factura_info.config(text="Seleccione una factura...")
-
-        for r in rows:
-            fecha = r.FECHA
-            fecha_str = ""
-            if fecha is not None:
-                try:
-                    fecha_str = fecha.strftime("%d/%m/%Y")
-                except Exception:
-                    fecha_str = str(fecha)
-                    
-            total = round(float(r.TOTAL or 0), 2),
-            self.tree_facturas.insert(
-                "",
-                "end",
-                values=(r.NUMERO, fecha_str, r.CLIENTE, r.CIF, total),
-            )
+        self._actualizar_resultados()
+        self._precargar_lineas()
 
         if not rows:
             messagebox.showinfo("Sin resultados", "No se han encontrado facturas.")
 
+    def cargar_mas_facturas(self):
+        """Llamado por el listado al acercarse al final de lo ya cargado."""
+        if self._siguiente is None:
+            self.tree_facturas.has_more = False
+            return
+
+        cliente, numero = self._filtro_actual
+        despues = self._siguiente
+
+        def error(e):
+            self._siguiente = None
+            self.tree_facturas.has_more = False
+            messagebox.showerror("Error al buscar facturas", str(e))
+
+        self.main_window.executor.submit(
+            lambda conn: get_facturas_pagina(
+                conn, cliente=cliente, numero=numero, despues=despues
+            ),
+            on_done=self._anadir_facturas,
+            on_error=error,
+            canal="facturas",
+        )
+
+    def _anadir_facturas(self, resultado):
+        rows, self._siguiente = resultado
+        self._guardar_cabeceras(rows)
+        # lista_facturas es la misma lista que muestra el listado
+        self.tree_facturas.append_rows(rows, has_more=self._siguiente is not None)
+        self._actualizar_resultados()
+        self._precargar_lineas()
+
+    def _guardar_cabeceras(self, rows):
+        for r in rows:
+            self.cabeceras[str(r.NUMERO)] = r
+
+    def _precargar_lineas(self):
+        """
+        Lee en segundo plano, con pocas consultas IN (...), las líneas de
+        las facturas cargadas en el listado que aún no se tengan, para que
+        al recorrerlo con el teclado el detalle salga sin consultar.
+        """
+        numeros = [
+            str(r.NUMERO) for r in self.lista_facturas if str(r.NUMERO) not in self.lineas
+        ]
+        if not numeros:
+            return
+        # Si llega otra página antes de terminar, la nueva precarga incluye
+        # también las facturas de esta.
+        self.main_window.executor.submit(
+            lambda conn: get_lineas_facturas(conn, numeros),
+            on_done=lambda res: self._guardar_lineas(numeros, res),
+            on_error=lambda e: None,  # sin precarga el detalle se consulta al seleccionar
+            canal="lineas",
+        )
+
+    def _guardar_lineas(self, numeros, lineas):
+        for n in numeros:
+            self.lineas[n] = lineas.get(n, [])
+
+    def _actualizar_resultados(self):
+        n = len(self.lista_facturas)
+        if self._total is not None and self._siguiente is not None:
+            txt = f"{n} de {self._total} facturas cargadas"
+        elif self._siguiente is not None:
+            txt = f"{n} facturas cargadas (hay más: desplázate o pulsa Contar total)"
+        else:
+            txt = f"{n} facturas"
+        self.lbl_resultados.config(text=txt)
+
+    def contar_total_facturas(self):
+        """El total se calcula aparte y solo cuando se pide."""
+        if not self.main_window.hay_conexion():
+            return
+        cliente, numero = self._filtro_actual
+        self.main_window.executor.submit(
+            lambda conn: contar_facturas(conn, cliente=cliente, numero=numero),
+            on_done=self._mostrar_total,
+            on_error=lambda e: messagebox.showerror("Error al contar facturas", str(e)),
+            canal="facturas_total",
+        )
+
+    def _mostrar_total(self, total):
+        self._total = total
+        self._actualizar_resultados()
+
+    def _valores_factura(self, r):
+        fecha = r.FECHA
+        fecha_str = ""
+        if fecha is not None:
+            try:
+                fecha_str = fecha.strftime("%d/%m/%Y")
+            except Exception:
+                fecha_str = str(fecha)
+
+        total = round(float(r.TOTAL or 0), 2)
+        return (r.NUMERO, fecha_str, r.CLIENTE, r.CIF, total)
+
     def on_factura_select(self, event=None):
-        sel = self.tree_facturas.selection()
-        if not sel:
+        fila = self.tree_facturas.selected_row()
+        if fila is None:
             return
-        item = sel[0]
-        numero = self.tree_facturas.item(item, "values")[0]
+        numero = str(fila.NUMERO)
         self.cargar_detalle_factura(numero)
         
         # Guardamos el número seleccionado
@@ -244,35 +374,45 @@ class FacturasTab(ttk.Frame):
         """
         Carga cabecera + líneas de la factura seleccionada.
         """
-        conn = self.main_window.get_conn()
-        if conn is None:
+        if not self.main_window.hay_conexion():
             return
         
         # Aseguramos que queda guardado
         self.factura_actual_numero = numero   # ← AÑADIDO
 
-        # 1) Cabecera: intentamos cogerla de la lista ya cargada
-        cabecera = None
-        for r in self.lista_facturas:
-            if str(r.NUMERO) == str(numero):
-                cabecera = r
-                break
+        # 1) Cabecera: normalmente ya está leída
+        cabecera = self.cabeceras.get(str(numero))
 
-        # Si no estaba en lista_facturas (por ejemplo, llamada directa)
-        if cabecera is None:
-            try:
-                filas = get_facturas(conn, cliente=None, numero=numero)
-                if filas:
-                    cabecera = filas[0]
-            except Exception as e:
-                messagebox.showerror("Error cabecera factura", str(e))
-                return
+        # Cabecera y líneas ya en memoria: sin consulta
+        lineas = self.lineas.get(str(numero))
+        if cabecera is not None and lineas is not None:
+            self.main_window.executor.cancel("detalle")
+            self._mostrar_detalle(numero, cabecera, lineas)
+            return
+
+        cache = self.main_window.cache_detalle
+
+        def consulta(conn):
+            # De la caché de detalle si ya se abrió antes; si no, de la BBDD
+            # (la cabecera solo si no se había leído, p.ej. llamada directa)
+            return detalle_factura(conn, numero, cache, cabecera)
 
+        # Al moverse rápido por el listado solo cuenta la última selección
+        self.main_window.executor.submit(
+            consulta,
+            on_done=lambda res: self._mostrar_detalle(numero, *res),
+            on_error=lambda e: messagebox.showerror("Error detalle factura", str(e)),
+            canal="detalle",
+        )
+
+    def _mostrar_detalle(self, numero, cabecera, lineas):
         if cabecera is None:
             self.lbl_factura_info.config(
                 text=f"No se ha encontrado la factura {numero}"
             )
             return
+        self.cabeceras[str(cabecera.NUMERO)] = cabecera
+        self.lineas[str(numero)] = lineas
 
         fecha = cabecera.FECHA
         fecha_str = ""
@@ -291,29 +431,24 @@ class FacturasTab(ttk.Frame):
         self.lbl_factura_info.config(text=txt)
 
         # 2) Líneas
-        try:
-            lineas = get_lineas_factura(conn, numero)
-        except Exception as e:
-            messagebox.showerror("Error líneas factura", str(e))
-            return
-
-        self.tree_lineas.delete(*self.tree_lineas.get_children())
-
-        for r in lineas:
-            cantidad = r.CANTIDAD if r.CANTIDAD is not None else 0
-            precio = r.PRECIO if r.PRECIO is not None else 0
-            importe = getattr(r, "Importe", None)
-            if importe is None:
-                try:
-                    importe = round(cantidad * precio, 2)
-                except Exception:
-                    importe = 0.00
-
-            self.tree_lineas.insert(
-                "",
-                "end",
-                values=(r.Codigo, r.Datos, cantidad, precio, importe),
-            )
+        with perf.medir("ui", "facturas.lineas", filas=len(lineas)):
+            self.tree_lineas.delete(*self.tree_lineas.get_children())
+
+            for r in lineas:
+                cantidad = r.CANTIDAD if r.CANTIDAD is not None else 0
+                precio = r.PRECIO if r.PRECIO is not None else 0
+                importe = getattr(r, "Importe", None)
+                if importe is None:
+                    try:
+                        importe = round(cantidad * precio, 2)
+                    except Exception:
+                        importe = 0.00
+
+                self.tree_lineas.insert(
+                    "",
+                    "end",
+                    values=(r.Codigo, r.Datos, cantidad, precio, importe),
+                )
 
     # ---------------------------------------------------------
     # Métodos llamados desde otras pestañas
@@ -332,14 +467,47 @@ class FacturasTab(ttk.Frame):
         Llamado desde TrabajosTab (p.ej. doble clic en un trabajo)
         para ir directamente a una factura concreta.
         """
+        numero = str(numero)
         self.fact_cliente_var.set("")
-        self.fact_numero_var.set(str(numero))
-        self.buscar_facturas()
-        self.cargar_detalle_factura(numero)
+        self.fact_numero_var.set(numero)
+        if not self.main_window.hay_conexion():
+            return
+
+        # Una sola consulta para listado y detalle; la cabecera solo se
+        # pide si no se había leído antes.
+        cabecera = self.cabeceras.get(numero)
+        lineas = self.lineas.get(numero)
+        cache = self.main_window.cache_detalle
+
+        def consulta(conn):
+            if cabecera is not None and lineas is not None:
+                return [cabecera], lineas
+            cab, lin = detalle_factura(conn, numero, cache, cabecera)
+            return ([cab] if cab is not None else []), lin
+
+        executor = self.main_window.executor
+        executor.cancel("facturas_total")
+        executor.cancel("detalle")
+        executor.submit(
+            consulta,
+            on_done=lambda res: self._mostrar_factura_unica(numero, *res),
+            on_error=lambda e: messagebox.showerror("Error detalle factura", str(e)),
+            canal="facturas",
+        )
+
+    def _mostrar_factura_unica(self, numero, filas, lineas):
+        self._mostrar_facturas((filas, None), None, numero)
+        if not filas:
+            return
+        self.main_window.executor.cancel("lineas")  # ya las tenemos
+        self.lineas[numero] = lineas
+        self.factura_actual_numero = numero
+        # El detalle ya está leído: seleccionar sin volver a consultarlo
+        self.tree_facturas.select_index(0, avisar=False)
+        self._mostrar_detalle(numero, filas[0], lineas)
 
     def exportar_pdf_factura(self):
-        conn = self.main_window.get_conn()
-        if conn is None:
+        if not self.main_window.hay_conexion():
             return
 
         numero = getattr(self, "factura_actual_numero", None)
@@ -361,15 +529,48 @@ class FacturasTab(ttk.Frame):
         if not ruta:
             return  # usuario ha cancelado
 
-        try:
-            generar_pdf_factura(conn, numero, ruta)
-        except Exception as e:
+        def error(e):
             messagebox.showerror(
                 "Error al generar PDF",
                 f"No se ha podido generar el PDF de la factura {numero}.\n\n{e}",
             )
+
+        def generar(conn):
+            # reportlab se carga con el primer PDF, y en el hilo de consultas
+            from invoice_pdf import generar_pdf_factura
+
+            generar_pdf_factura(conn, numero, ruta)
+
+        self.main_window.executor.submit(
+            generar,
+            on_done=lambda _: self._pdf_generado(numero, ruta),
+            on_error=error,
+        )
+
+    def exportar_facturas(self):
+        """Exporta el listado de facturas del filtro (p.ej. las de un año) a un archivo."""
+        if not self.main_window.hay_conexion():
             return
+        ExportarDialog(
+            self,
+            self.main_window,
+            "facturas",
+            cliente=self.fact_cliente_var.get().strip(),
+            numero=self.fact_numero_var.get().strip(),
+        )
+
+    def exportar_pdf_lote(self):
+        """Exporta a PDF las facturas elegidas en la lista, o las de un rango de fechas y/o un cliente."""
+        if not self.main_window.hay_conexion():
+            return
+        LotePdfDialog(
+            self,
+            self.main_window,
+            cliente=self.fact_cliente_var.get().strip(),
+            seleccion=self.tree_facturas.selected_rows(),
+        )
 
+    def _pdf_generado(self, numero, ruta):
         messagebox.showinfo(
             "PDF generado",
             f"Se ha generado el PDF de la factura {numero}:\n{ruta}",
@@ -380,4 +581,4 @@ class FacturasTab(ttk.Frame):
             if os.name == "nt":
                 os.startfile(ruta)
         except Exception:
-            pass
\ No newline at end of file
+            pass
@@ -0,0 +1,282 @@
+# ui/lote_pdf_dialog.py
+import os
+import queue
+import threading
+import tkinter as tk
+from datetime import datetime
+from tkinter import ttk, messagebox, filedialog
+
+from batch_export import leer_facturas, exportar_lote, exportar_libro
+
+
+class LotePdfDialog(tk.Toplevel):
+    """
+    Ventana para exportar a PDF todas las facturas de un rango de fechas
+    y/o de un cliente, o las elegidas en la lista de facturas (`seleccion`,
+    sus cabeceras): un archivo por factura en una carpeta, o todas en un
+    único PDF (libro de facturas).
+
+    La exportación va en un hilo propio (con su propia conexión del
+    ConnectionManager), así que las pestañas se pueden seguir usando.
+    """
+
+    INTERVALO_MS = 100
+
+    def __init__(self, parent, main_window, cliente: str = "", seleccion=()):
+        super().__init__(parent)
+        self.main_window = main_window
+        self.seleccion = list(seleccion)
+        self.title("Exportar facturas en PDF")
+        self.resizable(False, False)
+        self.transient(parent)
+
+        self.desde_var = tk.StringVar()
+        self.hasta_var = tk.StringVar()
+        self.cliente_var = tk.StringVar(value=cliente)
+        self.carpeta_var = tk.StringVar()
+        self.libro_var = tk.BooleanVar(value=False)
+        # "seleccion": las facturas elegidas en la lista; "filtro": fechas/cliente
+        self.modo_var = tk.StringVar(value="seleccion" if len(self.seleccion) > 1 else "filtro")
+        self.estado_var = tk.StringVar(value="")
+
+        self._mensajes = queue.Queue()
+        self._cancelar = threading.Event()
+        self._hilo = None
+
+        self._build_ui()
+        self.protocol("WM_DELETE_WINDOW", self.cerrar)
+
+    def _build_ui(self):
+        frm = ttk.Frame(self, padding=10)
+        frm.pack(fill="both", expand=True)
+
+        if self.seleccion:
+            modo = ttk.Frame(frm)
+            modo.grid(row=0, column=0, columnspan=3, sticky="w", pady=(0, 5))
+            n = len(self.seleccion)
+            ttk.Radiobutton(
+                modo,
+                text=f"Facturas elegidas en la lista ({n})",
+                variable=self.modo_var,
+                value="seleccion",
+                command=self._cambiar_modo,
+            ).pack(side="left")
+            ttk.Radiobutton(
+                modo,
+                text="Por fechas y cliente",
+                variable=self.modo_var,
+                value="filtro",
+                command=self._cambiar_modo,
+            ).pack(side="left", padx=(10, 0))
+
+        # Fila 0: modo (solo si hay facturas elegidas en la lista)
+        self._entradas_filtro = [
+            ttk.Entry(frm, textvariable=self.desde_var, width=12),
+            ttk.Entry(frm, textvariable=self.hasta_var, width=12),
+            ttk.Entry(frm, textvariable=self.cliente_var, width=40),
+        ]
+        desde, hasta, cliente = self._entradas_filtro
+        ttk.Label(frm, text="Desde (dd/mm/aaaa):").grid(row=1, column=0, sticky="w")
+        desde.grid(row=1, column=1, sticky="w", padx=5, pady=2)
+        ttk.Label(frm, text="Hasta (dd/mm/aaaa):").grid(row=2, column=0, sticky="w")
+        hasta.grid(row=2, column=1, sticky="w", padx=5, pady=2)
+        ttk.Label(frm, text="Cliente contiene:").grid(row=3, column=0, sticky="w")
+        cliente.grid(row=3, column=1, columnspan=2, sticky="we", padx=5, pady=2)
+
+        ttk.Label(frm, text="Carpeta de destino:").grid(row=4, column=0, sticky="w")
+        ttk.Entry(frm, textvariable=self.carpeta_var, width=40).grid(
+            row=4, column=1, sticky="we", padx=5, pady=2
+        )
+        ttk.Button(frm, text="Examinar...", command=self.elegir_carpeta).grid(
+            row=4, column=2, padx=5
+        )
+
+        ttk.Checkbutton(
+            frm, text="Un solo PDF con todas (libro de facturas)", variable=self.libro_var
+        ).grid(row=5, column=0, columnspan=3, sticky="w", pady=(5, 0))
+
+        self.progreso = ttk.Progressbar(frm, mode="determinate", length=350)
+        self.progreso.grid(row=6, column=0, columnspan=3, sticky="we", pady=(10, 2))
+        ttk.Label(frm, textvariable=self.estado_var).grid(
+            row=7, column=0, columnspan=3, sticky="w"
+        )
+
+        botones = ttk.Frame(frm)
+        botones.grid(row=8, column=0, columnspan=3, sticky="e", pady=(10, 0))
+        self.btn_exportar = ttk.Button(botones, text="Exportar", command=self.exportar)
+        self.btn_exportar.pack(side="left", padx=5)
+        self.btn_cancelar = ttk.Button(botones, text="Cancelar", command=self.cerrar)
+        self.btn_cancelar.pack(side="left", padx=5)
+        self._cambiar_modo()
+
+    def _cambiar_modo(self):
+        # Con las facturas elegidas no se usan las fechas ni el cliente
+        estado = "disabled" if self.modo_var.get() == "seleccion" else "normal"
+        for entrada in self._entradas_filtro:
+            entrada.config(state=estado)
+
+    def elegir_carpeta(self):
+        carpeta = filedialog.askdirectory(
+            title="Carpeta para los PDF", parent=self
+        )
+        if carpeta:
+            self.carpeta_var.set(carpeta)
+
+    def _leer_fecha(self, var, nombre):
+        texto = var.get().strip()
+        if not texto:
+            return None
+        try:
+            return datetime.strptime(texto, "%d/%m/%Y").date()
+        except ValueError:
+            raise ValueError(f"La fecha '{nombre}' no es válida: {texto}")
+
+    # ---------------------------------------------------------
+    # Exportación
+    # ---------------------------------------------------------
+    def exportar(self):
+        if not self.main_window.hay_conexion():
+            return
+        cabeceras = None
+        desde = hasta = cliente = None
+        if self.modo_var.get() == "seleccion":
+            cabeceras = self.seleccion
+        else:
+            try:
+                desde = self._leer_fecha(self.desde_var, "desde")
+                hasta = self._leer_fecha(self.hasta_var, "hasta")
+            except ValueError as e:
+                messagebox.showwarning("Fecha no válida", str(e), parent=self)
+                return
+            cliente = self.cliente_var.get().strip() or None
+        carpeta = self.carpeta_var.get().strip()
+        if not carpeta:
+            messagebox.showwarning(
+                "Sin carpeta", "Elige la carpeta donde guardar los PDF.", parent=self
+            )
+            return
+        if cabeceras is None and desde is None and hasta is None and cliente is None:
+            if not messagebox.askyesno(
+                "Exportar todas",
+                "No hay filtro: se exportarán TODAS las facturas.\n¿Continuar?",
+                parent=self,
+            ):
+                return
+
+        self.btn_exportar.config(state="disabled")
+        self.progreso.config(value=0, maximum=1)
+        self.estado_var.set("Leyendo facturas...")
+        self._cancelar.clear()
+
+        conexiones = self.main_window.executor.conexiones
+        objetivo = self._trabajar_libro if self.libro_var.get() else self._trabajar
+        self._hilo = threading.Thread(
+            target=objetivo,
+            args=(conexiones, cliente, desde, hasta, carpeta, cabeceras),
+            name="pdf-lote",
+            daemon=True,
+        )
+        self._hilo.start()
+        self.after(self.INTERVALO_MS, self._recoger)
+
+    def _trabajar(self, conexiones, cliente, desde, hasta, carpeta, cabeceras):
+        # Hilo de exportación: solo se comunica con Tk a través de la cola
+        try:
+            facturas = conexiones.ejecutar(
+                lambda conn: leer_facturas(
+                    conn, cliente=cliente, desde=desde, hasta=hasta, cabeceras=cabeceras
+                )
+            )
+            self._avisar_progreso(0, len(facturas))
+            if self._cancelar.is_set():
+                facturas = []
+            resumen = exportar_lote(
+                facturas,
+                carpeta,
+                progreso=self._avisar_progreso,
+                cancelar=self._cancelar,
+            )
+            self._mensajes.put(("fin", resumen))
+        except Exception as e:
+            self._mensajes.put(("error", e))
+        finally:
+            conexiones.liberar()  # el hilo termina: su conexión también
+
+    def _trabajar_libro(self, conexiones, cliente, desde, hasta, carpeta, cabeceras):
+        nombre = "Libro_facturas"
+        if desde:
+            nombre += desde.strftime("_%Y%m%d")
+        if hasta:
+            nombre += hasta.strftime("_%Y%m%d")
+        ruta = os.path.join(carpeta, nombre + ".pdf")
+        try:
+            resumen = conexiones.ejecutar(
+                lambda conn: exportar_libro(
+                    conn,
+                    ruta,
+                    cliente=cliente,
+                    desde=desde,
+                    hasta=hasta,
+                    progreso=self._avisar_progreso,
+                    cancelar=self._cancelar,
+                    cabeceras=cabeceras,
+                ),
+                reintentar=False,  # si se cae la conexión, no empezar el libro de nuevo
+            )
+            self._mensajes.put(("fin", resumen))
+        except Exception as e:
+            self._mensajes.put(("error", e))
+        finally:
+            conexiones.liberar()  # el hilo termina: su conexión también
+
+    def _avisar_progreso(self, hechas, total):
+        self._mensajes.put(("progreso", (hechas, total)))
+
+    def _recoger(self):
+        while True:
+            try:
+                tipo, valor = self._mensajes.get_nowait()
+            except queue.Empty:
+                break
+
+            if tipo == "progreso":
+                hechas, total = valor
+                self.progreso.config(maximum=max(total, 1), value=hechas)
+                self.estado_var.set(f"{hechas} de {total} facturas")
+            elif tipo == "fin":
+                self._terminar(valor)
+                return
+            elif tipo == "error":
+                self._terminar(None)
+                messagebox.showerror("Error al exportar", str(valor), parent=self)
+                return
+
+        self.after(self.INTERVALO_MS, self._recoger)
+
+    def _terminar(self, resumen):
+        self._hilo = None
+        self.btn_exportar.config(state="normal")
+        self.btn_cancelar.config(text="Cerrar")
+        if resumen is None:
+            self.estado_var.set("")
+            return
+
+        if resumen.fallos:
+            messagebox.showwarning("Exportación terminada", resumen.texto(), parent=self)
+        else:
+            messagebox.showinfo("Exportación terminada", resumen.texto(), parent=self)
+
+        # En Windows, abrir la carpeta con los PDF
+        try:
+            if os.name == "nt" and (resumen.generadas or resumen.libro):
+                os.startfile(self.carpeta_var.get())
+        except Exception:
+            pass
+
+    def cerrar(self):
+        if self._hilo is not None:
+            # Las facturas que ya se están dibujando terminan; el resto no
+            self._cancelar.set()
+            self.estado_var.set("Cancelando...")
+            return
+        self.destroy()
@@ -5,14 +5,28 @@ import tkinter as tk
 from tkinter import messagebox
 from tkinter import filedialog
 
+import importlib
 import os
+import queue
+import threading
 
-from db import connect
-from ui.clientes_tab import ClientesTab
-from ui.facturas_tab import FacturasTab
-from ui.trabajos_tab import TrabajosTab
+import perf
+from db import get_backend, AccessBackend, SQLiteBackend
+from mirror import abrir_espejo, ruta_espejo
+from connection_manager import ConnectionManager
+from detail_cache import CacheDetalle
+from ui.query_executor import QueryExecutor
 from config import load_config, save_config
 
+# (nombre, título, módulo, clase) de cada pestaña. Se importan y construyen
+# la primera vez que se seleccionan: así la ventana aparece sin esperar a
+# numpy, reportlab ni a construir listados que quizá no se usen.
+PESTANAS = (
+    ("clientes", "Clientes", "ui.clientes_tab", "ClientesTab"),
+    ("facturas", "Facturas", "ui.facturas_tab", "FacturasTab"),
+    ("trabajos", "Trabajos", "ui.trabajos_tab", "TrabajosTab"),
+)
+
 
 class MainWindow(ttk.Window):
     def __init__(self):
@@ -21,45 +35,142 @@ class MainWindow(ttk.Window):
         self.title("Aplicacion para consulta de facturas -  Electromecanica Luis)")
         self.geometry("1100x650")
 
-        self.conn = None
         self.db_path = None
 
         self._build_top_bar()
         self._build_notebook()
 
+        # Todas las consultas se hacen en un hilo aparte con su propia conexión
+        self.executor = QueryExecutor(self, on_busy=self._on_busy)
+
         self.config_data = load_config()
         self.db_path_var.set(self.config_data.get("db_path", ""))
+        self.usar_espejo_var.set(bool(self.config_data.get("usar_espejo", False)))
+        self.usar_snapshot_var.set(bool(self.config_data.get("usar_snapshot", False)))
+
+        # Detalle de las últimas facturas abiertas (se vacía al cambiar de BBDD)
+        self.cache_detalle = CacheDetalle(
+            max_entradas=self.config_data.get("cache_detalle_entradas", 500),
+            max_mb=self.config_data.get("cache_detalle_mb", 20),
+        )
+
+        # Instantánea local por columnas de la BBDD conectada (snapshot.py)
+        self.snapshot = None
+        self._hilo_snapshot = None
+        self._mensajes_snapshot = queue.Queue()
+
+        # Pestaña oculta de diagnóstico (tiempos de consultas, listados y PDF)
+        self.diagnostico_tab = None
+        self.bind("<Control-Shift-D>", self.alternar_diagnostico)
+        self.bind("<Control-Shift-d>", self.alternar_diagnostico)
+
+        # La pestaña inicial se construye con la ventana ya en pantalla
+        self.after_idle(self._mostrar_primera_pestana)
 
 
     def _build_top_bar(self):
         top = ttk.Frame(self, padding=10)
         top.pack(fill="x")
 
-        ttk.Label(top, text="Base de datos Access (.mdb):").pack(side="left")
+        ttk.Label(top, text="Base de datos (.mdb / .sqlite):").pack(side="left")
         self.db_path_var = tk.StringVar()
         ttk.Entry(top, textvariable=self.db_path_var, width=60).pack(side="left", padx=5)
 
         ttk.Button(top, text="Examinar...", command=self.browse_db).pack(side="left", padx=5)
         ttk.Button(top, text="Conectar", command=self.connect_db).pack(side="left", padx=5)
 
+        self.usar_espejo_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            top, text="Usar copia local", variable=self.usar_espejo_var
+        ).pack(side="left", padx=5)
+
+        self.usar_snapshot_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            top, text="Instantánea de clientes", variable=self.usar_snapshot_var
+        ).pack(side="left", padx=5)
+
+        # Indicador de actividad mientras hay consultas en curso
+        self.busy_bar = ttk.Progressbar(top, mode="indeterminate", length=80)
+        self.busy_bar.pack(side="right", padx=5)
+
     def _build_notebook(self):
         self.notebook = ttk.Notebook(self)
         self.notebook.pack(fill="both", expand=True, padx=10, pady=(0, 10))
         self.notebook.configure(bootstyle="info")
 
-        # Creamos las pestañas pero les pasamos self para que puedan llamar a métodos de la ventana
-        self.clientes_tab = ClientesTab(self.notebook, self)
-        self.facturas_tab = FacturasTab(self.notebook, self)
-        self.trabajos_tab = TrabajosTab(self.notebook, self)
+        # Cada pestaña empieza siendo un marco vacío que ocupa su sitio; la
+        # pestaña de verdad se crea al seleccionarla (o al pedirla otra
+        # pestaña, p.ej. clientes_tab -> facturas_tab) y lo sustituye.
+        self._pestanas = {}  # nombre -> pestaña ya construida
+        self._huecos = {}    # nombre -> marco vacío provisional
+        for nombre, titulo, _, _ in PESTANAS:
+            hueco = ttk.Frame(self.notebook)
+            self.notebook.add(hueco, text=titulo)
+            self._huecos[nombre] = hueco
+
+        self.notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed)
+
+    # Las pestañas les pasan self para que puedan llamar a métodos de la ventana
+    # y entre ellas se usan a través de estas propiedades
+    @property
+    def clientes_tab(self):
+        return self.pestana("clientes")
+
+    @property
+    def facturas_tab(self):
+        return self.pestana("facturas")
 
-        self.notebook.add(self.clientes_tab, text="Clientes")
-        self.notebook.add(self.facturas_tab, text="Facturas")
-        self.notebook.add(self.trabajos_tab, text="Trabajos")
+    @property
+    def trabajos_tab(self):
+        return self.pestana("trabajos")
+
+    def pestana(self, nombre: str):
+        """Devuelve la pestaña indicada, construyéndola si aún no existe."""
+        tab = self._pestanas.get(nombre)
+        if tab is None:
+            tab = self._construir_pestana(nombre)
+        return tab
+
+    def _construir_pestana(self, nombre: str):
+        _, titulo, modulo, clase = next(p for p in PESTANAS if p[0] == nombre)
+        with perf.medir("arranque", f"pestana.{nombre}"):
+            cls = getattr(importlib.import_module(modulo), clase)
+            tab = cls(self.notebook, self)
+        self._pestanas[nombre] = tab
+
+        # La pestaña ocupa el sitio (y la selección) del marco provisional
+        hueco = self._huecos.pop(nombre)
+        seleccionado = self.notebook.select() == str(hueco)
+        self.notebook.insert(self.notebook.index(hueco), tab, text=titulo)
+        if seleccionado:
+            self.notebook.select(tab)
+        self.notebook.forget(hueco)
+        hueco.destroy()
+
+        if self.db_path is not None:
+            tab.on_db_connected()
+        return tab
+
+    def _on_tab_changed(self, event=None):
+        actual = self.notebook.select()
+        for nombre, hueco in list(self._huecos.items()):
+            if str(hueco) == actual:
+                self.pestana(nombre)
+                break
+
+    def _mostrar_primera_pestana(self):
+        perf.marcar_arranque("primera_ventana")
+        self._on_tab_changed()
+        perf.marcar_arranque("primera_pestana")
 
     def browse_db(self):
         filename = filedialog.askopenfilename(
-            title="Seleccionar base de datos Access",
-            filetypes=[("Base de datos Access", "*.mdb;*.accdb"), ("Todos", "*.*")],
+            title="Seleccionar base de datos",
+            filetypes=[
+                ("Base de datos Access", "*.mdb;*.accdb"),
+                ("Base de datos SQLite", "*.db;*.sqlite;*.sqlite3"),
+                ("Todos", "*.*"),
+            ],
         )
         if filename:
             self.db_path_var.set(filename)
@@ -73,22 +184,168 @@ class MainWindow(ttk.Window):
             messagebox.showerror("Archivo no encontrado", db_path)
             return
 
-        try:
-            if self.conn:
-                self.conn.close()
-            self.conn = connect(db_path)
+        usar_espejo = self.usar_espejo_var.get()
+        usar_snapshot = self.usar_snapshot_var.get()
+
+        def abrir():
+            # Se ejecuta en el hilo de consultas (la sincronización puede tardar)
+            if usar_espejo and isinstance(get_backend(db_path), AccessBackend):
+                # Todas las lecturas se sirven desde la copia local SQLite
+                espejo, resumen = abrir_espejo(db_path)
+                espejo.close()
+                return ConnectionManager(ruta_espejo(db_path), SQLiteBackend()), resumen
+
+            conexiones = ConnectionManager(db_path)
+            conexiones.get()  # abre ya la conexión para avisar si falla
+            return conexiones, None
+
+        def conectado(resumen):
             self.db_path = db_path
-            messagebox.showinfo("Conexión", "Conexión correcta a la base de datos.")
-            # Avisamos a las pestañas para que recarguen datos si quieren
-            self.clientes_tab.on_db_connected()
-            self.facturas_tab.on_db_connected()
-            self.trabajos_tab.on_db_connected()
-        except Exception as e:
+            self.cache_detalle.vincular(db_path)
+
+            self.config_data["db_path"] = db_path
+            self.config_data["usar_espejo"] = usar_espejo
+            self.config_data["usar_snapshot"] = usar_snapshot
+            save_config(self.config_data)
+
+            msg = "Conexión correcta a la base de datos."
+            if resumen is not None:
+                msg += (
+                    f"\n\nCopia local actualizada: {resumen['facturas']} facturas "
+                    f"y {resumen['lineas']} líneas copiadas."
+                )
+                if resumen["duplicadas"]:
+                    msg += (
+                        f"\n{resumen['duplicadas']} facturas con el número repetido "
+                        "en el MDB: se ha copiado solo la primera de cada número."
+                    )
+            messagebox.showinfo("Conexión", msg)
+            self._preparar_snapshot(db_path)
+            # Avisamos a las pestañas ya construidas para que recarguen datos
+            # si quieren (las demás lo harán al construirse)
+            for tab in list(self._pestanas.values()):
+                tab.on_db_connected()
+
+        def error(e):
+            self.db_path = None
             messagebox.showerror("Error de conexión", str(e))
-            self.conn = None
 
-    def get_conn(self):
-        if self.conn is None:
-            messagebox.showwarning("Sin conexión", "Conéctate primero a la base de datos.")
+        self.db_path = None
+        self._cerrar_snapshot()
+        self.cache_detalle.vincular(None)
+        self.executor.conectar(abrir, on_done=conectado, on_error=error)
+
+    # ---------------------------------------------------------
+    # Instantánea local
+    # ---------------------------------------------------------
+    def _preparar_snapshot(self, db_path: str):
+        """
+        Abre la instantánea local de la BBDD si está al día con el archivo; si
+        no existe o está desfasada, la escribe en segundo plano (mientras
+        tanto las pestañas leen de la BBDD como siempre).
+        """
+        self._cerrar_snapshot()
+        if not self.config_data.get("usar_snapshot", False):
+            return
+        import snapshot  # numpy: solo cuando se conecta
+
+        self.snapshot = snapshot.abrir_vigente(db_path)
+        if self.snapshot is not None or self._hilo_snapshot is not None:
+            return
+
+        conexiones = self.executor.conexiones
+        firma = snapshot.firma_bd(db_path)  # antes de leer nada
+
+        def trabajar():
+            # Hilo propio con su propia conexión: no retrasa las consultas.
+            # El tiempo y, si falla, el error quedan en perf (pestaña Diagnóstico).
+            with perf.medir("snapshot", "escribir") as ev:
+                try:
+                    ruta = conexiones.ejecutar(
+                        lambda conn: snapshot.escribir_snapshot(conn, db_path, firma),
+                        reintentar=False,  # si se cae, se vuelve a escribir al conectar
+                    )
+                    self._mensajes_snapshot.put((db_path, ruta, None))
+                except Exception as e:
+                    ev["error"] = str(e)
+                    self._mensajes_snapshot.put((db_path, None, e))
+                finally:
+                    conexiones.liberar()  # el hilo termina: su conexión también
+
+        self._hilo_snapshot = threading.Thread(target=trabajar, name="snapshot", daemon=True)
+        self._hilo_snapshot.start()
+        self.after(500, self._recoger_snapshot)
+
+    def _recoger_snapshot(self):
+        try:
+            db_path, ruta, error = self._mensajes_snapshot.get_nowait()
+        except queue.Empty:
+            self.after(500, self._recoger_snapshot)
+            return
+        self._hilo_snapshot = None
+        if error is not None:
+            # No es grave (ya anotado en perf): se sigue leyendo de la BBDD y
+            # se reintenta al conectar
+            return
+
+        import snapshot
+
+        snapshot.borrar_antiguas(db_path, conservar=ruta)
+        if db_path == self.db_path:
+            self._cerrar_snapshot()
+            self.snapshot = snapshot.abrir_vigente(db_path)
+
+    def _cerrar_snapshot(self):
+        """
+        Deja de usar la instantánea abierta y la cierra. El cierre se encola
+        en el hilo de consultas, detrás de la carga de clientes que aún
+        pudiera estar leyéndola.
+        """
+        snap, self.snapshot = self.snapshot, None
+        if snap is not None:
+            # Sin conexión no hay carga en curso: se cierra aquí mismo
+            self.executor.submit(lambda _conn: snap.cerrar(), on_error=lambda _e: snap.cerrar())
+
+    def snapshot_vigente(self):
+        """
+        Instantánea de la BBDD conectada si sigue al día (una llamada a
+        os.stat). Si el archivo ha cambiado se vuelve a escribir en segundo
+        plano y se devuelve None.
+        """
+        snap = self.snapshot
+        if snap is None or self.db_path is None:
             return None
-        return self.conn
+        import snapshot
+
+        if snapshot.firma_bd(self.db_path) != tuple(snap.firma):
+            self._preparar_snapshot(self.db_path)
+            return self.snapshot
+        return snap
+
+    def alternar_diagnostico(self, event=None):
+        """Muestra u oculta la pestaña de diagnóstico (Ctrl+Mayús+D)."""
+        if self.diagnostico_tab is None:
+            from ui.diagnostico_tab import DiagnosticoTab
+
+            self.diagnostico_tab = DiagnosticoTab(self.notebook, self)
+            self.notebook.add(self.diagnostico_tab, text="Diagnóstico", state="hidden")
+        if self.notebook.tab(self.diagnostico_tab, "state") == "hidden":
+            self.notebook.add(self.diagnostico_tab)  # vuelve a mostrar la pestaña oculta
+            self.notebook.select(self.diagnostico_tab)
+            self.diagnostico_tab.actualizar()
+        else:
+            self.notebook.hide(self.diagnostico_tab)
+
+    def hay_conexion(self) -> bool:
+        if self.db_path is None:
+            messagebox.showwarning("Sin conexión", "Conéctate primero a la base de datos.")
+            return False
+        return True
+
+    def _on_busy(self, ocupado: bool):
+        if ocupado:
+            self.busy_bar.start(15)
+            self.configure(cursor="watch")
+        else:
+            self.busy_bar.stop()
+            self.configure(cursor="")
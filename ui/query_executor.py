@@ -0,0 +1,230 @@
+# ui/query_executor.py
+import queue
+import threading
+
+
+class Trabajo:
+    """Una consulta enviada al ejecutor."""
+
+    def __init__(self, fn, on_done, on_error, canal, generacion, on_lote=None):
+        self.fn = fn
+        self.on_done = on_done
+        self.on_error = on_error
+        self.canal = canal
+        self.generacion = generacion
+        self.on_lote = on_lote  # solo en trabajos por lotes (submit_lotes)
+
+
+class QueryExecutor:
+    """
+    Ejecuta las consultas en un hilo aparte, con su propia conexión (obtenida
+    del ConnectionManager), para que el bucle de Tk no se bloquee mientras
+    responde la base de datos.
+
+    - submit(fn, on_done, on_error, canal): fn(conn) se ejecuta en el hilo de
+      consultas; on_done(resultado) u on_error(excepción) se llaman después
+      en el hilo de Tk (los resultados se recogen con after()).
+    - canal: un trabajo nuevo en el mismo canal deja obsoletos los anteriores
+      (p.ej. una búsqueda nueva sustituye a la que aún no ha terminado). Los
+      trabajos obsoletos pendientes no se ejecutan y los resultados obsoletos
+      se descartan.
+    - submit_lotes(fn, on_lote, ...): fn(conn) devuelve un generador de
+      lotes de filas; cada lote se entrega con on_lote(lote) en cuanto llega,
+      y on_done recibe el valor de return del generador. Si el canal queda
+      obsoleto se deja de leer (el generador se cierra). Si la conexión se
+      cae a mitad de la lectura, fn se repite una vez con una conexión
+      nueva y se saltan las filas ya entregadas (las consultas por lotes
+      tienen un orden fijo).
+    - on_busy(True/False) avisa de si hay trabajos pendientes, para mostrar
+      un indicador de actividad.
+    """
+
+    INTERVALO_MS = 30
+    MAX_POR_CICLO = 20  # resultados/lotes entregados como mucho en cada after()
+
+    def __init__(self, root, on_busy=None):
+        self.root = root
+        self.on_busy = on_busy
+
+        self.conexiones = None  # ConnectionManager de la base de datos actual
+        self._trabajos = queue.Queue()
+        self._resultados = queue.Queue()
+        self._generaciones = {}
+        self._pendientes = 0
+        self._vigilando = False
+
+        self._hilo = threading.Thread(target=self._bucle, name="consultas", daemon=True)
+        self._hilo.start()
+
+    # ---------------------------------------------------------
+    # API (hilo de Tk)
+    # ---------------------------------------------------------
+    def submit(self, fn, on_done=None, on_error=None, canal=None):
+        generacion = None
+        if canal is not None:
+            generacion = self._generaciones.get(canal, 0) + 1
+            self._generaciones[canal] = generacion
+
+        trabajo = Trabajo(fn, on_done, on_error, canal, generacion)
+        self._pendientes += 1
+        self._trabajos.put(trabajo)
+        self._vigilar()
+        return trabajo
+
+    def submit_lotes(self, fn, on_lote, on_done=None, on_error=None, canal=None):
+        trabajo = self.submit(fn, on_done, on_error, canal)
+        trabajo.on_lote = on_lote
+        return trabajo
+
+    def cancel(self, canal):
+        """Deja obsoletos los trabajos pendientes o en curso de un canal."""
+        if canal in self._generaciones:
+            self._generaciones[canal] += 1
+
+    def conectar(self, abrir, on_done=None, on_error=None):
+        """
+        Cambia de base de datos. abrir() se ejecuta en el hilo de consultas y
+        devuelve (ConnectionManager, info); on_done recibe info. Todas las
+        consultas anteriores quedan obsoletas. Los hilos de trabajo que aún
+        usan el gestor anterior (exportaciones, lote de PDF) terminan con su
+        conexión: el gestor anterior solo cierra las que ya no se usan.
+        """
+        for canal in self._generaciones:
+            self._generaciones[canal] += 1
+
+        def cambiar(_conn_anterior):
+            self._cerrar_conexion()
+            self.conexiones, info = abrir()
+            return info
+
+        return self.submit(cambiar, on_done, on_error, canal="__conexion__")
+
+    def cerrar(self):
+        self._trabajos.put(None)
+
+    def ocupado(self) -> bool:
+        return self._pendientes > 0
+
+    # ---------------------------------------------------------
+    # Hilo de consultas
+    # ---------------------------------------------------------
+    def _bucle(self):
+        while True:
+            trabajo = self._trabajos.get()
+            if trabajo is None:
+                break
+            if not self._vigente(trabajo):
+                self._resultados.put((trabajo, False, None))
+                continue
+            try:
+                if trabajo.canal == "__conexion__":
+                    valor = trabajo.fn(None)
+                elif self.conexiones is None:
+                    raise RuntimeError("No hay conexión con la base de datos.")
+                else:
+                    # Valida, reconecta y reintenta si se ha caído la conexión
+                    valor = self.conexiones.ejecutar(trabajo.fn)
+                    if trabajo.on_lote is not None:
+                        valor = self._leer_lotes(trabajo, valor)
+                self._resultados.put((trabajo, True, valor))
+            except Exception as e:
+                self._resultados.put((trabajo, False, e))
+        self._cerrar_conexion()
+
+    def _leer_lotes(self, trabajo, lotes):
+        # Cada lote se entrega aparte (ok=None) sin esperar al resto
+        entregadas = 0
+        saltar = 0
+        reintentado = False
+        while True:
+            if not self._vigente(trabajo):
+                lotes.close()  # consulta abandonada: se deja de leer
+                return None
+            try:
+                lote = next(lotes)
+            except StopIteration as fin:
+                return fin.value
+            except Exception as e:
+                # Los fetch del generador no pasan por ejecutar(): la
+                # reconexión y el reintento se hacen aquí
+                if reintentado or not self.conexiones.descartar_si_caida(e):
+                    raise
+                reintentado = True
+                lotes = self.conexiones.ejecutar(trabajo.fn)
+                saltar = entregadas
+                continue
+
+            if saltar:
+                if len(lote) <= saltar:
+                    saltar -= len(lote)
+                    continue
+                lote = lote[saltar:]
+                saltar = 0
+            entregadas += len(lote)
+            self._resultados.put((trabajo, None, lote))
+
+    def _cerrar_conexion(self):
+        if self.conexiones is not None:
+            self.conexiones.cerrar()
+            self.conexiones = None
+
+    def _vigente(self, trabajo) -> bool:
+        # Lectura de un dict desde otro hilo: como mucho se ejecuta de más
+        # una consulta que ya era obsoleta, y su resultado se descarta igual.
+        if trabajo.canal is None:
+            return True
+        return self._generaciones.get(trabajo.canal) == trabajo.generacion
+
+    # ---------------------------------------------------------
+    # Entrega de resultados (hilo de Tk)
+    # ---------------------------------------------------------
+    def _vigilar(self):
+        if self._vigilando:
+            return
+        self._vigilando = True
+        if self.on_busy:
+            self.on_busy(True)
+        self.root.after(self.INTERVALO_MS, self._recoger)
+
+    def _recoger(self):
+        # Por tandas: entre una y otra Tk atiende eventos y repinta
+        for _ in range(self.MAX_POR_CICLO):
+            try:
+                trabajo, ok, valor = self._resultados.get_nowait()
+            except queue.Empty:
+                break
+            if ok is None:
+                # Lote intermedio de submit_lotes: el trabajo sigue en curso
+                if self._vigente(trabajo):
+                    self._entregar_lote(trabajo, valor)
+                continue
+            self._pendientes -= 1
+            if self._vigente(trabajo):
+                self._entregar(trabajo, ok, valor)
+
+        if self._pendientes > 0:
+            self.root.after(self.INTERVALO_MS, self._recoger)
+        else:
+            self._vigilando = False
+            if self.on_busy:
+                self.on_busy(False)
+
+    def _entregar_lote(self, trabajo, lote):
+        try:
+            trabajo.on_lote(lote)
+        except Exception as e:
+            self.root.report_callback_exception(type(e), e, e.__traceback__)
+
+    def _entregar(self, trabajo, ok, valor):
+        try:
+            if ok:
+                if trabajo.on_done:
+                    trabajo.on_done(valor)
+            elif isinstance(valor, Exception):
+                if trabajo.on_error:
+                    trabajo.on_error(valor)
+                else:
+                    raise valor
+        except Exception as e:
+            # Igual que un error en cualquier otro callback de Tk
+            self.root.report_callback_exception(type(e), e, e.__traceback__)
@@ -1,8 +1,25 @@
 # ui/trabajos_tab.py
 import tkinter as tk
+from datetime import datetime
 from tkinter import ttk, messagebox
 
-from db import get_trabajos
+import numpy as np
+
+from columnar import ResultadoTrabajos
+from db import get_trabajos_pagina, contar_trabajos
+from ui.export_dialog import ExportarDialog
+from ui.virtual_tree import VirtualTreeview
+
+# Columna del listado -> columna de ResultadoTrabajos por la que se ordena
+COLUMNA_ORDEN = {
+    "fecha": "fecha",
+    "numero": "referencia",
+    "cliente": "cliente",
+    "descripcion": "datos",
+    "cantidad": "cantidad",
+    "precio": "precio",
+    "importe": "importe",
+}
 
 
 class TrabajosTab(ttk.Frame):
@@ -12,6 +29,8 @@ class TrabajosTab(ttk.Frame):
     - Permite filtrar por cliente y texto en la descripción.
     - Muestra fecha, nº factura, cliente, descripción, cantidad, precio, importe.
     - Doble clic en un trabajo → salta a la pestaña de Facturas y muestra esa factura.
+    - Los resultados cargados se pueden refinar (importe, fechas, texto) y
+      totalizar en memoria, sin volver a consultar la base de datos.
     """
 
     def __init__(self, parent, main_window):
@@ -22,8 +41,22 @@ class TrabajosTab(ttk.Frame):
         self.trab_cliente_var = tk.StringVar()
         self.trab_texto_var = tk.StringVar()
 
-        # Últimos trabajos cargados (por si se quiere reutilizar)
-        self.lista_trabajos = []
+        # Variables del refinado en memoria
+        self.ref_importe_min_var = tk.StringVar()
+        self.ref_importe_max_var = tk.StringVar()
+        self.ref_desde_var = tk.StringVar()
+        self.ref_hasta_var = tk.StringVar()
+        self.ref_texto_var = tk.StringVar()
+
+        # Últimos trabajos cargados, también por columnas para refinar/totalizar
+        self.resultado = ResultadoTrabajos()
+        self.lista_trabajos = self.resultado.filas
+        self._refinado = None  # filtros del refinado activo (dict) o None
+        self._indices = None  # índices en resultado de lo mostrado si hay refinado
+        self._vista = np.empty(0, dtype=np.intp)  # índices mostrados, en su orden
+        self._filtro_actual = (None, None)  # (cliente, texto) de la última búsqueda
+        self._siguiente = None  # cursor de la página siguiente (None = no hay más)
+        self._total = None  # total de la búsqueda, solo si se ha pedido contarlo
 
         self._build_ui()
 
@@ -53,18 +86,61 @@ class TrabajosTab(ttk.Frame):
             row=0, column=5, padx=5
         )
 
+        self.lbl_resultados = ttk.Label(filtros, text="")
+        self.lbl_resultados.grid(row=1, column=0, columnspan=4, sticky="w", pady=(5, 0))
+        ttk.Button(filtros, text="Contar total", command=self.contar_total_trabajos).grid(
+            row=1, column=4, padx=5, pady=(5, 0)
+        )
+        ttk.Button(
+            filtros, text="Exportar a Excel/CSV", command=self.exportar_trabajos
+        ).grid(row=1, column=5, padx=5, pady=(5, 0))
+
         for i in range(6):
             filtros.columnconfigure(i, weight=0)
         filtros.columnconfigure(1, weight=1)
         filtros.columnconfigure(3, weight=1)
 
+        # ----- Refinar los resultados ya cargados (en memoria) -----
+        refinar = ttk.LabelFrame(self, text="Refinar resultados cargados", padding=10)
+        refinar.pack(fill="x", padx=5, pady=(0, 5))
+
+        ttk.Label(refinar, text="Importe entre").pack(side="left")
+        ttk.Entry(refinar, textvariable=self.ref_importe_min_var, width=8).pack(
+            side="left", padx=2
+        )
+        ttk.Label(refinar, text="y").pack(side="left")
+        ttk.Entry(refinar, textvariable=self.ref_importe_max_var, width=8).pack(
+            side="left", padx=(2, 10)
+        )
+        ttk.Label(refinar, text="Fechas (dd/mm/aaaa)").pack(side="left")
+        ttk.Entry(refinar, textvariable=self.ref_desde_var, width=10).pack(
+            side="left", padx=2
+        )
+        ttk.Label(refinar, text="a").pack(side="left")
+        ttk.Entry(refinar, textvariable=self.ref_hasta_var, width=10).pack(
+            side="left", padx=(2, 10)
+        )
+        ttk.Label(refinar, text="Contiene").pack(side="left")
+        ttk.Entry(refinar, textvariable=self.ref_texto_var, width=18).pack(
+            side="left", padx=(2, 10)
+        )
+        ttk.Button(refinar, text="Aplicar", command=self.refinar_trabajos).pack(
+            side="left", padx=2
+        )
+        ttk.Button(refinar, text="Quitar", command=self.quitar_refinado).pack(
+            side="left", padx=2
+        )
+
+        self.lbl_totales = ttk.Label(refinar, text="")
+        self.lbl_totales.pack(side="right")
+
         # ----- Listado de trabajos -----
         frame_lista = ttk.Frame(self)
         frame_lista.pack(fill="both", expand=True, padx=5, pady=5)
 
         cols = ("fecha", "numero", "cliente", "descripcion", "cantidad", "precio", "importe")
-        self.tree_trabajos = ttk.Treeview(
-            frame_lista, columns=cols, show="headings", selectmode="browse"
+        self.tree_trabajos = VirtualTreeview(
+            frame_lista, columns=cols, formatter=self._valores_trabajo, nombre="trabajos"
         )
 
         self.tree_trabajos.heading("fecha", text="Fecha")
@@ -73,7 +149,7 @@ class TrabajosTab(ttk.Frame):
         self.tree_trabajos.heading("descripcion", text="Descripción")
         self.tree_trabajos.heading("cantidad", text="Cant.")
         self.tree_trabajos.heading("precio", text="Precio")
-        self.tree_trajos_heading_importe = self.tree_trabajos.heading("importe", text="Importe")
+        self.tree_trabajos.heading("importe", text="Importe")
 
         self.tree_trabajos.column("fecha", width=90, anchor="center")
         self.tree_trabajos.column("numero", width=100, anchor="center")
@@ -83,16 +159,17 @@ class TrabajosTab(ttk.Frame):
         self.tree_trabajos.column("precio", width=80, anchor="e")
         self.tree_trabajos.column("importe", width=90, anchor="e")
 
-        self.tree_trabajos.pack(side="left", fill="both", expand=True)
+        # Orden al pulsar la cabecera: lo hace ResultadoTrabajos por columnas
+        for col in cols:
+            self.tree_trabajos.sortable(col)
+        self.tree_trabajos.on_sort = self._ordenar_trabajos
 
-        scroll_t = ttk.Scrollbar(
-            frame_lista, orient="vertical", command=self.tree_trabajos.yview
-        )
-        self.tree_trabajos.configure(yscrollcommand=scroll_t.set)
-        scroll_t.pack(side="right", fill="y")
+        self.tree_trabajos.pack(fill="both", expand=True)
+
+        self.tree_trabajos.on_need_more = self.cargar_mas_trabajos
 
         # Doble clic en trabajo → ir a factura
-        self.tree_trabajos.bind("<Double-1>", self.on_trabajo_dobleclick)
+        self.tree_trabajos.tree.bind("<Double-1>", self.on_trabajo_dobleclick)
 
     # ---------------------------------------------------------
     # Hooks llamados desde MainWindow
@@ -112,81 +189,270 @@ class TrabajosTab(ttk.Frame):
             self.trab_cliente_var.set("")
             self.trab_texto_var.set("")
 
-        self.tree_trabajos.delete(*self.tree_trabajos.get_children())
-        self.lista_trabajos = []
+        for canal in ("trabajos", "trabajos_total"):
+            self.main_window.executor.cancel(canal)
+
+        self.tree_trabajos.clear()
+        self.resultado = ResultadoTrabajos()
+        self.lista_trabajos = self.resultado.filas
+        self._indices = None
+        self._vista = np.empty(0, dtype=np.intp)
+        self._siguiente = None
+        self._total = None
+        self.lbl_resultados.config(text="")
+        self.lbl_totales.config(text="")
 
     def buscar_trabajos(self):
-        conn = self.main_window.get_conn()
-        if conn is None:
+        if not self.main_window.hay_conexion():
             return
 
-        cliente = self.trab_cliente_var.get().strip()
-        texto = self.trab_texto_var.get().strip()
+        cliente = self.trab_cliente_var.get().strip() or None
+        texto = self.trab_texto_var.get().strip() or None
 
-        try:
-            rows = get_trabajos(
-                conn,
-                cliente=cliente or None,
-                texto=texto or None,
-            )
-        except Exception as e:
+        def error(e):
             messagebox.showerror(
                 "Error al buscar trabajos",
                 f"Revisa que la tabla Contenid y sus campos existan.\n\n{e}",
             )
-            return
 
-        self.lista_trabajos = rows
-        self.tree_trabajos.delete(*self.tree_trabajos.get_children())
+        # Solo la primera página; el resto se pide al desplazarse.
+        # Una búsqueda nueva deja obsoletas las anteriores y su recuento.
+        executor = self.main_window.executor
+        executor.cancel("trabajos_total")
+        executor.submit(
+            lambda conn: get_trabajos_pagina(conn, cliente=cliente, texto=texto),
+            on_done=lambda res: self._mostrar_trabajos(res, cliente, texto),
+            on_error=error,
+            canal="trabajos",
+        )
 
-        for r in rows:
-            fecha = r.FECHA
-            fecha_str = ""
-            if fecha is not None:
-                try:
-                    fecha_str = fecha.strftime("%d/%m/%Y")
-                except Exception:
-                    fecha_str = str(fecha)
+    def _mostrar_trabajos(self, resultado, cliente, texto):
+        rows, siguiente = resultado
 
-            cantidad = r.CANTIDAD if r.CANTIDAD is not None else 0
-            precio = r.PRECIO if r.PRECIO is not None else 0
-            importe = getattr(r, "Importe", None)
-            if importe is None:
-                try:
-                    importe = round(cantidad * precio, 2)
-                except Exception:
-                    importe = 0.00
-
-            self.tree_trabajos.insert(
-                "",
-                "end",
-                values=(
-                    fecha_str,
-                    r.REFERENCIA,
-                    r.CLIENTE,
-                    r.Datos,
-                    cantidad,
-                    precio,
-                    importe,
-                ),
-            )
+        # Las filas se quedan en memoria; el listado solo pinta las visibles
+        self._filtro_actual = (cliente, texto)
+        self._siguiente = siguiente
+        self._total = None
+        self.resultado = ResultadoTrabajos(rows)
+        self.lista_trabajos = self.resultado.filas
+        self._mostrar_vista()
 
         if not rows:
             messagebox.showinfo("Sin resultados", "No se han encontrado trabajos.")
 
+    def cargar_mas_trabajos(self):
+        """Llamado por el listado al acercarse al final de lo ya cargado."""
+        if self._siguiente is None:
+            self.tree_trabajos.has_more = False
+            return
+
+        cliente, texto = self._filtro_actual
+        despues = self._siguiente
+
+        def error(e):
+            self._siguiente = None
+            self.tree_trabajos.has_more = False
+            messagebox.showerror("Error al buscar trabajos", str(e))
+
+        self.main_window.executor.submit(
+            lambda conn: get_trabajos_pagina(
+                conn, cliente=cliente, texto=texto, despues=despues
+            ),
+            on_done=self._anadir_trabajos,
+            on_error=error,
+            canal="trabajos",
+        )
+
+    def _anadir_trabajos(self, resultado):
+        rows, self._siguiente = resultado
+        inicio = len(self.resultado)
+        self.resultado.extender(rows)
+
+        # Con refinado activo solo se añaden las filas nuevas que lo cumplen
+        if self._refinado is not None:
+            nuevos = self.resultado.filtrar(inicio=inicio, **self._refinado)
+            self._indices = np.concatenate([self._indices, nuevos])
+            rows = self.resultado.filas_de(nuevos)
+        else:
+            nuevos = np.arange(inicio, len(self.resultado), dtype=np.intp)
+
+        # Con un orden activo la página se intercala en la vista ya ordenada
+        posiciones = None
+        orden = self.tree_trabajos.orden
+        if orden is None:
+            self._vista = np.concatenate([self._vista, nuevos])
+        else:
+            columna, descendente = orden
+            nuevos, posiciones = self.resultado.posiciones(
+                self._vista, nuevos, COLUMNA_ORDEN[columna], descendente
+            )
+            self._vista = np.insert(self._vista, posiciones, nuevos)
+            rows = self.resultado.filas_de(nuevos)
+        self.tree_trabajos.append_rows(
+            rows, has_more=self._siguiente is not None, posiciones=posiciones
+        )
+        self._actualizar_resultados()
+
+    # ---------------------------------------------------------
+    # Refinado en memoria
+    # ---------------------------------------------------------
+    def refinar_trabajos(self):
+        try:
+            refinado = {
+                "importe_min": self._leer_importe(self.ref_importe_min_var),
+                "importe_max": self._leer_importe(self.ref_importe_max_var),
+                "desde": self._leer_fecha(self.ref_desde_var),
+                "hasta": self._leer_fecha(self.ref_hasta_var),
+                "texto": self.ref_texto_var.get().strip() or None,
+            }
+        except ValueError as e:
+            messagebox.showwarning("Refinar resultados", str(e))
+            return
+
+        if all(v is None for v in refinado.values()):
+            self.quitar_refinado()
+            return
+        self._refinado = refinado
+        self._mostrar_vista()
+
+    def quitar_refinado(self):
+        for var in (
+            self.ref_importe_min_var,
+            self.ref_importe_max_var,
+            self.ref_desde_var,
+            self.ref_hasta_var,
+            self.ref_texto_var,
+        ):
+            var.set("")
+        self._refinado = None
+        self._mostrar_vista()
+
+    def _mostrar_vista(self):
+        """Pinta los trabajos cargados, refinados si hay refinado activo y en el orden elegido."""
+        if self._refinado is None:
+            self._indices = None
+            vista = np.arange(len(self.resultado), dtype=np.intp)
+        else:
+            self._indices = vista = self.resultado.filtrar(**self._refinado)
+        orden = self.tree_trabajos.orden
+        if orden is not None:
+            columna, descendente = orden
+            vista = self.resultado.ordenar(vista, COLUMNA_ORDEN[columna], descendente)
+        self._vista = vista
+        self.tree_trabajos.set_rows(
+            self.resultado.filas_de(vista), has_more=self._siguiente is not None
+        )
+        self._actualizar_resultados()
+
+    def _ordenar_trabajos(self, columna, descendente):
+        """on_sort del listado: ordena lo mostrado por columnas, sin claves por fila."""
+        self._vista = self.resultado.ordenar(self._vista, COLUMNA_ORDEN[columna], descendente)
+        return self.resultado.filas_de(self._vista)
+
+    def _leer_importe(self, var):
+        texto = var.get().strip().replace(",", ".")
+        if not texto:
+            return None
+        try:
+            return float(texto)
+        except ValueError:
+            raise ValueError(f"Importe no válido: {texto}")
+
+    def _leer_fecha(self, var):
+        texto = var.get().strip()
+        if not texto:
+            return None
+        try:
+            return datetime.strptime(texto, "%d/%m/%Y").date()
+        except ValueError:
+            raise ValueError(f"Fecha no válida (dd/mm/aaaa): {texto}")
+
+    def _actualizar_resultados(self):
+        n = len(self.lista_trabajos)
+        if self._total is not None and self._siguiente is not None:
+            txt = f"{n} de {self._total} trabajos cargados"
+        elif self._siguiente is not None:
+            txt = f"{n} trabajos cargados (hay más: desplázate o pulsa Contar total)"
+        else:
+            txt = f"{n} trabajos"
+        self.lbl_resultados.config(text=txt)
+
+        totales = self.resultado.totales(self._indices)
+        txt = f"{totales['trabajos']} trabajos, importe total {totales['importe']:.2f}"
+        if self._indices is not None and self._siguiente is not None:
+            txt += " (sobre los cargados)"
+        self.lbl_totales.config(text=txt)
+
+    def contar_total_trabajos(self):
+        """El total se calcula aparte y solo cuando se pide."""
+        if not self.main_window.hay_conexion():
+            return
+        cliente, texto = self._filtro_actual
+        self.main_window.executor.submit(
+            lambda conn: contar_trabajos(conn, cliente=cliente, texto=texto),
+            on_done=self._mostrar_total,
+            on_error=lambda e: messagebox.showerror("Error al contar trabajos", str(e)),
+            canal="trabajos_total",
+        )
+
+    def _mostrar_total(self, total):
+        self._total = total
+        self._actualizar_resultados()
+
+    def exportar_trabajos(self):
+        """Exporta todos los trabajos del filtro (no solo los cargados) a un archivo."""
+        if not self.main_window.hay_conexion():
+            return
+        ExportarDialog(
+            self,
+            self.main_window,
+            "trabajos",
+            cliente=self.trab_cliente_var.get().strip(),
+            texto=self.trab_texto_var.get().strip(),
+        )
+
+    def _valores_trabajo(self, r):
+        fecha = r.FECHA
+        fecha_str = ""
+        if fecha is not None:
+            try:
+                fecha_str = fecha.strftime("%d/%m/%Y")
+            except Exception:
+                fecha_str = str(fecha)
+
+        cantidad = r.CANTIDAD if r.CANTIDAD is not None else 0
+        precio = r.PRECIO if r.PRECIO is not None else 0
+
+        return (
+            fecha_str,
+            r.REFERENCIA,
+            r.CLIENTE,
+            r.Datos,
+            cantidad,
+            precio,
+            self._importe(r),
+        )
+
+    def _importe(self, r):
+        importe = getattr(r, "Importe", None)
+        if importe is None:
+            cantidad = r.CANTIDAD if r.CANTIDAD is not None else 0
+            precio = r.PRECIO if r.PRECIO is not None else 0
+            try:
+                importe = round(cantidad * precio, 2)
+            except Exception:
+                importe = 0.00
+        return importe
+
     # ---------------------------------------------------------
     # Doble clic: ir a factura
     # ---------------------------------------------------------
     def on_trabajo_dobleclick(self, event=None):
-        sel = self.tree_trabajos.selection()
-        if not sel:
-            return
-        item = sel[0]
-        valores = self.tree_trabajos.item(item, "values")
-        if not valores:
+        fila = self.tree_trabajos.selected_row()
+        if fila is None:
             return
 
-        numero = valores[1]  # columna Nº factura
+        numero = str(fila.REFERENCIA)  # columna Nº factura
 
         # Cambiar a pestaña facturas y mostrar la factura
         fact_tab = self.main_window.facturas_tab
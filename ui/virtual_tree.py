@@ -0,0 +1,532 @@
+# ui/virtual_tree.py
+import tkinter as tk
+from bisect import bisect_left, bisect_right
+from datetime import date
+from tkinter import ttk
+
+import perf
+from client_index import normalizar
+
+
+# Claves de orden tipadas para sortable(): None si no hay valor
+def clave_texto(valor):
+    if valor is None:
+        return None
+    return normalizar(valor).strip()
+
+
+def clave_numero(valor):
+    if valor is None:
+        return None
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def clave_fecha(valor):
+    # date y datetime (subclase de date): ordinal del día
+    if isinstance(valor, date):
+        return valor.toordinal()
+    return None
+
+
+class VirtualTreeview(ttk.Frame):
+    """
+    Listado "virtual" basado en ttk.Treeview.
+
+    - Las filas se guardan en una secuencia Python (lista de filas de la
+      consulta, o cualquier objeto con len() e índice).
+    - En Tk solo existen los items que caben en pantalla (más un pequeño
+      margen); al desplazarse se reutilizan cambiando sus valores.
+    - Cada fila se convierte a valores de columnas con `formatter` solo en
+      el momento de mostrarla.
+    - El desplazamiento (rueda, barra, teclado) lo controla este widget, no
+      el Treeview, porque el Treeview nunca tiene todas las filas.
+
+    Al seleccionar una fila se genera el evento <<VirtualTreeviewSelect>>;
+    la fila se obtiene con selected_row(). Con multiseleccion=True se pueden
+    elegir varias con Ctrl+clic (añadir/quitar) y Mayús+clic (tramo), también
+    fuera de la ventana visible; selected_rows() las devuelve todas.
+
+    Para resultados paginados: con has_more=True, cuando la ventana visible
+    se acerca al final se llama una vez a on_need_more(), que debe añadir la
+    página siguiente con append_rows() (o poner has_more=False).
+
+    Ordenación: con sortable(columna, clave) al pulsar la cabecera se ordena
+    por clave(fila) (ascendente y, al volver a pulsar, descendente). Las
+    claves se calculan una vez por fila y se guardan; ordenar solo cambia el
+    orden de la lista de filas y se vuelven a pintar las visibles. Las
+    claves None van siempre al final. El orden elegido se mantiene al añadir
+    páginas o cambiar las filas; una página nueva no reordena todo: se
+    ordena ella sola y sus filas se intercalan en su sitio.
+
+    Si la pestaña ya sabe ordenar sus filas (p.ej. por columnas de NumPy),
+    se registran las columnas con sortable(columna) sin clave y se asigna
+    on_sort(columna, descendente), que devuelve todas las filas en ese
+    orden. El listado entonces no ordena por su cuenta: set_rows() recibe
+    las filas ya ordenadas (el orden activo está en `orden`) y
+    append_rows() las filas nuevas ordenadas con sus posiciones.
+
+    Lo que tarda en llenarse (set_rows, append_rows, sort_by) se anota en
+    perf como "ui" con el `nombre` del listado.
+    """
+
+    def __init__(
+        self,
+        parent,
+        columns,
+        formatter=None,
+        margen: int = 2,
+        nombre: str = "listado",
+        multiseleccion: bool = False,
+        **tree_kwargs,
+    ):
+        super().__init__(parent)
+        self.nombre = nombre
+        self.formatter = formatter or tuple
+        self.margen = margen
+        self._marcadas = {}  # id(fila) -> fila elegidas con Ctrl/Mayús (vacío = solo _selected)
+
+        self._rows = []
+        self._first = 0        # índice de la primera fila visible
+        self._visible = 1      # filas que caben en pantalla
+        self._selected = None  # índice (en _rows) de la fila seleccionada
+        self._pool = []        # iids de los items de Tk reutilizados
+
+        self.has_more = False
+        self.on_need_more = None
+        self._pidiendo_mas = False
+        self.on_sort = None
+
+        self._titulos = {}         # columna -> texto de la cabecera
+        self._claves_orden = {}    # columna -> función clave(fila)
+        self._cache_claves = {}    # columna -> {id(fila): (fila, clave)}
+        self._claves_filas = None  # claves del orden activo, alineadas con _rows
+        self._orden = None         # (columna, descendente) del orden activo
+
+        tree_kwargs.setdefault("show", "headings")
+        tree_kwargs.setdefault("selectmode", "extended" if multiseleccion else "browse")
+        self.tree = ttk.Treeview(self, columns=columns, **tree_kwargs)
+        self.tree.pack(side="left", fill="both", expand=True)
+
+        self.scroll = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.scroll.pack(side="right", fill="y")
+        self.scroll.set(0, 1)
+
+        self.tree.bind("<Configure>", self._on_configure)
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select)
+        if multiseleccion:
+            # Un clic normal vuelve a una sola fila; Ctrl/Mayús los trata el
+            # listado (el Treeview solo conoce las filas visibles)
+            self.tree.bind("<Button-1>", self._clic_simple)
+            self.tree.bind("<Control-Button-1>", lambda e: self._marcar(e, tramo=False))
+            self.tree.bind("<Shift-Button-1>", lambda e: self._marcar(e, tramo=True))
+        for seq in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(seq, self._on_wheel)
+        self.tree.bind("<Up>", lambda e: self._mover_seleccion(-1))
+        self.tree.bind("<Down>", lambda e: self._mover_seleccion(1))
+        self.tree.bind("<Prior>", lambda e: self._mover_seleccion(-self._visible))
+        self.tree.bind("<Next>", lambda e: self._mover_seleccion(self._visible))
+        self.tree.bind("<Home>", lambda e: self._mover_seleccion(absoluto=0))
+        self.tree.bind("<End>", lambda e: self._mover_seleccion(absoluto=len(self._rows) - 1))
+
+    # ---------------------------------------------------------
+    # API para las pestañas
+    # ---------------------------------------------------------
+    def heading(self, column, **kw):
+        if "text" in kw:
+            self._titulos[column] = kw["text"]
+        return self.tree.heading(column, **kw)
+
+    def sortable(self, column, clave=None):
+        """
+        Permite ordenar por `column` pulsando su cabecera (sin clave, el
+        orden lo da on_sort).
+        """
+        if clave is not None:
+            self._claves_orden[column] = clave
+        self.tree.heading(column, command=lambda c=column: self.sort_by(c))
+
+    @property
+    def orden(self):
+        """(columna, descendente) del orden activo, o None."""
+        return self._orden
+
+    def sort_by(self, column, descendente=None):
+        """Ordena por una columna; sin indicar sentido alterna asc/desc."""
+        if descendente is None:
+            descendente = self._orden == (column, False)
+        self._orden = (column, descendente)
+        for col, titulo in self._titulos.items():
+            if col == column:
+                titulo += " ▼" if descendente else " ▲"
+            self.tree.heading(col, text=titulo)
+        with perf.medir("ui", f"{self.nombre}.sort_by", filas=len(self._rows), columna=column):
+            if self.on_sort is not None:
+                self._claves_filas = None
+                self._poner_en_orden(self.on_sort(column, descendente))
+            else:
+                self._ordenar()
+            self._render()
+
+    def column(self, column, **kw):
+        return self.tree.column(column, **kw)
+
+    def set_rows(self, rows, has_more: bool = False, conservar_claves: bool = False):
+        """
+        Sustituye todas las filas y vuelve al principio del listado.
+        conservar_claves=True cuando las filas son un subconjunto de las que
+        ya había (p.ej. un filtro en memoria): no se recalculan sus claves.
+        """
+        if not conservar_claves:
+            self._cache_claves = {}
+        self._claves_filas = None
+        self._rows = rows
+        self.has_more = has_more
+        self._pidiendo_mas = False
+        self._first = 0
+        self._selected = None
+        self._marcadas = {}
+        with perf.medir("ui", f"{self.nombre}.set_rows", filas=len(rows)):
+            self._ordenar()
+            self._render()
+        # Con filas ya pintadas se puede medir el alto real de fila
+        self.after_idle(self._on_configure)
+
+    def append_rows(self, rows, has_more: bool = False, posiciones=None):
+        """
+        Añade filas (p.ej. la página siguiente de una consulta). Sin orden
+        activo van al final; con orden, cada una se intercala en su sitio.
+        Con on_sort las ordena quien llama y pasa en `posiciones` el índice
+        (en las filas actuales, creciente) ante el que va cada una.
+        """
+        with perf.medir("ui", f"{self.nombre}.append_rows", filas=len(rows)):
+            claves = None
+            if posiciones is None and self._orden is not None and self.on_sort is None:
+                rows, claves, posiciones = self._posiciones(rows)
+            if posiciones is None:
+                self._rows.extend(rows)
+            else:
+                self._intercalar(rows, list(posiciones), claves)
+            self.has_more = has_more
+            self._pidiendo_mas = False
+            self._render()
+
+    def clear(self):
+        self.set_rows([])
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def rows(self):
+        return self._rows
+
+    def row(self, index):
+        return self._rows[index]
+
+    def selected_index(self):
+        return self._selected
+
+    def selected_row(self):
+        if self._selected is None or self._selected >= len(self._rows):
+            return None
+        return self._rows[self._selected]
+
+    def selected_rows(self):
+        """Filas elegidas (varias con multiselección), en el orden del listado."""
+        if not self._marcadas:
+            fila = self.selected_row()
+            return [] if fila is None else [fila]
+        marcadas = self._marcadas
+        return [f for f in self._rows if id(f) in marcadas]
+
+    def select_index(self, index, avisar: bool = True):
+        """
+        Selecciona una fila (desplazando si hace falta) y avisa del cambio,
+        salvo con avisar=False (cuando quien selecciona ya ha cargado el detalle).
+        """
+        if not 0 <= index < len(self._rows):
+            return
+        if index < self._first:
+            self._first = index
+        elif index >= self._first + self._visible:
+            self._first = index - self._visible + 1
+        cambiado = index != self._selected
+        self._selected = index
+        self._render()
+        if cambiado and avisar:
+            self.event_generate("<<VirtualTreeviewSelect>>")
+
+    # ---------------------------------------------------------
+    # Ordenación
+    # ---------------------------------------------------------
+    def _ordenar(self):
+        if self._orden is None or not self._rows or self.on_sort is not None:
+            return
+        column, descendente = self._orden
+        claves = self._claves(column)
+
+        orden = self._orden_de(claves, descendente)
+        filas = self._rows
+        self._poner_en_orden([filas[i] for i in orden])
+        self._claves_filas = [claves[i] for i in orden]
+
+    @staticmethod
+    def _orden_de(claves, descendente):
+        """Índices de `claves` en orden (estable), con las None al final."""
+        con_valor = [i for i, k in enumerate(claves) if k is not None]
+        sin_valor = [i for i, k in enumerate(claves) if k is None]
+        con_valor.sort(key=claves.__getitem__, reverse=descendente)  # estable
+        return con_valor + sin_valor
+
+    def _posiciones(self, rows):
+        """
+        Ordena una página nueva y busca (bisect sobre las claves ya
+        ordenadas) dónde va cada fila. Devuelve (filas, claves, posiciones).
+        """
+        column, descendente = self._orden
+        if self._claves_filas is None or len(self._claves_filas) != len(self._rows):
+            self._ordenar()  # la lista ha cambiado por otro camino
+        existentes = self._claves_filas or []
+
+        claves = self._claves(column, rows)
+        orden = self._orden_de(claves, descendente)
+        rows = [rows[i] for i in orden]
+        claves = [claves[i] for i in orden]
+
+        # Las claves None están al final: solo se busca entre las que tienen valor
+        con_valor = len(existentes)
+        while con_valor and existentes[con_valor - 1] is None:
+            con_valor -= 1
+        if descendente:
+            ascendentes = existentes[:con_valor][::-1]
+        posiciones = []
+        for k in claves:
+            if k is None:
+                posiciones.append(len(existentes))
+            elif descendente:
+                # Tras las iguales: antes de la primera menor
+                posiciones.append(con_valor - bisect_left(ascendentes, k))
+            else:
+                posiciones.append(bisect_right(existentes, k, 0, con_valor))
+        return rows, claves, posiciones
+
+    def _intercalar(self, rows, posiciones, claves=None):
+        """Inserta rows[i] ante la fila posiciones[i] (posiciones crecientes)."""
+        def intercalar(viejas, nuevas):
+            resultado = []
+            anterior = 0
+            for nueva, pos in zip(nuevas, posiciones):
+                resultado.extend(viejas[anterior:pos])
+                resultado.append(nueva)
+                anterior = pos
+            resultado.extend(viejas[anterior:])
+            return resultado
+
+        if self._selected is not None:
+            self._selected += bisect_right(posiciones, self._selected)
+        # En el sitio: las pestañas pueden compartir la lista de filas
+        self._rows[:] = intercalar(self._rows, rows)
+        if claves is not None and self._claves_filas is not None:
+            self._claves_filas = intercalar(self._claves_filas, claves)
+        else:
+            self._claves_filas = None
+
+    def _poner_en_orden(self, ordenadas):
+        """Sustituye las filas por las mismas en otro orden, sin perder la selección."""
+        seleccionada = self.selected_row()
+        # En el sitio: las pestañas pueden compartir la lista de filas
+        filas = self._rows
+        filas[:] = ordenadas
+        if seleccionada is not None:
+            self._selected = next(
+                (i for i, f in enumerate(filas) if f is seleccionada), None
+            )
+
+    def _claves(self, column, filas=None):
+        """Claves de orden de `filas` (las actuales), calculadas una vez por fila."""
+        clave = self._claves_orden[column]
+        cache = self._cache_claves.setdefault(column, {})
+        claves = []
+        for fila in self._rows if filas is None else filas:
+            guardada = cache.get(id(fila))
+            # Se comprueba que es la misma fila: un id se puede reutilizar
+            if guardada is None or guardada[0] is not fila:
+                guardada = cache[id(fila)] = (fila, clave(fila))
+            claves.append(guardada[1])
+        return claves
+
+    # ---------------------------------------------------------
+    # Desplazamiento
+    # ---------------------------------------------------------
+    def yview(self, *args):
+        """Comando de la barra de desplazamiento ("moveto" / "scroll")."""
+        if not args:
+            return
+        if args[0] == "moveto":
+            self._first = int(float(args[1]) * len(self._rows))
+        elif args[0] == "scroll":
+            n = int(args[1])
+            if args[2] == "pages":
+                n *= self._visible
+            self._first += n
+        self._render()
+
+    def _on_wheel(self, event):
+        if event.num == 4:
+            n = -3
+        elif event.num == 5:
+            n = 3
+        elif event.delta:
+            n = -3 * max(1, abs(event.delta) // 120) * (1 if event.delta > 0 else -1)
+        else:
+            return "break"
+        self._first += n
+        self._render()
+        return "break"
+
+    def _mover_seleccion(self, delta=0, absoluto=None):
+        if not self._rows:
+            return "break"
+        if absoluto is not None:
+            index = absoluto
+        elif self._selected is None:
+            index = self._first
+        else:
+            index = self._selected + delta
+        self._marcadas = {}
+        self.select_index(max(0, min(len(self._rows) - 1, index)))
+        return "break"
+
+    def _clic_simple(self, event):
+        # Sobre una fila (no en la cabecera): se vuelve a elegir una sola
+        if self._marcadas and self.tree.identify_region(event.x, event.y) in ("cell", "tree"):
+            self._marcadas = {}
+
+    def _marcar(self, event, tramo: bool):
+        """Ctrl+clic (añade o quita una fila) y Mayús+clic (tramo desde la actual)."""
+        iid = self.tree.identify_row(event.y)
+        if iid not in self._pool:
+            return "break"
+        index = self._first + self._pool.index(iid)
+        if index >= len(self._rows):
+            return "break"
+
+        filas = self._rows
+        anterior = self._selected
+        if tramo and anterior is not None:
+            a, b = sorted((anterior, index))
+            self._marcadas = {id(f): f for f in filas[a:b + 1]}
+        else:
+            if not self._marcadas and anterior is not None and anterior < len(filas):
+                self._marcadas[id(filas[anterior])] = filas[anterior]
+            fila = filas[index]
+            if id(fila) in self._marcadas:
+                del self._marcadas[id(fila)]
+            else:
+                self._marcadas[id(fila)] = fila
+        self._selected = index
+        self._render()
+        if index != anterior:
+            self.event_generate("<<VirtualTreeviewSelect>>")
+        return "break"
+
+    # ---------------------------------------------------------
+    # Pintado de la ventana visible
+    # ---------------------------------------------------------
+    def _on_configure(self, event=None):
+        visibles = self._filas_que_caben()
+        if visibles != self._visible or not self._pool:
+            self._visible = visibles
+            self._ajustar_pool()
+            self._render()
+
+    def _filas_que_caben(self):
+        alto = self.tree.winfo_height()
+        cabecera, alto_fila = self._medidas()
+        return max(1, (alto - cabecera) // alto_fila)
+
+    def _medidas(self):
+        """(alto de la cabecera, alto de fila) en píxeles."""
+        if self._pool and self._rows:
+            bbox = self.tree.bbox(self._pool[0])
+            if bbox:
+                return bbox[1], bbox[3]
+        try:
+            alto_fila = int(ttk.Style().lookup("Treeview", "rowheight"))
+        except (ValueError, tk.TclError):
+            alto_fila = 20
+        return alto_fila + 6, alto_fila
+
+    def _ajustar_pool(self):
+        necesarios = self._visible + self.margen
+        while len(self._pool) < necesarios:
+            self._pool.append(self.tree.insert("", "end"))
+        while len(self._pool) > necesarios:
+            self.tree.delete(self._pool.pop())
+
+    def _render(self):
+        total = len(self._rows)
+        self._first = max(0, min(self._first, total - self._visible))
+
+        enlazados = []
+        for k, iid in enumerate(self._pool):
+            i = self._first + k
+            if i >= total:
+                break
+            self.tree.item(iid, values=self.formatter(self._rows[i]))
+            enlazados.append(iid)
+        self.tree.set_children("", *enlazados)
+
+        sel = self._selected
+        if self._marcadas:
+            marcadas = self._marcadas
+            elegidos = tuple(
+                iid for k, iid in enumerate(enlazados)
+                if id(self._rows[self._first + k]) in marcadas
+            )
+            if self.tree.selection() != elegidos:
+                self.tree.selection_set(elegidos)
+            if sel is not None and self._first <= sel < self._first + len(enlazados):
+                self.tree.focus(self._pool[sel - self._first])
+        elif sel is not None and self._first <= sel < self._first + len(enlazados):
+            iid = self._pool[sel - self._first]
+            if self.tree.selection() != (iid,):
+                self.tree.selection_set(iid)
+            self.tree.focus(iid)
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+
+        # El Treeview no debe desplazarse por su cuenta
+        self.tree.yview_moveto(0)
+
+        if total:
+            self.scroll.set(self._first / total, min(1.0, (self._first + self._visible) / total))
+        else:
+            self.scroll.set(0, 1)
+
+        # Pedimos la página siguiente con una pantalla de antelación
+        if (
+            self.has_more
+            and self.on_need_more
+            and not self._pidiendo_mas
+            and self._first + 2 * self._visible >= total
+        ):
+            self._pidiendo_mas = True
+            self.after_idle(self.on_need_more)
+
+    def _on_tree_select(self, event=None):
+        sel = self.tree.selection()
+        if not sel:
+            return
+        # Con varias filas elegidas, la actual es la que tiene el foco
+        iid = self.tree.focus() if self.tree.focus() in sel else sel[0]
+        if iid not in self._pool:
+            return
+        index = self._first + self._pool.index(iid)
+        # Las selecciones que hace _render llegan aquí con el mismo índice
+        if index != self._selected and index < len(self._rows):
+            self._selected = index
+            self.event_generate("<<VirtualTreeviewSelect>>")